@@ -1,13 +1,21 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.urls import reverse
+from django.utils.html import format_html
 
+from .feeds import feed_token
+from .permissions import has_perm
 from .models import (
     Activation,
+    CalendarOutbox,
+    CalendarSyncJob,
     ContactMessage,
     Event,
+    OpenSlot,
     Performer,
     SoundEngineer,
     Venue,
 )
+from .solver import fill_open_slots, solve_open_slots
 
 # Register your models here.
 
@@ -16,7 +24,7 @@ class EventAdmin(admin.ModelAdmin):
     def get_readonly_fields(self, request, obj=None):
         # Check if user has the specific permission
         if (
-            request.user.has_perm("planner.can_manage_event_engineer")
+            has_perm(request.user, "planner.can_manage_event_engineer")
             and not request.user.is_superuser
         ):
             # Return all fields EXCEPT 'sound_engineer' as read-only
@@ -28,9 +36,87 @@ class EventAdmin(admin.ModelAdmin):
         return super().get_readonly_fields(request, obj)
 
 
+class FeedLinkAdmin(admin.ModelAdmin):
+    """Shows the .ics subscription link of each venue/performer."""
+
+    feed_kind = None
+    list_display = ("name", "ics_feed")
+
+    @admin.display(description="Calendar feed")
+    def ics_feed(self, obj):
+        url = reverse(f"planner:{self.feed_kind}_feed", kwargs={"pk": obj.pk})
+        token = feed_token(self.feed_kind, obj.pk)
+        return format_html('<a href="{}?token={}">.ics</a>', url, token)
+
+
+class VenueAdmin(FeedLinkAdmin):
+    feed_kind = "venue"
+
+
+class PerformerAdmin(FeedLinkAdmin):
+    feed_kind = "performer"
+
+
+class OpenSlotAdmin(admin.ModelAdmin):
+    list_display = (
+        "date",
+        "performance_time_start",
+        "performance_time_end",
+        "venue",
+        "genre",
+        "event",
+    )
+    list_filter = ("venue", "date")
+    actions = ("assign_performers",)
+
+    @admin.action(description="Assign performers to selected slots")
+    def assign_performers(self, request, queryset):
+        slots = list(queryset.filter(event__isnull=True))
+        solution = solve_open_slots(slots)
+        events = fill_open_slots(slots, solution)
+        self.message_user(
+            request, f"{len(events)} slot(s) assigned.", messages.SUCCESS
+        )
+        if solution.unassigned:
+            self.message_user(
+                request,
+                f"{len(solution.unassigned)} slot(s) have no available "
+                "performer.",
+                messages.WARNING,
+            )
+
+
+class CalendarOutboxAdmin(admin.ModelAdmin):
+    list_display = (
+        "event_id",
+        "action",
+        "created_at",
+        "attempts",
+        "next_attempt_at",
+        "last_error",
+    )
+    list_filter = ("action",)
+
+
+class CalendarSyncJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "pk",
+        "status",
+        "requested_by",
+        "created_at",
+        "finished_at",
+        "checked",
+        "updated",
+    )
+    list_filter = ("status",)
+
+
 admin.site.register(Event, EventAdmin)
+admin.site.register(OpenSlot, OpenSlotAdmin)
+admin.site.register(CalendarOutbox, CalendarOutboxAdmin)
+admin.site.register(CalendarSyncJob, CalendarSyncJobAdmin)
 admin.site.register(ContactMessage)
 admin.site.register(SoundEngineer)
 admin.site.register(Activation)
-admin.site.register(Venue)
-admin.site.register(Performer)
+admin.site.register(Venue, VenueAdmin)
+admin.site.register(Performer, PerformerAdmin)
@@ -0,0 +1,104 @@
+"""Availability questions coordinators ask when filling gaps.
+
+Each answer comes from one indexed range query over the window (widened by
+a day for overnight sets); the interval arithmetic happens in memory.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .intervals import free_gaps, merge_intervals
+from .models import Event, Performer
+from .schedule import event_span
+
+# Default operating hours used to find a venue's open slots. Closing at or
+# before opening means the venue closes after midnight.
+OPEN_TIME = time(8)
+CLOSE_TIME = time(2)
+
+
+def _booked(start: datetime, end: datetime, **filters) -> list[dict]:
+    """Bookings overlapping ``[start, end)`` with their spans attached."""
+    rows = Event.objects.filter(
+        date__gte=timezone.localtime(start).date() - timedelta(days=1),
+        date__lte=timezone.localtime(end).date(),
+        **filters,
+    ).values(
+        "pk",
+        "date",
+        "performance_time_start",
+        "performance_time_end",
+        "venue_id",
+        "performer_id",
+    )
+    booked = []
+    for row in rows:
+        row["start"], row["end"] = event_span(
+            row["date"], row["performance_time_start"],
+            row["performance_time_end"],
+        )
+        if row["start"] < end and row["end"] > start:
+            booked.append(row)
+    return booked
+
+
+def free_performers(venue, start: datetime, end: datetime) -> dict:
+    """Performers with no booking anywhere during ``[start, end)``.
+    Args:
+        venue (Venue): Venue the slot is at
+        start (datetime): Aware slot start
+        end (datetime): Aware slot end
+    Returns:
+        dict: ``venue_free`` flag and the free ``performers`` (id, name,
+        genre)
+    """
+    booked = _booked(start, end)
+    busy_ids = {row["performer_id"] for row in booked}
+    return {
+        "venue_free": not any(row["venue_id"] == venue.pk for row in booked),
+        "performers": [
+            performer
+            for performer in Performer.objects.values("id", "name", "genre")
+            if performer["id"] not in busy_ids
+        ],
+    }
+
+
+def venue_open_slots(
+    venue,
+    first_day,
+    last_day,
+    open_time: time = OPEN_TIME,
+    close_time: time = CLOSE_TIME,
+    min_length: timedelta = timedelta(hours=1),
+) -> list[tuple[datetime, datetime]]:
+    """Unbooked stretches of the venue's operating hours.
+    Args:
+        venue (Venue): Venue to inspect
+        first_day (date): First day, inclusive
+        last_day (date): Last day, inclusive
+        open_time (time): Daily opening time
+        close_time (time): Daily closing time, next day if <= open_time
+        min_length (timedelta): Ignore gaps shorter than this
+    Returns:
+        list[tuple[datetime, datetime]]: Aware open slots in order
+    """
+    windows = []
+    day = first_day
+    while day <= last_day:
+        windows.append(event_span(day, open_time, close_time))
+        day += timedelta(days=1)
+    if not windows:
+        return []
+
+    busy = merge_intervals(
+        (row["start"], row["end"])
+        for row in _booked(windows[0][0], windows[-1][1], venue=venue)
+    )
+    return [
+        gap
+        for window_start, window_end in windows
+        for gap in free_gaps(busy, window_start, window_end)
+        if gap[1] - gap[0] >= min_length
+    ]
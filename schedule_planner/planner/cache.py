@@ -0,0 +1,103 @@
+"""Version counters and hit/miss stats for the planner's caches.
+
+Cached entries never get deleted directly. Their keys embed a version
+token, and writers replace the token so the next read misses and re-renders.
+Stale entries simply age out of the cache backend. Tokens are random rather
+than counted: the database cache's ``incr`` is a read followed by a write,
+so two concurrent writers could land on the same "new" version.
+
+Hit/miss stats are counted in process memory: with the database cache in
+production, counting in the cache would add writes to every cached read.
+"""
+
+import threading
+import uuid
+from collections import Counter
+from datetime import date
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Rendered fragments are cheap to rebuild, so let them expire eventually
+# even if nothing bumps their version.
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def version_key(key: str) -> str:
+    """Cache key holding the version token of ``key``."""
+    return f"planner:version:{key}"
+
+
+def _new_version() -> str:
+    return uuid.uuid4().hex
+
+
+def get_version(key: str) -> str:
+    """Current version token stored under ``key``. A missing or evicted
+    token is replaced by a fresh one, never by a value used before."""
+    return cache.get_or_set(version_key(key), _new_version, timeout=None)
+
+
+def bump_version(key: str) -> str:
+    """Invalidate everything cached under ``key`` by replacing its
+    version token."""
+    version = _new_version()
+    cache.set(version_key(key), version, timeout=None)
+    if transaction.get_connection().in_atomic_block:
+        # A reader between now and the commit still sees the old rows and
+        # would cache them under this token; replace it again afterwards.
+        transaction.on_commit(
+            lambda: cache.set(version_key(key), _new_version(), timeout=None)
+        )
+    return version
+
+
+def month_key(year: int, month: int) -> str:
+    return f"month:{year}-{month:02d}"
+
+
+def bump_month(day: date) -> str:
+    """Invalidate the cached schedule for the month containing ``day``."""
+    return bump_version(month_key(day.year, day.month))
+
+
+def bump_months(days) -> None:
+    """Invalidate every month touched by ``days`` once."""
+    for year, month in {(d.year, d.month) for d in days if d}:
+        bump_version(month_key(year, month))
+
+
+def feed_key(kind: str, pk: int) -> str:
+    return f"feed:{kind}:{pk}"
+
+
+def bump_feeds(venue_ids=(), performer_ids=()) -> None:
+    """Invalidate the .ics feeds of the given venues and performers."""
+    for pk in {pk for pk in venue_ids if pk}:
+        bump_version(feed_key("venue", pk))
+    for pk in {pk for pk in performer_ids if pk}:
+        bump_version(feed_key("performer", pk))
+
+
+def record(name: str, hit: bool) -> None:
+    """Count a cache hit or miss for the cache called ``name``."""
+    with _stats_lock:
+        _stats[name, "hits" if hit else "misses"] += 1
+
+
+def stats(name: str) -> dict:
+    """Hit/miss counters this process recorded for the cache ``name``."""
+    with _stats_lock:
+        return {
+            "hits": _stats[name, "hits"],
+            "misses": _stats[name, "misses"],
+        }
+
+
+def reset_stats(name: str) -> None:
+    with _stats_lock:
+        _stats.pop((name, "hits"), None)
+        _stats.pop((name, "misses"), None)
@@ -0,0 +1,101 @@
+"""CSV and XLSX exports of the schedule for arbitrary date ranges.
+
+Rows come from a joined ``values_list().iterator()`` query and are written
+out as they arrive, so a multi-year export never holds the whole schedule
+in memory.
+"""
+
+import csv
+from datetime import date
+
+from .models import Event
+
+try:
+    import openpyxl
+except ImportError:  # XLSX export is optional
+    openpyxl = None
+
+EXPORT_FORMATS = ("csv", "xlsx")
+EXPORT_HEADER = ("Date", "Start Time", "End Time", "Venue", "Performer",
+                 "Activation")
+EXPORT_FIELDS = (
+    "date",
+    "performance_time_start",
+    "performance_time_end",
+    "venue__name",
+    "performer__name",
+    "activation__name",
+)
+
+
+def export_rows(start: date, end: date, venue_ids=None):
+    """Schedule rows in ``[start, end)`` ready to be written out.
+    Args:
+        start (date): First day included
+        end (date): First day excluded
+        venue_ids (list[int], optional): Only these venues
+    Yields:
+        tuple: Values in ``EXPORT_HEADER`` order
+    """
+    events = Event.objects.filter(date__gte=start, date__lt=end)
+    if venue_ids:
+        events = events.filter(venue_id__in=venue_ids)
+    rows = events.order_by("date", "performance_time_start", "pk").values_list(
+        *EXPORT_FIELDS
+    )
+    for day, start_time, end_time, venue, performer, activation in (
+        rows.iterator(chunk_size=2000)
+    ):
+        yield (
+            day.isoformat(),
+            start_time.strftime("%H:%M"),
+            end_time.strftime("%H:%M"),
+            venue,
+            performer,
+            activation or "",
+        )
+
+
+# Leading characters that make spreadsheet apps read a cell as a formula.
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _safe_cell(value):
+    """Quote user-entered text so spreadsheets show it instead of
+    evaluating it."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """Header and rows as CSV text lines."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for row in rows:
+        yield writer.writerow([_safe_cell(value) for value in row])
+
+
+def write_xlsx(rows, fileobj) -> None:
+    """Write the header and rows to ``fileobj`` as an XLSX workbook.
+
+    Uses openpyxl's write-only mode, which spools rows to disk instead of
+    keeping a cell object per value.
+    Raises:
+        RuntimeError: If openpyxl is not installed
+    """
+    if openpyxl is None:
+        raise RuntimeError("XLSX export requires openpyxl to be installed.")
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Schedule")
+    sheet.append(EXPORT_HEADER)
+    for row in rows:
+        sheet.append([_safe_cell(value) for value in row])
+    workbook.save(fileobj)
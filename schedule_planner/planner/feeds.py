@@ -0,0 +1,163 @@
+"""iCalendar (.ics) subscription feeds for venues and performers.
+
+Calendar clients poll these every few minutes, so a feed body is cached
+under a version token that the Event signal receivers replace, plus the
+first day of its window, which moves daily. The view answers conditional
+GETs from the same two without touching the database.
+Cache misses stream VEVENTs straight from a ``.iterator()`` query.
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from . import cache as planner_cache
+from .models import Event, Performer, Venue
+from .schedule import event_span
+
+FEED_MODELS = {"venue": Venue, "performer": Performer}
+# How far back a feed reaches. Older events are of no use to a calendar
+# client and would only make every poll heavier.
+FEED_PAST_DAYS = 90
+FEED_CACHE = "feed"
+PRODID = "-//Schedule Planner//Schedule Feed//EN"
+
+FEED_FIELDS = (
+    "pk",
+    "date",
+    "performance_time_start",
+    "performance_time_end",
+    "updated_at",
+    "venue__name",
+    "venue__address",
+    "performer__name",
+    "activation__name",
+)
+
+_signer = signing.Signer(salt="planner.feeds")
+
+
+def feed_token(kind: str, pk: int) -> str:
+    """Secret that lets calendar clients read a feed without logging in."""
+    return _signer.signature(f"{kind}:{pk}")
+
+
+def check_feed_token(kind: str, pk: int, token: str | None) -> bool:
+    return bool(token) and constant_time_compare(token, feed_token(kind, pk))
+
+
+def feed_since():
+    """First day a feed shows; the window moves every day."""
+    return timezone.localdate() - timedelta(days=FEED_PAST_DAYS)
+
+
+def feed_etag(kind: str, pk: int) -> str:
+    """ETag of the feed, derived from its version token and window."""
+    version = planner_cache.get_version(planner_cache.feed_key(kind, pk))
+    return hashlib.md5(
+        f"{kind}:{pk}:v{version}:{feed_since()}".encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+
+
+def _escape(value) -> str:
+    """Escape a TEXT value (RFC 5545 3.3.11)."""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Fold a content line to 75 octets (RFC 5545 3.1) and terminate it."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    while encoded:
+        size = 75 if not parts else 74
+        # Never split inside a multi-byte character.
+        while size < len(encoded) and (encoded[size] & 0xC0) == 0x80:
+            size -= 1
+        parts.append(encoded[:size].decode())
+        encoded = encoded[size:]
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _utc(value: datetime) -> str:
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def vevent(row: tuple) -> str:
+    """One VEVENT block for a ``FEED_FIELDS`` row."""
+    pk, day, start, end, updated_at, venue, address, performer, activation = row
+    start_dt, end_dt = event_span(day, start, end)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:event-{pk}@schedule-planner",
+        f"DTSTAMP:{_utc(updated_at)}",
+        f"LAST-MODIFIED:{_utc(updated_at)}",
+        f"DTSTART:{_utc(start_dt)}",
+        f"DTEND:{_utc(end_dt)}",
+        f"SUMMARY:{_escape(f'{performer} @ {venue}')}",
+        f"LOCATION:{_escape(address or venue)}",
+    ]
+    if activation:
+        lines.append(f"DESCRIPTION:{_escape(f'Activation: {activation}')}")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
+
+
+def _generate(kind: str, obj, since):
+    rows = (
+        Event.objects.filter(**{kind: obj}, date__gte=since)
+        .order_by("date", "performance_time_start")
+        .values_list(*FEED_FIELDS)
+    )
+    yield "".join(
+        _fold(line)
+        for line in (
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            f"PRODID:{PRODID}",
+            "CALSCALE:GREGORIAN",
+            "METHOD:PUBLISH",
+            f"X-WR-CALNAME:{_escape(obj.name)}",
+        )
+    )
+    for row in rows.iterator(chunk_size=500):
+        yield vevent(row)
+    yield "END:VCALENDAR\r\n"
+
+
+def _body_key(kind: str, pk: int, since) -> str:
+    version = planner_cache.get_version(planner_cache.feed_key(kind, pk))
+    return f"planner:feed:{kind}:{pk}:v{version}:{since}"
+
+
+def cached_feed(kind: str, pk: int) -> str | None:
+    """Complete body of a feed if the current version and window are
+    cached."""
+    body = cache.get(_body_key(kind, pk, feed_since()))
+    planner_cache.record(FEED_CACHE, hit=body is not None)
+    return body
+
+
+def stream_feed(kind: str, obj):
+    """Stream a feed from the database, caching the complete body once the
+    last chunk has been produced.
+    """
+    since = feed_since()
+    key = _body_key(kind, obj.pk, since)
+    parts = []
+    for chunk in _generate(kind, obj, since):
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, "".join(parts), planner_cache.FRAGMENT_TIMEOUT)
@@ -1,8 +1,12 @@
 # Import models/sql tables from models.py and the forms modules from Django.
 
+from datetime import timedelta
+
 from django import forms
 
+from .intervals import IntervalIndex
 from .models import ContactMessage, Event
+from .schedule import event_span
 
 # Create a new form sub class that we can build form objects with while tapping
 # into Django's powerful pre-built bass or superclasses
@@ -28,6 +32,60 @@ class EventForm(forms.ModelForm):
             "performance_time_end": forms.TimeInput(attrs={"type": "time"}),
         }
 
+    def clean(self):
+        """Reject bookings that overlap another set by the same performer."""
+        cleaned_data = super().clean()
+        performer = cleaned_data.get("performer")
+        day = cleaned_data.get("date")
+        start = cleaned_data.get("performance_time_start")
+        end = cleaned_data.get("performance_time_end")
+        if not (performer and day and start and end):
+            return cleaned_data
+
+        bookings = self.performer_bookings(performer, day, start, end)
+        for other in bookings.overlapping(*event_span(day, start, end)):
+            self.add_error(
+                "performer",
+                f"{performer} is already booked at {other['venue__name']} "
+                f"on {other['date']:%a %d %b} from "
+                f"{other['performance_time_start']:%H:%M} to "
+                f"{other['performance_time_end']:%H:%M}.",
+            )
+        return cleaned_data
+
+    def performer_bookings(self, performer, day, start, end) -> IntervalIndex:
+        """Interval index of the performer's other sets that could overlap.
+
+        One range query covers the previous day (its overnight sets run
+        into ``day``) and, for an overnight candidate, the next day too.
+        """
+        last_day = day + timedelta(days=1) if end <= start else day
+        rows = (
+            Event.objects.filter(
+                performer=performer,
+                date__gte=day - timedelta(days=1),
+                date__lte=last_day,
+            )
+            .exclude(pk=self.instance.pk)
+            .values(
+                "date",
+                "performance_time_start",
+                "performance_time_end",
+                "venue__name",
+            )
+        )
+        return IntervalIndex(
+            (
+                *event_span(
+                    row["date"],
+                    row["performance_time_start"],
+                    row["performance_time_end"],
+                ),
+                row,
+            )
+            for row in rows
+        )
+
 
 class ContactForm(forms.ModelForm):
     class Meta:
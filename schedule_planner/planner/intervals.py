@@ -0,0 +1,107 @@
+"""Interval arithmetic over bookings.
+
+Intervals are half-open ``[start, end)``, so back-to-back sets (one ending
+at 19h00, the next starting at 19h00) never conflict. Overnight sets are
+turned into proper spans by ``schedule.event_span`` before they get here.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from heapq import heappop, heappush
+
+
+class IntervalIndex:
+    """Static index answering "what overlaps [start, end)?" queries.
+
+    Intervals are sorted by start with a running maximum of their ends. A
+    query bisects to the last interval starting before ``end`` and walks
+    back only while an earlier interval can still reach past ``start``.
+    """
+
+    def __init__(self, intervals):
+        """
+        Args:
+            intervals (iterable): ``(start, end, item)`` tuples
+        """
+        self._intervals = sorted(intervals, key=lambda iv: iv[0])
+        self._starts = [start for start, _, _ in self._intervals]
+        self._max_end = []
+        for _, end, _ in self._intervals:
+            previous = self._max_end[-1] if self._max_end else end
+            self._max_end.append(max(previous, end))
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def overlapping(self, start, end) -> list:
+        """Items whose interval overlaps ``[start, end)``, by start."""
+        found = []
+        i = bisect_left(self._starts, end) - 1
+        while i >= 0 and self._max_end[i] > start:
+            item_start, item_end, item = self._intervals[i]
+            if item_end > start:
+                found.append(item)
+            i -= 1
+        found.reverse()
+        return found
+
+
+def sweep_overlaps(intervals, keys: dict):
+    """Every pair of overlapping intervals that share a group, in one pass.
+
+    ``intervals`` must arrive sorted by start, which lets the sweep consume
+    a streaming query: each group keeps a min-heap of the ends of its
+    active intervals, expired ones are popped as the line advances and the
+    ones left are exactly those overlapping the new interval. That is
+    O(n log n + k) for k reported pairs, with memory bounded by the number
+    of simultaneously active intervals.
+    Args:
+        intervals (iterable): ``(start, end, item)`` sorted by start
+        keys (dict): Group name -> function returning an item's group
+    Yields:
+        tuple: ``(group name, earlier item, later item)``
+    """
+    active = {name: defaultdict(list) for name in keys}
+    for seq, (start, end, item) in enumerate(intervals):
+        for name, key in keys.items():
+            heap = active[name][key(item)]
+            while heap and heap[0][0] <= start:
+                heappop(heap)
+            for _, _, other in sorted(heap, key=lambda entry: entry[1]):
+                yield name, other, item
+            heappush(heap, (end, seq, item))
+
+
+def merge_intervals(intervals) -> list[tuple]:
+    """Union of ``(start, end)`` intervals as sorted, disjoint intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_gaps(merged, start, end) -> list[tuple]:
+    """Parts of ``[start, end)`` not covered by ``merged`` intervals.
+    Args:
+        merged (list): Output of ``merge_intervals``; its ends are sorted,
+            so intervals finishing before ``start`` are skipped by bisection
+        start: Window start
+        end: Window end
+    """
+    gaps = []
+    cursor = start
+    first = bisect_right(merged, start, key=lambda interval: interval[1])
+    for i in range(first, len(merged)):
+        busy_start, busy_end = merged[i]
+        if busy_start >= end:
+            break
+        if busy_start > cursor:
+            gaps.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
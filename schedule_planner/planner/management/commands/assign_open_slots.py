@@ -0,0 +1,67 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from planner.models import OpenSlot, Performer
+from planner.solver import fill_open_slots, solve_open_slots
+
+
+class Command(BaseCommand):
+    help = "Assigns performers to unfilled open slots"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="start", type=datetime.date.fromisoformat,
+            help="First day to fill (YYYY-MM-DD), defaults to today",
+        )
+        parser.add_argument(
+            "--to", dest="end", type=datetime.date.fromisoformat,
+            help="Last day to fill, inclusive; defaults to a month after --from",
+        )
+        parser.add_argument(
+            "--venue", action="append", type=int, default=[],
+            help="Venue id to fill; repeat for several venues",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Print the proposed assignment without creating events",
+        )
+
+    def handle(self, *args, **options):
+        start = options["start"] or timezone.localdate()
+        end = options["end"] or start + datetime.timedelta(days=31)
+        if end < start:
+            raise CommandError("--to must not be before --from")
+
+        slots = OpenSlot.objects.filter(
+            event__isnull=True, date__gte=start, date__lte=end
+        ).select_related("venue")
+        if options["venue"]:
+            slots = slots.filter(venue_id__in=options["venue"])
+        slots = list(slots)
+
+        solution = solve_open_slots(slots)
+        names = dict(Performer.objects.values_list("pk", "name"))
+        for slot in slots:
+            performer = names.get(solution.assignment.get(slot.pk), "-")
+            self.stdout.write(
+                f"{slot.date} {slot.performance_time_start:%H:%M}-"
+                f"{slot.performance_time_end:%H:%M} {slot.venue}: {performer}"
+            )
+        for pk, hours in sorted(
+            solution.hours.items(), key=lambda item: -item[1]
+        ):
+            if hours:
+                self.stdout.write(f"{names[pk]}: {hours:g}h")
+
+        if not options["dry_run"] and solution.assignment:
+            fill_open_slots(slots, solution)
+        summary = (
+            f"{len(solution.assignment)} slot(s) assigned, "
+            f"{len(solution.unassigned)} left open."
+        )
+        self.stderr.write(
+            self.style.WARNING(summary)
+            if solution.unassigned
+            else self.style.SUCCESS(summary)
+        )
@@ -0,0 +1,166 @@
+import contextlib
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from planner.models import Event, Performer, Venue
+from planner.outbox import enqueue_upserts, process_outbox
+from planner.sync import CalendarSyncEngine
+from planner.utils import fake_calendar, google_calendar
+
+
+class Rollback(Exception):
+    """Raised to undo the benchmark's rows."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures Google Calendar pushes and pulls against the local fake "
+        "calendar; the rows it creates are rolled back"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=10000)
+        parser.add_argument(
+            "--venues", type=int, default=4,
+            help="Venue calendars the events are spread over",
+        )
+        parser.add_argument(
+            "--changes", type=int, default=100,
+            help="Events moved on the fake before the incremental pull",
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.05,
+            help="Seconds per HTTP round trip",
+        )
+        parser.add_argument(
+            "--error-rate", type=float, default=0.0,
+            help="Share of API calls failing with 429 or 503",
+        )
+        parser.add_argument("--page-size", type=int, default=250)
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Outbox rows claimed per process_outbox call",
+        )
+        parser.add_argument(
+            "--concurrency", type=int,
+            help="Venue calendars fetched at once "
+                 "(defaults to GOOGLE_SYNC_CONCURRENCY)",
+        )
+        parser.add_argument(
+            "--qps", type=float, default=0,
+            help="Client rate limit; 0 leaves the calls unthrottled",
+        )
+
+    def handle(self, *args, **options):
+        if options["events"] < 1 or options["venues"] < 1:
+            raise CommandError("--events and --venues must be positive")
+        fake = fake_calendar.install(fake_calendar.FakeCalendar(
+            latency=options["latency"], error_rate=options["error_rate"],
+        ))
+        qps = options["qps"] or 10 ** 9
+        limiter = google_calendar._limiter
+        google_calendar._limiter = google_calendar.TokenBucket(qps, qps)
+        try:
+            with override_settings(GOOGLE_CALENDAR_FAKE="memory"):
+                with transaction.atomic():
+                    self._run(fake, options)
+                    raise Rollback
+        except Rollback:
+            pass
+        finally:
+            google_calendar._limiter = limiter
+            fake_calendar.install()
+
+    def _run(self, fake, options):
+        venues = [
+            Venue.objects.create(
+                name=f"Benchmark venue {i}",
+                google_calendar_id=f"benchmark-{i}@fake",
+            )
+            for i in range(options["venues"])
+        ]
+        performer = Performer.objects.create(name="Benchmark performer")
+        first = datetime.date.today()
+        events = Event.objects.bulk_create(
+            Event(
+                date=first + datetime.timedelta(days=i // 24),
+                performance_time_start=datetime.time(i % 24),
+                performance_time_end=datetime.time(i % 24, 45),
+                venue=venues[i % len(venues)],
+                performer=performer,
+            )
+            for i in range(options["events"])
+        )
+        google_calendar.reset_call_stats()
+
+        enqueue_upserts(events)
+        with self._measure(fake, "push", len(events)):
+            while any(process_outbox(options["batch_size"]).values()):
+                pass
+        self._report_calls()
+
+        engine = CalendarSyncEngine(
+            Venue.objects.filter(pk__in=[venue.pk for venue in venues]),
+            concurrency=options["concurrency"],
+            page_size=options["page_size"],
+        )
+        with self._measure(fake, "full pull", len(events)):
+            report = engine.run()
+        self._report_pull(report)
+
+        # Move some events an hour later, as if edited in Google Calendar.
+        moved = Event.objects.filter(
+            pk__in=[event.pk for event in events[:options["changes"]]]
+        ).select_related("venue")
+        for event in moved:
+            calendar_id = event.venue.google_calendar_id
+            g_event = fake.calendars[calendar_id][event.google_event_id]
+            fake.update_event(
+                calendar_id, event.google_event_id,
+                start=_later(g_event["start"]), end=_later(g_event["end"]),
+            )
+
+        with self._measure(fake, "incremental pull", options["changes"]):
+            report = engine.run()
+        self._report_pull(report)
+
+    @contextlib.contextmanager
+    def _measure(self, fake, name, items):
+        fake.reset_counters()
+        started = time.monotonic()
+        yield
+        seconds = time.monotonic() - started
+        self.stdout.write(
+            f"{name}: {items} event(s) in {seconds:.2f}s "
+            f"({items / seconds:.0f}/s), {fake.round_trips} round trip(s), "
+            f"{sum(fake.calls.values())} API call(s)"
+        )
+
+    def _report_calls(self):
+        calls = google_calendar.call_stats()
+        if calls.get("retried") or calls.get("failed"):
+            self.stdout.write(
+                "  " + ", ".join(
+                    f"{n} {name}" for name, n in sorted(calls.items())
+                )
+            )
+
+    def _report_pull(self, report):
+        self.stdout.write(
+            f"  {report.checked} checked, {report.updated} updated, "
+            f"{report.api_calls} list call(s)"
+        )
+        for venue in report.venues:
+            if venue.error:
+                self.stdout.write(
+                    self.style.ERROR(f"  {venue.name}: {venue.error}")
+                )
+
+
+def _later(value, hours=1):
+    moved = datetime.datetime.fromisoformat(value["dateTime"])
+    moved += datetime.timedelta(hours=hours)
+    return {**value, "dateTime": moved.isoformat()}
@@ -0,0 +1,69 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from planner.export import EXPORT_FORMATS, csv_lines, export_rows, write_xlsx
+from planner.models import Venue
+
+
+class Command(BaseCommand):
+    help = "Exports the schedule for a date range as CSV or XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="start", required=True,
+            type=datetime.date.fromisoformat,
+            help="First day to export (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--to", dest="end", required=True,
+            type=datetime.date.fromisoformat,
+            help="Last day to export, inclusive (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--venue", action="append", default=[],
+            help="Venue name or id to include; repeat for several venues",
+        )
+        parser.add_argument(
+            "--format", choices=EXPORT_FORMATS, default="csv",
+        )
+        parser.add_argument(
+            "--output", "-o",
+            help="File to write; CSV goes to stdout when omitted",
+        )
+
+    def handle(self, *args, **options):
+        start = options["start"]
+        end = options["end"] + datetime.timedelta(days=1)
+        if end <= start:
+            raise CommandError("--to must not be before --from")
+
+        venue_ids = [self._venue_id(value) for value in options["venue"]]
+        rows = export_rows(start, end, venue_ids=venue_ids)
+
+        if options["format"] == "xlsx":
+            if not options["output"]:
+                raise CommandError("XLSX export needs --output")
+            try:
+                with open(options["output"], "wb") as fileobj:
+                    write_xlsx(rows, fileobj)
+            except RuntimeError as e:
+                raise CommandError(str(e))
+        elif options["output"]:
+            with open(options["output"], "w", newline="") as fileobj:
+                fileobj.writelines(csv_lines(rows))
+        else:
+            for line in csv_lines(rows):
+                self.stdout.write(line, ending="")
+            return
+
+        self.stderr.write(
+            self.style.SUCCESS(f"Schedule exported to {options['output']}")
+        )
+
+    def _venue_id(self, value):
+        if value.isdigit():
+            return int(value)
+        try:
+            return Venue.objects.values_list("pk", flat=True).get(name=value)
+        except Venue.DoesNotExist:
+            raise CommandError(f'Venue "{value}" not found.')
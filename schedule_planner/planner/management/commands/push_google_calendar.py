@@ -0,0 +1,66 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from planner.models import Event
+from planner.outbox import enqueue_upserts, process_outbox
+from planner.utils.google_calendar import CalendarUnavailable, call_stats
+
+
+class Command(BaseCommand):
+    help = "Pushes every event in a date range to Google Calendar again"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="start", required=True,
+            type=datetime.date.fromisoformat,
+            help="First day to push (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--to", dest="end", required=True,
+            type=datetime.date.fromisoformat,
+            help="Last day to push, inclusive (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--venue", action="append", type=int, default=[],
+            help="Venue id to push; repeat for several venues",
+        )
+        parser.add_argument(
+            "--queue-only", action="store_true",
+            help="Leave the pushes to run_calendar_worker",
+        )
+
+    def handle(self, *args, **options):
+        if options["end"] < options["start"]:
+            raise CommandError("--to must not be before --from")
+        events = Event.objects.filter(
+            date__gte=options["start"], date__lte=options["end"]
+        )
+        if options["venue"]:
+            events = events.filter(venue_id__in=options["venue"])
+        events = list(events.only("pk"))
+        enqueue_upserts(events)
+        self.stderr.write(f"{len(events)} event(s) queued.")
+        if options["queue_only"]:
+            return
+
+        totals = dict.fromkeys(("sent", "retried", "failed"), 0)
+        try:
+            while True:
+                counts = process_outbox()
+                if not any(counts.values()):
+                    break
+                for name, n in counts.items():
+                    totals[name] += n
+        except CalendarUnavailable:
+            raise CommandError("Google Calendar is not configured.")
+        self.stderr.write(
+            self.style.SUCCESS(
+                ", ".join(f"{n} {name}" for name, n in totals.items())
+            )
+        )
+        calls = call_stats()
+        if calls:
+            self.stderr.write(
+                "Google API calls: "
+                + ", ".join(f"{n} {name}" for name, n in sorted(calls.items()))
+            )
@@ -0,0 +1,119 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from planner.outbox import process_outbox
+from planner.sync import run_sync_job
+from planner.utils.google_calendar import (
+    CalendarUnavailable,
+    calendar_service_health,
+    reset_calendar_service,
+)
+from planner.watch import renew_watch_channels, run_requested_syncs
+
+# Seconds between checks for watch channels that need renewing.
+RENEW_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends queued event changes to Google Calendar, pulls the venues "
+        "Google notified us about and runs the syncs staff asked for"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Drain the outbox once and exit",
+        )
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--interval", type=float, default=5,
+            help="Seconds to wait when the outbox is empty",
+        )
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Check the service account against Google and exit",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            return self._check()
+        renewed_at = None
+        while True:
+            close_old_connections()
+            # Each step runs on its own, so one that cannot reach Google
+            # does not hold back the others.
+            self._unavailable = False
+            counts = self._step(process_outbox, options["batch_size"])
+            report = self._step(run_requested_syncs)
+            job = self._step(run_sync_job)
+            if settings.GOOGLE_WEBHOOK_URL and (
+                renewed_at is None
+                or time.monotonic() - renewed_at > RENEW_INTERVAL
+            ):
+                renewed_at = time.monotonic()
+                self._step(self._renew_channels)
+            if self._unavailable:
+                self.stderr.write(
+                    self.style.WARNING("Google Calendar is not configured.")
+                )
+                # Reload the key from disk next time round instead of
+                # waiting for the periodic file check.
+                reset_calendar_service()
+            if report:
+                self.stdout.write(
+                    f"Pulled {len(report.venues)} venue(s): "
+                    f"{report.updated} event(s) updated"
+                )
+            if job:
+                self.stdout.write(
+                    f"Sync job {job.pk} {job.status}: {job.updated} event(s) "
+                    f"updated in {job.seconds:.1f}s"
+                )
+            if counts and any(counts.values()):
+                self.stdout.write(
+                    ", ".join(f"{n} {name}" for name, n in counts.items())
+                )
+                continue
+            if options["once"]:
+                return
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                return
+
+    def _step(self, step, *args):
+        """``step(*args)``, or None when Google Calendar is not
+        configured."""
+        try:
+            return step(*args)
+        except CalendarUnavailable:
+            self._unavailable = True
+            return None
+
+    def _renew_channels(self):
+        try:
+            for channel in renew_watch_channels():
+                self.stdout.write(f"Renewed {channel}")
+        except CalendarUnavailable:
+            raise
+        except Exception as e:
+            # Retried at the next interval; pulls still work meanwhile.
+            self.stderr.write(
+                self.style.ERROR(f"Renewing watch channels failed: {e}")
+            )
+
+    def _check(self):
+        health = calendar_service_health(refresh=True)
+        if not health["configured"]:
+            raise CommandError("Google Calendar is not configured.")
+        self.stdout.write(f"Service account: {health['service_account']}")
+        if "error" in health:
+            raise CommandError(
+                f"Refreshing the token failed: {health['error']}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Token valid until {health['token_expiry']}")
+        )
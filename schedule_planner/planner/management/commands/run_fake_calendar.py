@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from planner.utils.fake_calendar import FakeCalendar, serve
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves the local Google Calendar API fake over HTTP; point "
+        "GOOGLE_CALENDAR_FAKE at its URL to use it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--latency", type=float, default=0.0,
+            help="Seconds added to every request",
+        )
+        parser.add_argument(
+            "--error-rate", type=float, default=0.0,
+            help="Share of API calls failing with 429 or 503",
+        )
+
+    def handle(self, *args, **options):
+        calendar = FakeCalendar(
+            latency=options["latency"], error_rate=options["error_rate"]
+        )
+        server = serve(calendar, options["host"], options["port"])
+        host, port = server.server_address[:2]
+        self.stdout.write(
+            f"Fake Google Calendar on http://{host}:{port}/ "
+            f"(GOOGLE_CALENDAR_FAKE=http://{host}:{port}/)"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(
+                f"{calendar.round_trips} request(s): "
+                + ", ".join(
+                    f"{n} {name}" for name, n in sorted(calendar.calls.items())
+                )
+            )
@@ -0,0 +1,112 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from planner.intervals import sweep_overlaps
+from planner.models import Event
+from planner.schedule import event_span
+
+CONFLICT_FIELDS = (
+    "pk",
+    "date",
+    "performance_time_start",
+    "performance_time_end",
+    "venue_id",
+    "venue__name",
+    "performer_id",
+    "performer__name",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports performer double-bookings and venue overlaps in a date "
+        "range as JSON lines"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="start", type=datetime.date.fromisoformat,
+            help="First day to scan (YYYY-MM-DD), defaults to today",
+        )
+        parser.add_argument(
+            "--to", dest="end", type=datetime.date.fromisoformat,
+            help="Last day to scan, inclusive; defaults to a year after --from",
+        )
+        parser.add_argument(
+            "--only", choices=("performer", "venue"),
+            help="Report only one kind of conflict",
+        )
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Exit with an error when any conflict is found",
+        )
+
+    def handle(self, *args, **options):
+        start = options["start"] or timezone.localdate()
+        end = options["end"] or start + datetime.timedelta(days=365)
+        if end < start:
+            raise CommandError("--to must not be before --from")
+
+        keys = {
+            "performer": lambda row: row["performer_id"],
+            "venue": lambda row: row["venue_id"],
+        }
+        if options["only"]:
+            keys = {options["only"]: keys[options["only"]]}
+
+        found = 0
+        for kind, first, second in sweep_overlaps(self._spans(start, end), keys):
+            # Rows from the day before only matter when they run into the
+            # range.
+            if second["date"] < start:
+                continue
+            found += 1
+            self.stdout.write(json.dumps(self._conflict(kind, first, second)))
+
+        summary = f"{found} conflict(s) between {start} and {end}."
+        if found and options["check"]:
+            raise CommandError(summary)
+        self.stderr.write(
+            self.style.WARNING(summary) if found else self.style.SUCCESS(summary)
+        )
+
+    def _spans(self, start, end):
+        """Rows of the range, plus the previous day for overnight sets,
+        streamed in start order with their spans."""
+        rows = (
+            Event.objects.filter(
+                date__gte=start - datetime.timedelta(days=1), date__lte=end
+            )
+            .order_by("date", "performance_time_start", "pk")
+            .values(*CONFLICT_FIELDS)
+        )
+        for row in rows.iterator(chunk_size=2000):
+            span_start, span_end = event_span(
+                row["date"],
+                row["performance_time_start"],
+                row["performance_time_end"],
+            )
+            row["start"], row["end"] = span_start, span_end
+            yield span_start, span_end, row
+
+    @staticmethod
+    def _conflict(kind, first, second):
+        def describe(row):
+            return {
+                "id": row["pk"],
+                "date": row["date"].isoformat(),
+                "start": row["performance_time_start"].strftime("%H:%M"),
+                "end": row["performance_time_end"].strftime("%H:%M"),
+                "venue": row["venue__name"],
+                "performer": row["performer__name"],
+            }
+
+        return {
+            "type": kind,
+            "name": first[f"{kind}__name"],
+            "overlap_start": max(first["start"], second["start"]).isoformat(),
+            "overlap_end": min(first["end"], second["end"]).isoformat(),
+            "events": [describe(first), describe(second)],
+        }
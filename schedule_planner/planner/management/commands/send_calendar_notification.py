@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from planner.models import CalendarWatchChannel
+from planner.watch import send_notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Posts a Google-style push notification for a venue's channel to "
+        "the webhook, standing in for Google during local testing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--venue", type=int, required=True)
+        parser.add_argument(
+            "--base-url", default="http://127.0.0.1:8000",
+            help="Where the development server listens",
+        )
+        parser.add_argument(
+            "--state", default="exists", choices=("sync", "exists"),
+        )
+
+    def handle(self, *args, **options):
+        channel = (
+            CalendarWatchChannel.objects.filter(venue_id=options["venue"])
+            .order_by("-expiration")
+            .first()
+        )
+        if channel is None:
+            raise CommandError("That venue has no watch channel.")
+        url = options["base_url"].rstrip("/") + reverse(
+            "planner:calendar_notification"
+        )
+        status = send_notification(channel, url, options["state"])
+        self.stdout.write(f"{url} answered {status}")
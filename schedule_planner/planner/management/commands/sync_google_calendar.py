@@ -1,64 +1,83 @@
-from django.core.management.base import BaseCommand
-from planner.models import Event, Venue
-from planner.utils.google_calendar import list_upcoming_events
-from django.utils.dateparse import parse_datetime
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from planner.models import Venue
+from planner.sync import CalendarSyncEngine
 
 
 class Command(BaseCommand):
     help = 'Sync events from Google Calendar to Django'
 
-    def handle(self, *args, **kwargs):
-        self.stdout.write('Starting Google Calendar sync...')
-        # 1 Get all venues that have a Google Calendar ID.
-        venues = (Venue.objects.exclude(google_calendar_id__isnull=True)
-                  .exclude(google_calendar_id__exact=''))
-
-        for venue in venues:
-            self.stdout.write(f"Checking venue: {venue.name} "
-                              f"({venue.google_calendar_id})with Calendar ID: "
-                              f"{venue.google_calendar_id})")
-            # 2 Fetch events from Google for this venue
-            google_events = (list_upcoming_events(calendar_id=venue.
-                                                  google_calendar_id))
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--venue', action='append', default=[],
+            help='Venue name or id to sync; repeat for several venues',
+        )
+        parser.add_argument(
+            '--since', type=datetime.date.fromisoformat,
+            help='Read events from this day on (YYYY-MM-DD) instead of the '
+                 'changes since the last sync',
+        )
+        parser.add_argument(
+            '--until', type=datetime.date.fromisoformat,
+            help='Read events up to this day, inclusive (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Print the changes without saving them',
+        )
+        parser.add_argument(
+            '--concurrency', type=int,
+            help='Venue calendars fetched at once '
+                 '(defaults to GOOGLE_SYNC_CONCURRENCY)',
+        )
+        parser.add_argument('--page-size', type=int, default=250)
 
-            for g_event in google_events:
-                # 3 Extract data (ID. summary. start time)
-                g_id = g_event.get('id')
-                summary = g_event.get('summary')
-                start_data = g_event.get('start', {})
-                end_data = g_event.get('end', {})
-                # Parse times (Gogole gives strings, we need Pythin objects)
-                start_iso = start_data.get('dateTime', start_data.get('date'))
-                end_iso = end_data.get('dateTime', end_data.get('date'))
-                # Convert string "2025-12-31T20:00..." to a real
-                # datetime object
-                start_dt = parse_datetime(start_iso)
-                end_dt = parse_datetime(end_iso)
+    def handle(self, *args, **options):
+        if options['since'] and options['until'] \
+                and options['until'] < options['since']:
+            raise CommandError('--until must not be before --since')
+        venues = Venue.objects.all()
+        if options['venue']:
+            venues = venues.filter(
+                pk__in=[self._venue_id(value) for value in options['venue']]
+            )
 
-                if not start_dt or not end_dt:
-                    continue  # Skip if dates are weird.
-
-                # THE CORE LOGIC : FIND AND UPDATE
-                try:
-                    # try to find the event in our DB using the GOogle ID.
-                    event = Event.objects.get(google_event_id=g_id)
+        self.stdout.write('Starting Google Calendar sync...')
+        report = CalendarSyncEngine(
+            venues,
+            since=options['since'],
+            until=options['until'],
+            dry_run=options['dry_run'],
+            concurrency=options['concurrency'],
+            page_size=options['page_size'],
+        ).run()
 
-                    # Check if the time has changed
-                    if event.date != start_dt.date() or \
-                        event.performance_time_start != start_dt.time() or \
-                            event.performance_time_end != end_dt.time():
+        for venue in report.venues:
+            line = (f"{venue.name}: {venue.counts.checked} checked, "
+                    f"{venue.counts.updated} updated in "
+                    f"{venue.fetch_seconds:.2f}s "
+                    f"(+{venue.reconcile_seconds:.2f}s database, "
+                    f"{venue.api_calls} API call(s))")
+            if venue.error:
+                self.stdout.write(self.style.ERROR(f"{line}: {venue.error}"))
+                continue
+            self.stdout.write(line)
+            for change in venue.changes:
+                self.stdout.write(f"  {change}")
+            if venue.counts.external:
+                self.stdout.write(self.style.WARNING(
+                    f"  Skipped {venue.counts.external} external event(s)"))
 
-                        (self.stdout.
-                         write(self.style.SUCCESS(f" UPDATING {summary}")))
+        verb = 'would be updated' if report.dry_run else 'updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.updated} event(s) {verb}, {report.checked} checked "
+            f"with {report.api_calls} API call(s) in {report.seconds:.2f}s."))
 
-                        # Update the database (bypassing
-                        # signals to avoids loops)
-                        Event.objects.filter(pk=event.pk).update(
-                            date=start_dt.date(),
-                            performance_time_start=start_dt.time(),
-                            performance_time_end=end_dt.time()
-                        )
-                except Event.DoesNotExist:
-                    (self.stdout.
-                     write(self.style.
-                           WARNING(f" Skipping external event: {summary}")))
+    def _venue_id(self, value):
+        if value.isdigit():
+            return int(value)
+        try:
+            return Venue.objects.values_list('pk', flat=True).get(name=value)
+        except Venue.DoesNotExist:
+            raise CommandError(f'Venue "{value}" not found.')
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from planner.models import CalendarWatchChannel, Venue
+from planner.utils.google_calendar import CalendarUnavailable
+from planner.watch import renew_watch_channels, stop_channel
+
+
+class Command(BaseCommand):
+    help = (
+        "Registers (or renews) Google push-notification channels for the "
+        "venue calendars"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--venue", action="append", type=int, default=[],
+            help="Venue id to watch; repeat for several venues",
+        )
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Replace channels that are not about to expire too",
+        )
+        parser.add_argument(
+            "--stop", action="store_true",
+            help="Stop the channels instead of opening new ones",
+        )
+
+    def handle(self, *args, **options):
+        venues = Venue.objects.all()
+        if options["venue"]:
+            venues = venues.filter(pk__in=options["venue"])
+
+        if options["stop"]:
+            channels = CalendarWatchChannel.objects.filter(venue__in=venues)
+            for channel in channels:
+                stop_channel(channel)
+                self.stdout.write(f"Stopped {channel}")
+            return
+
+        if not settings.GOOGLE_WEBHOOK_URL:
+            raise CommandError("Set GOOGLE_WEBHOOK_URL first.")
+        try:
+            channels = renew_watch_channels(venues, force=options["force"])
+        except CalendarUnavailable:
+            raise CommandError("Google Calendar is not configured.")
+        for channel in channels:
+            self.stdout.write(self.style.SUCCESS(f"Watching {channel.venue}"
+                                                 f" until {channel.expiration}"))
+        if not channels:
+            self.stdout.write("Every channel is up to date.")
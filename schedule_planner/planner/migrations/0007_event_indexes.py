@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planner", "0006_event_updated_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="event",
+            name="google_event_id",
+            field=models.CharField(
+                blank=True, max_length=255, null=True, unique=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["date", "performance_time_start"],
+                name="event_date_start_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["venue", "date"], name="event_venue_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["performer", "date"], name="event_performer_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planner", "0007_event_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OpenSlot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "performance_time_start",
+                    models.TimeField(verbose_name="Start Time"),
+                ),
+                (
+                    "performance_time_end",
+                    models.TimeField(verbose_name="End Time"),
+                ),
+                (
+                    "genre",
+                    models.CharField(
+                        blank=True,
+                        help_text="Only performers of this genre are considered.",
+                        max_length=50,
+                        null=True,
+                    ),
+                ),
+                (
+                    "activation",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="planner.activation",
+                    ),
+                ),
+                (
+                    "event",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="open_slot",
+                        to="planner.event",
+                    ),
+                ),
+                (
+                    "venue",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="planner.venue",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["date", "performance_time_start"],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planner", "0008_openslot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CalendarOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("event_id", models.IntegerField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("upsert", "Create or update"),
+                            ("delete", "Delete"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "google_event_id",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                (
+                    "calendar_id",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+            ],
+            options={
+                "verbose_name_plural": "calendar outbox",
+                "ordering": ["pk"],
+                "indexes": [
+                    models.Index(
+                        fields=["event_id", "id"], name="outbox_event_idx"
+                    ),
+                    models.Index(
+                        fields=["next_attempt_at"], name="outbox_due_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planner", "0009_calendaroutbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="venue",
+            name="google_sync_token",
+            field=models.CharField(
+                blank=True, editable=False, max_length=255, null=True
+            ),
+        ),
+    ]
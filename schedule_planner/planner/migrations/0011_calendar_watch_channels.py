@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planner", "0010_venue_google_sync_token"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="venue",
+            name="google_sync_requested_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name="CalendarWatchChannel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("channel_id", models.CharField(max_length=64, unique=True)),
+                ("resource_id", models.CharField(max_length=255)),
+                ("token", models.CharField(max_length=64)),
+                ("expiration", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "venue",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="watch_channels",
+                        to="planner.venue",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["expiration"],
+            },
+        ),
+    ]
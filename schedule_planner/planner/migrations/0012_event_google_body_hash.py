@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("planner", "0011_calendar_watch_channels"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="google_body_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # import os
 
@@ -34,6 +35,15 @@ class Venue(models.Model):
         help_text="The Google Calendar ID for this venue "
                   "(e.g., 'primary' or 'c_123...@group.calendar.google.com')"
     )
+    # nextSyncToken of the last pull, so the next one only fetches changes.
+    google_sync_token = models.CharField(
+        max_length=255, blank=True, null=True, editable=False
+    )
+    # Set by the push-notification webhook; the calendar worker pulls the
+    # venue and clears it.
+    google_sync_requested_at = models.DateTimeField(
+        blank=True, null=True, editable=False
+    )
 
     def __str__(self):
         return self.name
@@ -82,7 +92,17 @@ class Event(models.Model):
     activation = models.ForeignKey(
         Activation, on_delete=models.SET_NULL, blank=True, null=True
     )
-    google_event_id = models.CharField(max_length=255, blank=True, null=True)
+    google_event_id = models.CharField(
+        max_length=255, blank=True, null=True, unique=True
+    )
+    # Hash of the body last pushed to Google, so saves that change nothing
+    # Google shows are not pushed again.
+    google_body_hash = models.CharField(
+        max_length=64, blank=True, editable=False
+    )
+    # Drives the schedule ETag/Last-Modified. Code that changes displayed
+    # fields with queryset.update() must set it explicitly.
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         """Human readable string from Event object
@@ -94,6 +114,156 @@ class Event(models.Model):
     class Meta:
         ordering = ["date", "performance_time_start"]
         permissions = [("can_manage_event_engineer", "can_assign_engineers")]
+        # Schedule reads filter on date ranges (date__gte/date__lt, never
+        # date__year/date__month which hide the column behind an extract).
+        indexes = [
+            models.Index(
+                fields=["date", "performance_time_start"],
+                name="event_date_start_idx",
+            ),
+            models.Index(fields=["venue", "date"], name="event_venue_date_idx"),
+            models.Index(
+                fields=["performer", "date"], name="event_performer_date_idx"
+            ),
+        ]
+
+
+class OpenSlot(models.Model):
+    """A set that still needs a performer. The assignment solver fills
+    these and links each one to the Event it created.
+    """
+
+    date = models.DateField()
+    performance_time_start = models.TimeField(verbose_name="Start Time")
+    performance_time_end = models.TimeField(verbose_name="End Time")
+    venue = models.ForeignKey(Venue, on_delete=models.CASCADE)
+    activation = models.ForeignKey(
+        Activation, on_delete=models.SET_NULL, blank=True, null=True
+    )
+    genre = models.CharField(
+        max_length=50,
+        blank=True,
+        null=True,
+        help_text="Only performers of this genre are considered.",
+    )
+    event = models.OneToOneField(
+        Event,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="open_slot",
+    )
+
+    def __str__(self):
+        return f"Open slot on {self.date} in {self.venue}"
+
+    class Meta:
+        ordering = ["date", "performance_time_start"]
+
+
+class CalendarOutbox(models.Model):
+    """A pending Google Calendar push, written by the Event signals in the
+    same transaction as the change and sent by ``run_calendar_worker``.
+    """
+
+    UPSERT = "upsert"
+    DELETE = "delete"
+    ACTIONS = [(UPSERT, "Create or update"), (DELETE, "Delete")]
+
+    # Not a foreign key: delete rows outlive their event.
+    event_id = models.IntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    google_event_id = models.CharField(max_length=255, blank=True, null=True)
+    calendar_id = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.action} event {self.event_id}"
+
+    class Meta:
+        ordering = ["pk"]
+        verbose_name_plural = "calendar outbox"
+        indexes = [
+            models.Index(fields=["event_id", "id"], name="outbox_event_idx"),
+            models.Index(fields=["next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+
+class CalendarWatchChannel(models.Model):
+    """A Google push-notification channel watching a venue calendar."""
+
+    venue = models.ForeignKey(
+        Venue, on_delete=models.CASCADE, related_name="watch_channels"
+    )
+    channel_id = models.CharField(max_length=64, unique=True)
+    resource_id = models.CharField(max_length=255)
+    # Echoed back by Google in X-Goog-Channel-Token on every notification.
+    token = models.CharField(max_length=64)
+    expiration = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Watch on {self.venue} until {self.expiration}"
+
+    class Meta:
+        ordering = ["expiration"]
+
+
+class CalendarSyncJob(models.Model):
+    """A staff-requested pull of every venue calendar, run by
+    ``run_calendar_worker`` while the page polls its status.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+    ACTIVE = (QUEUED, RUNNING)
+
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    requested_by = models.ForeignKey(
+        "auth.User", on_delete=models.SET_NULL, blank=True, null=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    venue_count = models.PositiveIntegerField(default=0)
+    # One {"name", "checked", "updated", "external", "error"} per venue,
+    # appended as each venue finishes.
+    venues = models.JSONField(default=list, blank=True)
+    checked = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Calendar sync {self.pk} ({self.status})"
+
+    @property
+    def seconds(self):
+        if not self.started_at:
+            return None
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            # Concurrent requests dedupe onto the job already waiting.
+            models.UniqueConstraint(
+                fields=["status"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="one_active_sync_job_per_status",
+            ),
+        ]
 
 
 class ContactMessage(models.Model):
@@ -0,0 +1,252 @@
+"""Transactional outbox for Google Calendar pushes.
+
+The Event signals only record what has to be sent, in the same transaction
+as the change, so saving an event never waits on Google. The
+``run_calendar_worker`` command drains the table:
+
+* rows are handled oldest first and only the oldest live row of each event
+  is eligible, so pushes for one event are never reordered;
+* consecutive upserts of an event collapse into one push of its current
+  state, and none at all when that state hashes like the last push;
+* each claimed batch goes out as Google batch HTTP requests;
+* failures are retried with exponential backoff up to ``MAX_ATTEMPTS``,
+  after which the row is kept (with its error) for inspection and no
+  longer blocks the event's later rows.
+
+Claimed rows are leased with ``select_for_update(skip_locked=True)``, so
+several workers can share the table on databases that support it.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+
+from .models import CalendarOutbox, Event
+from .utils.google_calendar import (
+    CalendarUnavailable,
+    calendar_id_for,
+    event_body_hash,
+    push_events,
+    remove_events,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 10
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+# How long a claimed row stays invisible to other workers.
+LEASE = timedelta(minutes=5)
+
+
+def enqueue_upsert(event) -> None:
+    """Queue a create-or-update of ``event``."""
+    CalendarOutbox.objects.create(
+        event_id=event.pk, action=CalendarOutbox.UPSERT
+    )
+
+
+def enqueue_upserts(events) -> None:
+    """Queue creates-or-updates for events written in bulk."""
+    CalendarOutbox.objects.bulk_create(
+        CalendarOutbox(event_id=event.pk, action=CalendarOutbox.UPSERT)
+        for event in events
+    )
+
+
+def enqueue_stale(events) -> int:
+    """Queue upserts for the pushed ``events`` whose body no longer hashes
+    like their last push, e.g. after renaming their venue.
+    Args:
+        events (QuerySet): Candidate events
+    Returns:
+        int: Events queued
+    """
+    stale = [
+        event
+        for event in events.filter(google_event_id__isnull=False)
+        .select_related("venue", "performer", "activation")
+        .iterator(chunk_size=2000)
+        if event_body_hash(event) != event.google_body_hash
+    ]
+    enqueue_upserts(stale)
+    return len(stale)
+
+
+def enqueue_delete(event) -> None:
+    """Queue the removal of a deleted ``event``.
+
+    The Google ID and calendar are copied onto the row because the event
+    is gone by the time the worker runs.
+    """
+    CalendarOutbox.objects.create(
+        event_id=event.pk,
+        action=CalendarOutbox.DELETE,
+        google_event_id=event.google_event_id,
+        calendar_id=calendar_id_for(event.venue),
+    )
+
+
+def backoff(attempts: int) -> timedelta:
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def _claim(batch_size: int) -> list[CalendarOutbox]:
+    now = timezone.now()
+    live = CalendarOutbox.objects.filter(attempts__lt=MAX_ATTEMPTS)
+    earlier = live.filter(event_id=OuterRef("event_id"), pk__lt=OuterRef("pk"))
+    with transaction.atomic():
+        rows = list(
+            live.filter(next_attempt_at__lte=now)
+            .filter(~Exists(earlier))
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        CalendarOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(
+            next_attempt_at=now + LEASE
+        )
+    return rows
+
+
+def _send_upserts(rows, errors) -> list:
+    """Push the events of upsert ``rows``; returns the rows that are done.
+
+    Events whose body hashes the same as their last push (a re-save that
+    changed nothing Google shows) are done without an API call.
+    """
+    events = Event.objects.select_related(
+        "venue", "performer", "activation"
+    ).in_bulk([row.event_id for row in rows])
+    hashes = {pk: event_body_hash(event) for pk, event in events.items()}
+    unchanged = {
+        pk: event.google_event_id
+        for pk, event in events.items()
+        if event.google_event_id and event.google_body_hash == hashes[pk]
+    }
+    pending = [event for pk, event in events.items() if pk not in unchanged]
+    try:
+        results = push_events(pending) if pending else {}
+    except CalendarUnavailable:
+        raise
+    except Exception as e:  # the whole batch failed
+        results = {event.pk: e for event in pending}
+    results.update(unchanged)
+
+    done, changed = [], []
+    for row in rows:
+        event = events.get(row.event_id)
+        result = results.get(row.event_id) if event else None
+        if isinstance(result, Exception):
+            errors[row] = result
+            continue
+        done.append(row)
+        if event and (result, hashes[event.pk]) != (
+            event.google_event_id, event.google_body_hash
+        ):
+            event.google_event_id = result
+            event.google_body_hash = hashes[event.pk]
+            changed.append(event)
+    # bulk_update() skips the signals, so this does not queue pushes.
+    Event.objects.bulk_update(changed, ["google_event_id", "google_body_hash"])
+
+    # Events deleted while we were pushing: their delete rows had no ID.
+    kept = set(
+        Event.objects.filter(pk__in=[e.pk for e in changed]).values_list(
+            "pk", flat=True
+        )
+    )
+    orphans = [
+        (e.pk, e.google_event_id, calendar_id_for(e.venue))
+        for e in changed
+        if e.pk not in kept
+    ]
+    if orphans:
+        remove_events(orphans)
+    return done
+
+
+def _send_deletes(rows, errors) -> list:
+    """Remove the events of delete ``rows``; returns the rows that are done."""
+    items = [
+        (row.pk, row.google_event_id, row.calendar_id)
+        for row in rows
+        if row.google_event_id
+    ]
+    try:
+        results = remove_events(items) if items else {}
+    except CalendarUnavailable:
+        raise
+    except Exception as e:
+        results = {key: e for key, _, _ in items}
+    done = []
+    for row in rows:
+        if results.get(row.pk) is not None:
+            errors[row] = results[row.pk]
+        else:
+            done.append(row)
+    return done
+
+
+def process_outbox(batch_size: int = 50) -> dict:
+    """Send one batch of due outbox rows.
+
+    Upserts and deletes each go out as Google batch requests, so a batch
+    of rows costs a couple of HTTP round trips.
+    Args:
+        batch_size (int): Rows to claim
+    Returns:
+        dict: ``sent``, ``retried`` and ``failed`` (given up) counts
+    Raises:
+        CalendarUnavailable: Google Calendar is not configured; claimed
+            rows are retried once their lease expires
+    """
+    rows = _claim(batch_size)
+    upserts = [row for row in rows if row.action == CalendarOutbox.UPSERT]
+    deletes = [row for row in rows if row.action == CalendarOutbox.DELETE]
+
+    # Later upserts queued before the events are read are covered by this
+    # push of their current state.
+    covered = dict(
+        CalendarOutbox.objects.filter(
+            event_id__in=[row.event_id for row in upserts],
+            action=CalendarOutbox.UPSERT,
+        )
+        .values("event_id")
+        .annotate(last=Max("pk"))
+        .values_list("event_id", "last")
+    )
+    errors = {}
+    sent_upserts = _send_upserts(upserts, errors) if upserts else []
+    sent_deletes = _send_deletes(deletes, errors) if deletes else []
+
+    done = Q(pk__in=[row.pk for row in sent_deletes])
+    for row in sent_upserts:
+        done |= Q(
+            event_id=row.event_id,
+            action=CalendarOutbox.UPSERT,
+            pk__lte=covered[row.event_id],
+        )
+    CalendarOutbox.objects.filter(done).delete()
+
+    counts = {
+        "sent": len(sent_upserts) + len(sent_deletes),
+        "retried": 0,
+        "failed": 0,
+    }
+    now = timezone.now()
+    for row, error in errors.items():
+        row.attempts += 1
+        row.last_error = str(error)
+        row.next_attempt_at = now + backoff(row.attempts)
+        if row.attempts >= MAX_ATTEMPTS:
+            counts["failed"] += 1
+            logger.error(f"Giving up on calendar push {row}: {error}")
+        else:
+            counts["retried"] += 1
+            logger.warning(f"Calendar push {row} failed, will retry: {error}")
+    CalendarOutbox.objects.bulk_update(
+        errors, ["attempts", "last_error", "next_attempt_at"]
+    )
+    return counts
@@ -0,0 +1,76 @@
+"""Cross-request cache of user permissions for the schedule views.
+
+``User.has_perm`` loads the user's and their groups' permissions with two
+queries per fresh request. The planner views check roles on every hit, so
+the resolved permission set is cached per user together with the global
+permission version it was built under; the signal receivers bump that
+version when groups or permissions change. The first check of a request
+costs one cache read and later ones are answered from the user object.
+"""
+
+from django.contrib.auth.decorators import user_passes_test
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+
+from . import cache as planner_cache
+
+PERMISSIONS_KEY = "permissions"
+PERMISSIONS_CACHE = "permissions"
+
+
+def user_permissions(user) -> frozenset:
+    """All ``app_label.codename`` permissions of an active user.
+    Args:
+        user (User): Request user, possibly anonymous
+    Returns:
+        frozenset: Permission names from the user and their groups
+    """
+    if not user.is_active or user.is_anonymous:
+        return frozenset()
+    perms = getattr(user, "_planner_perms", None)
+    if perms is not None:
+        return perms
+
+    # The version and the user's entry come back in one cache read; the
+    # entry is only used if it was stored under the current version.
+    version_key = planner_cache.version_key(PERMISSIONS_KEY)
+    key = f"planner:perms:{user.pk}"
+    found = cache.get_many([version_key, key])
+    version = found.get(version_key)
+    if version is None:
+        version = planner_cache.get_version(PERMISSIONS_KEY)
+    entry = found.get(key)
+    hit = entry is not None and entry[0] == version
+    planner_cache.record(PERMISSIONS_CACHE, hit=hit)
+    if hit:
+        perms = entry[1]
+    else:
+        perms = frozenset(user.get_all_permissions())
+        cache.set(key, (version, perms), planner_cache.FRAGMENT_TIMEOUT)
+    user._planner_perms = perms
+    return perms
+
+
+def has_perm(user, perm: str) -> bool:
+    """Cached equivalent of ``user.has_perm(perm)`` for model permissions."""
+    if user.is_active and user.is_superuser:
+        return True
+    return perm in user_permissions(user)
+
+
+def invalidate_permissions() -> None:
+    """Forget every cached permission set."""
+    planner_cache.bump_version(PERMISSIONS_KEY)
+
+
+def cached_permission_required(perm: str, raise_exception: bool = False):
+    """Drop-in for ``permission_required`` backed by the permission cache."""
+
+    def check_perms(user):
+        if has_perm(user, perm):
+            return True
+        if raise_exception:
+            raise PermissionDenied
+        return False
+
+    return user_passes_test(check_perms)
@@ -0,0 +1,352 @@
+"""Read models for the schedule pages.
+
+The templates used to walk a lazy ``Event`` queryset and touch
+``event.venue``, ``event.performer`` and ``event.activation`` per row. The
+classes below load a whole month in one joined query and hand the templates
+plain rows that are already grouped by week.
+"""
+
+import base64
+import calendar
+import hashlib
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from . import cache as planner_cache
+from .models import Event
+
+# Columns pulled for each schedule row. Following the FKs here makes the
+# ORM emit a single query with the joins instead of one query per relation.
+ROW_FIELDS = (
+    "pk",
+    "date",
+    "performance_time_start",
+    "performance_time_end",
+    "venue__name",
+    "performer__name",
+    "activation__name",
+)
+
+# Name used for the rendered month fragments in the hit/miss counters.
+SCHEDULE_CACHE = "schedule"
+
+# Months whose neighbours (the previous/next links) are still valid dates.
+MIN_YEAR = date.min.year + 1
+MAX_YEAR = date.max.year - 1
+
+
+def month_bounds(year: int, month: int) -> tuple[date, date]:
+    """Half-open date range covering a calendar month.
+    Args:
+        year (int): Calendar year
+        month (int): Calendar month (1-12)
+    Returns:
+        tuple[date, date]: First day of the month and first day of the next
+    """
+    first = date(year, month, 1)
+    _, last_day_num = calendar.monthrange(year, month)
+    return first, first + timedelta(days=last_day_num)
+
+
+def event_span(day: date, start: time, end: time) -> tuple[datetime, datetime]:
+    """Aware start and end of a booking. Sets whose end time is at or before
+    their start (e.g. 18h00-02h00) finish on the next day.
+    Args:
+        day (date): Event date
+        start (time): performance_time_start
+        end (time): performance_time_end
+    Returns:
+        tuple[datetime, datetime]: Start and end in the current time zone
+    """
+    start_dt = timezone.make_aware(datetime.combine(day, start))
+    end_day = day + timedelta(days=1) if end <= start else day
+    end_dt = timezone.make_aware(datetime.combine(end_day, end))
+    return start_dt, end_dt
+
+
+@dataclass(frozen=True)
+class ScheduleRow:
+    """One event as displayed in the schedule table."""
+
+    pk: int
+    date: date
+    performance_time_start: time
+    performance_time_end: time
+    venue: str
+    performer: str
+    activation: str | None
+
+
+@dataclass
+class ScheduleWeek:
+    """Rows falling in the same ISO week of the displayed month."""
+
+    number: int
+    rows: list[ScheduleRow] = field(default_factory=list)
+
+    @property
+    def start(self) -> date:
+        """Date of the first event in the week."""
+        return self.rows[0].date
+
+
+class ScheduleMonth:
+    """A month of the schedule, loaded with a single query.
+
+    Rows are materialised on first access so the object can be built in the
+    view before deciding whether it needs rendering at all.
+    """
+
+    def __init__(self, year: int, month: int):
+        self.year = year
+        self.month = month
+        self.start, self.end = month_bounds(year, month)
+        self._weeks = None
+        self._fingerprint = None
+
+    @classmethod
+    def from_query(cls, params, today: date | None = None) -> "ScheduleMonth":
+        """Build a month from ``year``/``month`` query parameters.
+        Args:
+            params (QueryDict): request.GET or any mapping
+            today (date, optional): Fallback when params are missing/invalid
+        Returns:
+            ScheduleMonth: The requested month, or the current one
+        """
+        today = today or timezone.localdate()
+        try:
+            year = int(params.get("year", today.year))
+            month = int(params.get("month", today.month))
+            if not MIN_YEAR <= year <= MAX_YEAR:
+                raise ValueError(f"year {year} is out of range")
+            date(year, month, 1)
+        except (ValueError, OverflowError):
+            year = today.year
+            month = today.month
+        return cls(year, month)
+
+    @property
+    def name(self) -> str:
+        return calendar.month_name[self.month]
+
+    @property
+    def previous(self) -> date:
+        """First day of the previous month."""
+        return (self.start - timedelta(days=1)).replace(day=1)
+
+    @property
+    def next(self) -> date:
+        """First day of the next month."""
+        return self.end
+
+    def queryset(self):
+        """Events of the month as value rows, ordered for display."""
+        return (
+            Event.objects.filter(date__gte=self.start, date__lt=self.end)
+            .order_by("date", "performance_time_start", "pk")
+            .values_list(*ROW_FIELDS)
+        )
+
+    def fingerprint(self) -> tuple[datetime | None, int]:
+        """Latest modification time and row count of the month.
+
+        Computed with one aggregate query and no row loading. Deleting an
+        event lowers the count; any other change moves the timestamp.
+        Returns:
+            tuple[datetime | None, int]: Max ``updated_at`` and event count
+        """
+        if self._fingerprint is None:
+            result = Event.objects.filter(
+                date__gte=self.start, date__lt=self.end
+            ).aggregate(last_modified=Max("updated_at"), count=Count("pk"))
+            self._fingerprint = (result["last_modified"], result["count"])
+        return self._fingerprint
+
+    def etag(self, role: str, today: date) -> str:
+        """Validator for the rendered page of ``role`` on ``today``."""
+        last_modified, count = self.fingerprint()
+        stamp = last_modified.isoformat() if last_modified else "-"
+        raw = f"{self.year}-{self.month}:{role}:{today}:{count}:{stamp}"
+        return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+    def last_modified(self, today: date) -> datetime:
+        """Last-Modified for the page, never before today's row highlight."""
+        midnight = timezone.make_aware(datetime.combine(today, time.min))
+        last_modified, _ = self.fingerprint()
+        if last_modified is None:
+            return midnight
+        return max(last_modified, midnight)
+
+    @property
+    def weeks(self) -> list[ScheduleWeek]:
+        """Rows grouped by ISO week, in date order."""
+        if self._weeks is None:
+            self._weeks = self._group(ScheduleRow(*r) for r in self.queryset())
+        return self._weeks
+
+    @property
+    def rows(self) -> list[ScheduleRow]:
+        return [row for week in self.weeks for row in week.rows]
+
+    @staticmethod
+    def _group(rows) -> list[ScheduleWeek]:
+        weeks = []
+        current_key = None
+        for row in rows:
+            key = row.date.isocalendar()[:2]
+            if key != current_key:
+                weeks.append(ScheduleWeek(number=len(weeks) + 1))
+                current_key = key
+            weeks[-1].rows.append(row)
+        return weeks
+
+    def render_weeks(self, role: str, today: date | None = None) -> str:
+        """Rendered week tables for ``role``, served from the fragment cache.
+
+        The key includes the month's version token, which the signal
+        receivers bump whenever an event in the month (or a venue, performer
+        or activation it shows) changes, and today's date for the row
+        highlight.
+        Args:
+            role (str): "admin", "manager" or "client"
+            today (date, optional): Date to highlight, defaults to today
+        Returns:
+            str: HTML for the weeks of the month
+        """
+        today = today or timezone.localdate()
+        version = planner_cache.get_version(
+            planner_cache.month_key(self.year, self.month)
+        )
+        key = (
+            f"planner:schedule:{self.year}-{self.month:02d}:{role}:"
+            f"{today.isoformat()}:v{version}"
+        )
+        html = cache.get(key)
+        planner_cache.record(SCHEDULE_CACHE, hit=html is not None)
+        if html is None:
+            html = render_to_string(
+                "pages/schedule_weeks.html",
+                {
+                    "weeks": self.weeks,
+                    "show_actions": role == "admin",
+                    "today": today,
+                },
+            )
+            cache.set(key, html, planner_cache.FRAGMENT_TIMEOUT)
+        return mark_safe(html)
+
+    def context(self) -> dict:
+        """Template context shared by the manager and client pages."""
+        return {
+            "schedule": self,
+            "current_year": self.year,
+            "current_month": self.month,
+            "current_month_name": self.name,
+            "prev_year": self.previous.year,
+            "prev_month": self.previous.month,
+            "next_year": self.next.year,
+            "next_month": self.next.month,
+        }
+
+
+# Columns served by the JSON API, in keyset order-by compatible form.
+API_FIELDS = (
+    "id",
+    "date",
+    "performance_time_start",
+    "performance_time_end",
+    "venue_id",
+    "venue__name",
+    "performer_id",
+    "performer__name",
+    "activation__name",
+)
+API_ORDERING = ("date", "performance_time_start", "id")
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque cursor pointing just after ``row`` in API order."""
+    raw = (
+        f"{row['date'].isoformat()}|"
+        f"{row['performance_time_start'].isoformat()}|{row['id']}"
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date, time, int]:
+    """Inverse of ``encode_cursor``.
+    Raises:
+        ValueError: If the cursor was not produced by ``encode_cursor``
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        day, start, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        return date.fromisoformat(day), time.fromisoformat(start), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def event_page(
+    start: date,
+    end: date,
+    venue_ids=None,
+    performer_ids=None,
+    cursor: str | None = None,
+    limit: int = 100,
+) -> tuple[list[dict], str | None]:
+    """One page of events in ``[start, end)`` using keyset pagination.
+
+    Pages seek past the cursor's ``(date, performance_time_start, id)``
+    instead of using OFFSET, so every page costs the same however deep the
+    client has paged. Rows come straight from ``.values()``.
+    Args:
+        start (date): First day included
+        end (date): First day excluded
+        venue_ids (list[int], optional): Only these venues
+        performer_ids (list[int], optional): Only these performers
+        cursor (str, optional): ``next`` value from the previous page
+        limit (int): Page size
+    Returns:
+        tuple[list[dict], str | None]: Rows and the cursor of the next page
+    """
+    events = Event.objects.filter(date__gte=start, date__lt=end)
+    if venue_ids:
+        events = events.filter(venue_id__in=venue_ids)
+    if performer_ids:
+        events = events.filter(performer_id__in=performer_ids)
+    if cursor:
+        day, start_time, pk = decode_cursor(cursor)
+        events = events.filter(
+            Q(date__gt=day)
+            | Q(date=day, performance_time_start__gt=start_time)
+            | Q(date=day, performance_time_start=start_time, id__gt=pk)
+        )
+    # Fetch one extra row to know whether another page exists.
+    rows = list(events.order_by(*API_ORDERING).values(*API_FIELDS)[: limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
+
+
+def serialize_row(row: dict) -> dict:
+    """JSON shape of an ``event_page`` row."""
+    return {
+        "id": row["id"],
+        "date": row["date"].isoformat(),
+        "start": row["performance_time_start"].strftime("%H:%M"),
+        "end": row["performance_time_end"].strftime("%H:%M"),
+        "venue": {"id": row["venue_id"], "name": row["venue__name"]},
+        "performer": {
+            "id": row["performer_id"],
+            "name": row["performer__name"],
+        },
+        "activation": row["activation__name"],
+    }
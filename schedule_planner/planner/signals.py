@@ -1,34 +1,57 @@
-from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
-from .models import Event
-from .utils.google_calendar import create_google_event, update_google_event, delete_google_event
+from django.utils import timezone
+from .cache import bump_feeds, bump_months
+from .models import Activation, Event, Performer, Venue
+from .permissions import invalidate_permissions
+from .outbox import enqueue_delete, enqueue_stale, enqueue_upsert
+
+
+def _invalidate(events):
+    """Bump the cached months and feeds showing any of ``events``."""
+    bump_months(events.dates("date", "month"))
+    rows = events.values_list("venue_id", "performer_id").distinct()
+    venue_ids, performer_ids = zip(*rows) if rows else ((), ())
+    bump_feeds(venue_ids, performer_ids)
+
+
+@receiver(pre_save, sender=Event)
+def remember_previous_placement(sender, instance, **kwargs):
+    """
+    Keep the stored date, venue and performer of an edited event so moving
+    it invalidates the cached month and feeds it left.
+    """
+    instance._previous = (None, None, None)
+    if instance.pk:
+        instance._previous = (
+            Event.objects.filter(pk=instance.pk)
+            .values_list("date", "venue_id", "performer_id")
+            .first()
+        ) or instance._previous
 
 
 @receiver(post_save, sender=Event)
 def sync_event_to_google(sender, instance, created, **kwargs):
     """
-    Signal to sync Django Event changes to Google Calendar.
+    Signal to sync Django Event changes to Google Calendar. The push is
+    queued in the outbox and sent by the calendar worker.
     """
-    # Avoid infinite recursion if we were to save the model inside the signal
-    # (though we only update google_event_id which we should handle carefully)
-
-    if created:
-        # Create new event in Google Calendar
-        google_id = create_google_event(instance)
-        if google_id:
-            # We need to save the ID back to the instance, but we must
-            # avoid triggering the signal again.
-            # We can use update() on the QuerySet to bypass signals, or a flag.
-            Event.objects.filter(pk=instance.pk).update(google_event_id=google_id)
-    else:
-        # Update existing event
-        # Check if we have a google_id, if not create one
-        if not instance.google_event_id:
-            google_id = create_google_event(instance)
-            if google_id:
-                Event.objects.filter(pk=instance.pk).update(google_event_id=google_id)
-        else:
-            update_google_event(instance)
+    old_date, old_venue_id, old_performer_id = getattr(
+        instance, "_previous", (None, None, None)
+    )
+    bump_months([instance.date, old_date])
+    bump_feeds(
+        [instance.venue_id, old_venue_id],
+        [instance.performer_id, old_performer_id],
+    )
+    enqueue_upsert(instance)
 
 
 @receiver(post_delete, sender=Event)
@@ -36,5 +59,63 @@ def delete_event_from_google(sender, instance, **kwargs):
     """
     Signal to delete event from Google Calendar when deleted in Django.
     """
-    if instance.google_event_id:
-        delete_google_event(instance.google_event_id, venue=instance.venue)
+    bump_months([instance.date])
+    bump_feeds([instance.venue_id], [instance.performer_id])
+    enqueue_delete(instance)
+
+
+@receiver(post_save, sender=Venue)
+@receiver(post_save, sender=Performer)
+@receiver(post_save, sender=Activation)
+def invalidate_months_showing(sender, instance, created, **kwargs):
+    """
+    Renaming a venue, performer or activation changes every schedule month
+    and feed that displays it, and the Google events whose body shows it.
+    """
+    if created:
+        return
+    field = sender._meta.model_name
+    events = Event.objects.filter(**{field: instance})
+    _invalidate(events)
+    enqueue_stale(events)
+    # Move the events' timestamps too so the schedule ETags change.
+    events.update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Venue)
+@receiver(post_delete, sender=Performer)
+def invalidate_deleted_feed(sender, instance, **kwargs):
+    """
+    A deleted venue or performer must stop being served from the feed cache.
+    """
+    bump_feeds(**{f"{sender._meta.model_name}_ids": [instance.pk]})
+
+
+@receiver(pre_delete, sender=Activation)
+def invalidate_months_before_activation_delete(sender, instance, **kwargs):
+    """
+    Events keep their row when an activation is deleted (SET_NULL is applied
+    without signals), so collect their months before the reference goes.
+    """
+    events = Event.objects.filter(activation=instance)
+    _invalidate(events)
+    events.update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_permission_cache_on_assignment(sender, action, **kwargs):
+    """
+    Adding or removing groups/permissions changes what users may do.
+    """
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_permissions()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_permission_cache(sender, **kwargs):
+    invalidate_permissions()
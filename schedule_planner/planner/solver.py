@@ -0,0 +1,293 @@
+"""Assign performers to open slots.
+
+The problem is solved as a constraint satisfaction problem:
+
+* each slot is a variable whose domain is the performers of the right
+  genre who are not already booked during the slot;
+* two slots that overlap in time may not get the same performer.
+
+Search is backtracking with the minimum-remaining-values heuristic and
+forward checking, trying the least-loaded performer first so hours stay
+balanced. Slots that cannot be filled (empty domain, or the search budget
+runs out) are left open and reported instead of failing the whole run. A
+final local-search pass moves slots between performers while that lowers
+the spread of hours.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.db import transaction
+
+from . import cache as planner_cache
+from .intervals import IntervalIndex, sweep_overlaps
+from .models import Event, OpenSlot, Performer
+from .outbox import enqueue_upserts
+from .schedule import event_span
+
+# Nodes the backtracking search may visit before it falls back to filling
+# what it can greedily.
+SEARCH_BUDGET = 20000
+
+
+@dataclass
+class Slot:
+    """An open slot as seen by the solver."""
+
+    pk: int
+    start: datetime
+    end: datetime
+    genre: str | None
+
+    @property
+    def hours(self) -> float:
+        return (self.end - self.start).total_seconds() / 3600
+
+
+@dataclass
+class Solution:
+    assignment: dict = field(default_factory=dict)  # slot pk -> performer pk
+    unassigned: list = field(default_factory=list)  # slot pks
+    hours: dict = field(default_factory=dict)  # performer pk -> hours
+
+
+def solve(slots, performers, bookings) -> Solution:
+    """Assign performers to ``slots``.
+    Args:
+        slots (list[Slot]): Slots to fill
+        performers (list[tuple]): ``(pk, genre)`` of candidate performers
+        bookings (dict): performer pk -> list of ``(start, end)`` already
+            booked around the slots
+    Returns:
+        Solution: Assignment, slots left open and hours per performer
+    """
+    slots = sorted(slots, key=lambda slot: slot.start)
+    by_pk = {slot.pk: slot for slot in slots}
+    indexes = {
+        pk: IntervalIndex((start, end, None) for start, end in spans)
+        for pk, spans in bookings.items()
+    }
+    load = {pk: 0.0 for pk, _ in performers}
+    for pk, spans in bookings.items():
+        if pk in load:
+            load[pk] = sum((end - start).total_seconds() / 3600
+                           for start, end in spans)
+
+    domains = {}
+    for slot in slots:
+        domains[slot.pk] = {
+            pk
+            for pk, genre in performers
+            if _genre_matches(slot.genre, genre)
+            and not (pk in indexes
+                     and indexes[pk].overlapping(slot.start, slot.end))
+        }
+
+    neighbours = defaultdict(set)
+    for _, a, b in sweep_overlaps(
+        ((slot.start, slot.end, slot.pk) for slot in slots),
+        {"all": lambda pk: None},
+    ):
+        neighbours[a].add(b)
+        neighbours[b].add(a)
+
+    open_pks = [pk for pk, domain in domains.items() if not domain]
+    solvable = {pk: domain for pk, domain in domains.items() if domain}
+
+    # Slots only constrain each other through overlaps, so each connected
+    # component is searched on its own (in time order, sharing the running
+    # load so the value ordering keeps balancing across components).
+    running = dict(load)
+    assignment = {}
+    for component in _components(solvable, neighbours, by_pk):
+        part_domains = {pk: solvable[pk] for pk in component}
+        part = _backtrack(part_domains, neighbours, by_pk, running)
+        if part is None:
+            part = _greedy(part_domains, neighbours, by_pk, running)
+        assignment.update(part)
+
+    solution = Solution(hours=dict(load))
+    solution.unassigned = sorted(
+        open_pks + [pk for pk in solvable if pk not in assignment]
+    )
+    solution.assignment = _rebalance(
+        assignment, domains, neighbours, by_pk, load
+    )
+    for slot_pk, performer_pk in solution.assignment.items():
+        solution.hours[performer_pk] += by_pk[slot_pk].hours
+    return solution
+
+
+def _components(domains, neighbours, by_pk) -> list[list]:
+    """Connected components of the overlap graph, earliest first."""
+    seen = set()
+    components = []
+    for pk in sorted(domains, key=lambda pk: by_pk[pk].start):
+        if pk in seen:
+            continue
+        seen.add(pk)
+        component, stack = [], [pk]
+        while stack:
+            current = stack.pop()
+            component.append(current)
+            for other in neighbours[current]:
+                if other in domains and other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        components.append(component)
+    return components
+
+
+def _genre_matches(wanted, genre) -> bool:
+    return not wanted or (genre or "").strip().lower() == wanted.strip().lower()
+
+
+def _order(domain, load):
+    return sorted(domain, key=lambda pk: (load[pk], pk))
+
+
+def _backtrack(domains, neighbours, by_pk, load):
+    """MRV backtracking with forward checking; None if no full assignment
+    is found within ``SEARCH_BUDGET`` nodes."""
+    assignment = {}
+    domains = {pk: set(d) for pk, d in domains.items()}
+    steps = 0
+
+    def search():
+        nonlocal steps
+        unassigned = [pk for pk in domains if pk not in assignment]
+        if not unassigned:
+            return True
+        steps += 1
+        if steps > SEARCH_BUDGET:
+            return False
+        slot_pk = min(unassigned, key=lambda pk: (len(domains[pk]), pk))
+        for performer_pk in _order(domains[slot_pk], load):
+            pruned = []
+            dead_end = False
+            for other in neighbours[slot_pk]:
+                if other in assignment or other not in domains:
+                    continue
+                if performer_pk in domains[other]:
+                    domains[other].discard(performer_pk)
+                    pruned.append(other)
+                    if not domains[other]:
+                        dead_end = True
+            if not dead_end:
+                assignment[slot_pk] = performer_pk
+                load[performer_pk] += by_pk[slot_pk].hours
+                if search():
+                    return True
+                load[performer_pk] -= by_pk[slot_pk].hours
+                del assignment[slot_pk]
+            for other in pruned:
+                domains[other].add(performer_pk)
+            if steps > SEARCH_BUDGET:
+                return False
+        return False
+
+    return assignment if search() else None
+
+
+def _greedy(domains, neighbours, by_pk, load):
+    """Fill as many slots as possible, most constrained first."""
+    assignment = {}
+    for slot_pk in sorted(domains, key=lambda pk: (len(domains[pk]), pk)):
+        taken = {assignment[o] for o in neighbours[slot_pk] if o in assignment}
+        for performer_pk in _order(domains[slot_pk] - taken, load):
+            assignment[slot_pk] = performer_pk
+            load[performer_pk] += by_pk[slot_pk].hours
+            break
+    return assignment
+
+
+def _rebalance(assignment, domains, neighbours, by_pk, base_load):
+    """Move slots from busier to less busy performers while the sum of
+    squared hours (i.e. the spread) goes down."""
+    load = dict(base_load)
+    for slot_pk, performer_pk in assignment.items():
+        load[performer_pk] += by_pk[slot_pk].hours
+
+    improved = True
+    while improved:
+        improved = False
+        for slot_pk in sorted(assignment):
+            current = assignment[slot_pk]
+            hours = by_pk[slot_pk].hours
+            taken = {assignment[o] for o in neighbours[slot_pk]
+                     if o in assignment}
+            for candidate in _order(domains[slot_pk] - taken - {current}, load):
+                # Moving helps when the receiver ends below the giver's
+                # current load.
+                if load[candidate] + hours < load[current]:
+                    assignment[slot_pk] = candidate
+                    load[current] -= hours
+                    load[candidate] += hours
+                    improved = True
+                break
+    return assignment
+
+
+def solve_open_slots(slots) -> Solution:
+    """Load everything ``solve`` needs for ``slots`` with range queries."""
+    slots = list(slots)
+    if not slots:
+        return Solution()
+    first = min(slot.date for slot in slots) - timedelta(days=1)
+    last = max(slot.date for slot in slots) + timedelta(days=1)
+
+    bookings = defaultdict(list)
+    rows = Event.objects.filter(date__gte=first, date__lte=last).values_list(
+        "performer_id", "date", "performance_time_start",
+        "performance_time_end",
+    )
+    for performer_pk, day, start, end in rows.iterator(chunk_size=2000):
+        bookings[performer_pk].append(event_span(day, start, end))
+
+    return solve(
+        [
+            Slot(
+                slot.pk,
+                *event_span(slot.date, slot.performance_time_start,
+                            slot.performance_time_end),
+                slot.genre,
+            )
+            for slot in slots
+        ],
+        list(Performer.objects.values_list("pk", "genre")),
+        bookings,
+    )
+
+
+def fill_open_slots(slots, solution: Solution) -> list[Event]:
+    """Create the events proposed by ``solution`` and link their slots.
+
+    Events are written with one ``bulk_create``, which skips the Event
+    signals, so the schedule caches are invalidated and the Google
+    Calendar pushes queued here.
+    """
+    slots = [slot for slot in slots if slot.pk in solution.assignment]
+    with transaction.atomic():
+        events = Event.objects.bulk_create(
+            Event(
+                date=slot.date,
+                performance_time_start=slot.performance_time_start,
+                performance_time_end=slot.performance_time_end,
+                venue_id=slot.venue_id,
+                performer_id=solution.assignment[slot.pk],
+                activation_id=slot.activation_id,
+            )
+            for slot in slots
+        )
+        for slot, event in zip(slots, events):
+            slot.event = event
+        OpenSlot.objects.bulk_update(slots, ["event"])
+        enqueue_upserts(events)
+
+    planner_cache.bump_months(event.date for event in events)
+    planner_cache.bump_feeds(
+        [event.venue_id for event in events],
+        [event.performer_id for event in events],
+    )
+    return events
@@ -0,0 +1,456 @@
+"""Pulling Google Calendar changes into the planner.
+
+``CalendarSyncEngine`` is the only pull code path: the staff sync view,
+the ``sync_google_calendar`` command and the calendar worker (after a push
+notification) all run it. The view only queues a ``CalendarSyncJob``,
+which the worker runs with ``run_sync_job``.
+
+Venue calendars are fetched concurrently by a bounded thread pool. The
+fetch threads only talk to Google, each through its own calendar service,
+and hand pages over a bounded queue to the calling thread, which
+reconciles them one at a time: matching events are loaded with one
+``google_event_id__in`` query per page and the changed ones written with
+one ``bulk_update``, so database writes stay serialized and memory stays
+flat whatever the calendar size.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import bump_feeds, bump_months
+from .models import CalendarSyncJob, Event, Venue
+from .utils.google_calendar import PAGE_SIZE, EventStream
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SyncCounts:
+    """What a pull did with the Google events it read."""
+
+    checked: int = 0
+    updated: int = 0
+    skipped: int = 0  # cancelled, all-day or without times
+    external: int = 0  # not created by the planner
+
+    def __iadd__(self, other):
+        self.checked += other.checked
+        self.updated += other.updated
+        self.skipped += other.skipped
+        self.external += other.external
+        return self
+
+
+@dataclass
+class EventChange:
+    """A Google-side time change of a planner event."""
+
+    pk: int
+    summary: str
+    before: tuple  # (date, start time, end time)
+    after: tuple
+
+    def __str__(self):
+        def times(value):
+            day, start, end = value
+            return f"{day} {start:%H:%M}-{end:%H:%M}"
+
+        return f"{self.summary}: {times(self.before)} -> {times(self.after)}"
+
+
+@dataclass
+class VenueSync:
+    """Outcome and timing of one venue calendar in a pull."""
+
+    name: str
+    venue_id: int | None = None
+    counts: SyncCounts = field(default_factory=SyncCounts)
+    changes: list = field(default_factory=list)
+    api_calls: int = 0
+    fetch_seconds: float = 0.0  # in the fetch thread, network bound
+    reconcile_seconds: float = 0.0
+    error: str | None = None
+
+
+@dataclass
+class SyncReport(SyncCounts):
+    """Totals of a pull, with the per-venue details."""
+
+    venues: list = field(default_factory=list)
+    dry_run: bool = False
+    seconds: float = 0.0
+
+    @property
+    def api_calls(self) -> int:
+        return sum(venue.api_calls for venue in self.venues)
+
+    @property
+    def changes(self) -> list:
+        return [change for venue in self.venues for change in venue.changes]
+
+
+def _parse_google_times(g_event):
+    """Local (date, start time, end time) of a timed Google event, or
+    None."""
+    if g_event.get("status") == "cancelled":
+        return None
+    start_iso = g_event.get("start", {}).get("dateTime")
+    end_iso = g_event.get("end", {}).get("dateTime")
+    start_dt = parse_datetime(start_iso) if start_iso else None
+    end_dt = parse_datetime(end_iso) if end_iso else None
+    if not start_dt or not end_dt:
+        return None
+    # Events hold wall-clock times in TIME_ZONE; Google answers with the
+    # calendar's offset.
+    if timezone.is_aware(start_dt):
+        start_dt = timezone.localtime(start_dt)
+    if timezone.is_aware(end_dt):
+        end_dt = timezone.localtime(end_dt)
+    return start_dt.date(), start_dt.time(), end_dt.time()
+
+
+def _rfc3339(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value.isoformat()
+
+
+def store_sync_token(venue, token) -> None:
+    """Remembers where the next pull of ``venue`` starts."""
+    if token and token != venue.google_sync_token:
+        # update() skips the Venue post_save, which would invalidate every
+        # month showing the venue.
+        Venue.objects.filter(pk=venue.pk).update(google_sync_token=token)
+        venue.google_sync_token = token
+
+
+class _Fetched:
+    """End-of-stream marker put on the page queue by a fetch thread."""
+
+    def __init__(self, stream, error, seconds):
+        self.stream = stream
+        self.error = error
+        self.seconds = seconds
+
+
+def _fetch_venue(key, stream, pages, stop):
+    """Fetch thread: reads a venue's pages onto ``pages``."""
+    started = time.monotonic()
+    error = None
+    try:
+        for page in stream.pages():
+            if stop.is_set():
+                return
+            pages.put((key, page))
+    except Exception as e:
+        error = e
+    pages.put((key, _Fetched(stream, error, time.monotonic() - started)))
+
+
+class CalendarSyncEngine:
+    """Pulls Google Calendar changes into the planner's events.
+
+    Without a window each venue is read incrementally from its stored sync
+    token. A ``since``/``until`` window lists that period in full instead
+    and leaves the tokens alone, as does a dry run, which only reports the
+    changes it would make.
+    """
+
+    def __init__(self, venues=None, since=None, until=None, dry_run=False,
+                 concurrency=None, page_size=PAGE_SIZE, on_venue=None):
+        """
+        Args:
+            venues (QuerySet): Venues to pull, defaults to all; venues
+                without a Google calendar are left out
+            since (date | datetime): Only events ending after this
+            until (date | datetime): Only events starting before this; a
+                date includes that whole day
+            dry_run (bool): Report changes without writing them
+            concurrency (int): Calendars fetched at once, defaults to
+                ``settings.GOOGLE_SYNC_CONCURRENCY``
+            page_size (int): Events per Google API call
+            on_venue (callable): Called with each ``VenueSync`` as its
+                venue finishes, in the calling thread
+        """
+        if venues is None:
+            venues = Venue.objects.all()
+        self.venues = venues.exclude(google_calendar_id__isnull=True).exclude(
+            google_calendar_id__exact=""
+        )
+        if isinstance(until, date) and not isinstance(until, datetime):
+            until += timedelta(days=1)
+        self.time_min = _rfc3339(since)
+        self.time_max = _rfc3339(until)
+        self.dry_run = dry_run
+        self.concurrency = max(
+            1, concurrency or settings.GOOGLE_SYNC_CONCURRENCY
+        )
+        self.page_size = page_size
+        self.on_venue = on_venue
+
+    @property
+    def windowed(self) -> bool:
+        return bool(self.time_min or self.time_max)
+
+    def stream_for(self, venue) -> EventStream:
+        if self.windowed:
+            return EventStream(
+                venue.google_calendar_id,
+                page_size=self.page_size,
+                time_min=self.time_min,
+                time_max=self.time_max,
+            )
+        return EventStream(
+            venue.google_calendar_id, venue.google_sync_token, self.page_size
+        )
+
+    def reconcile(self, google_events) -> tuple[SyncCounts, list]:
+        """Apply (or, in a dry run, only diff) one page of Google events.
+        Returns:
+            tuple: (SyncCounts, list of EventChange)
+        """
+        counts = SyncCounts(checked=len(google_events))
+        times, summaries = {}, {}
+        for g_event in google_events:
+            parsed = _parse_google_times(g_event)
+            if parsed and g_event.get("id"):
+                times[g_event["id"]] = parsed
+                summaries[g_event["id"]] = g_event.get("summary", "")
+        counts.skipped = len(google_events) - len(times)
+
+        events = Event.objects.filter(google_event_id__in=times).only(
+            "pk", "date", "performance_time_start", "performance_time_end",
+            "venue_id", "performer_id", "google_event_id",
+        )
+        found = 0
+        changed, changes, old_dates = [], [], []
+        now = timezone.now()
+        for event in events:
+            found += 1
+            new = times[event.google_event_id]
+            old = (event.date, event.performance_time_start,
+                   event.performance_time_end)
+            if new == old:
+                continue
+            changes.append(EventChange(
+                event.pk, summaries[event.google_event_id], old, new
+            ))
+            old_dates.append(event.date)
+            (event.date, event.performance_time_start,
+             event.performance_time_end) = new
+            event.updated_at = now
+            changed.append(event)
+        counts.external = len(times) - found
+        counts.updated = len(changed)
+
+        if changed and not self.dry_run:
+            with transaction.atomic():
+                Event.objects.bulk_update(changed, [
+                    "date", "performance_time_start", "performance_time_end",
+                    "updated_at",
+                ])
+            # bulk_update() skips the signals.
+            bump_months(old_dates + [event.date for event in changed])
+            bump_feeds(
+                [event.venue_id for event in changed],
+                [event.performer_id for event in changed],
+            )
+        return counts, changes
+
+    def run(self) -> SyncReport:
+        """Fetch every venue calendar and reconcile it.
+        Returns:
+            SyncReport: Totals, per-venue counts, changes and timings
+        """
+        started = time.monotonic()
+        venues = list(self.venues)
+        report = SyncReport(
+            venues=[VenueSync(venue.name, venue.pk) for venue in venues],
+            dry_run=self.dry_run,
+        )
+        if venues:
+            self._run(venues, report)
+        report.seconds = time.monotonic() - started
+        return report
+
+    def _run(self, venues, report):
+        pages = queue.Queue(maxsize=2 * self.concurrency)
+        stop = threading.Event()
+        with ThreadPoolExecutor(
+            max_workers=min(self.concurrency, len(venues)),
+            thread_name_prefix="calendar-sync",
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _fetch_venue, i, self.stream_for(venue), pages, stop
+                )
+                for i, venue in enumerate(venues)
+            ]
+            try:
+                remaining = len(venues)
+                while remaining:
+                    i, item = pages.get()
+                    if isinstance(item, _Fetched):
+                        remaining -= 1
+                        self._finish(venues[i], report.venues[i], item)
+                        continue
+                    result = report.venues[i]
+                    page_started = time.monotonic()
+                    counts, changes = self.reconcile(item)
+                    result.reconcile_seconds += (
+                        time.monotonic() - page_started
+                    )
+                    result.counts += counts
+                    result.changes += changes
+                    report += counts
+            finally:
+                # Unblock the fetch threads if reconciling failed.
+                stop.set()
+                while not all(future.done() for future in futures):
+                    try:
+                        pages.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+
+    def _finish(self, venue, result, fetched):
+        result.fetch_seconds = fetched.seconds
+        result.api_calls = fetched.stream.api_calls
+        if fetched.error:
+            result.error = str(fetched.error)
+            logger.error(
+                f"Error fetching Google Calendar events for {venue.name}: "
+                f"{fetched.error}"
+            )
+        elif not (self.dry_run or self.windowed):
+            store_sync_token(venue, fetched.stream.next_sync_token)
+        logger.info(
+            f"Synced {result.name}: {result.counts.updated} of "
+            f"{result.counts.checked} updated in "
+            f"{result.fetch_seconds:.2f}s fetch + "
+            f"{result.reconcile_seconds:.2f}s reconcile, "
+            f"{result.api_calls} API call(s)"
+        )
+        if self.on_venue:
+            self.on_venue(result)
+
+
+# A running job not finished after this long is taken to have died with
+# its worker, and a queued one not started by then to have no worker at
+# all, so neither holds back new requests.
+SYNC_JOB_TIMEOUT = timedelta(minutes=15)
+
+
+def fail_stale_jobs() -> None:
+    """Fail active staff syncs older than ``SYNC_JOB_TIMEOUT``."""
+    now = timezone.now()
+    CalendarSyncJob.objects.filter(
+        status=CalendarSyncJob.RUNNING,
+        started_at__lt=now - SYNC_JOB_TIMEOUT,
+    ).update(
+        status=CalendarSyncJob.FAILED,
+        finished_at=now,
+        error="The worker stopped before the sync finished.",
+    )
+    CalendarSyncJob.objects.filter(
+        status=CalendarSyncJob.QUEUED,
+        created_at__lt=now - SYNC_JOB_TIMEOUT,
+    ).update(
+        status=CalendarSyncJob.FAILED,
+        finished_at=now,
+        error="No worker picked the sync up; is run_calendar_worker "
+              "running?",
+    )
+
+
+# Lookups and inserts queue_sync_job tries while racing other requests.
+QUEUE_ATTEMPTS = 3
+
+
+def queue_sync_job(user=None) -> CalendarSyncJob:
+    """The waiting or running staff sync, or a newly queued one.
+    Args:
+        user (User): Who asked for it
+    Returns:
+        CalendarSyncJob: The job the caller should poll
+    """
+    fail_stale_jobs()
+    active = CalendarSyncJob.objects.filter(status__in=CalendarSyncJob.ACTIVE)
+    for _ in range(QUEUE_ATTEMPTS):
+        job = active.order_by("created_at").first()
+        if job:
+            return job
+        try:
+            with transaction.atomic():
+                return CalendarSyncJob.objects.create(requested_by=user)
+        except IntegrityError:
+            # Another request queued one in between, which may also have
+            # finished by the time we look again.
+            continue
+    # Jobs keep finishing under us; the latest one is as fresh as it gets.
+    return CalendarSyncJob.objects.order_by("-created_at").first()
+
+
+def run_sync_job():
+    """Run the oldest queued staff sync, saving progress per venue.
+    Returns:
+        CalendarSyncJob: The finished job, or None when none was queued
+    """
+    fail_stale_jobs()
+    job = (
+        CalendarSyncJob.objects.filter(status=CalendarSyncJob.QUEUED)
+        .order_by("created_at")
+        .first()
+    )
+    if job is None:
+        return None
+    started = timezone.now()
+    try:
+        with transaction.atomic():
+            claimed = CalendarSyncJob.objects.filter(
+                pk=job.pk, status=CalendarSyncJob.QUEUED
+            ).update(status=CalendarSyncJob.RUNNING, started_at=started)
+    except IntegrityError:  # another worker is running a job
+        return None
+    if not claimed:  # another worker got this one
+        return None
+    job.status, job.started_at = CalendarSyncJob.RUNNING, started
+
+    def progress(result):
+        job.venues.append({
+            "name": result.name,
+            "checked": result.counts.checked,
+            "updated": result.counts.updated,
+            "external": result.counts.external,
+            "error": result.error,
+        })
+        job.checked += result.counts.checked
+        job.updated += result.counts.updated
+        job.save(update_fields=["venues", "checked", "updated"])
+
+    engine = CalendarSyncEngine(on_venue=progress)
+    job.venue_count = engine.venues.count()
+    job.save(update_fields=["venue_count"])
+    try:
+        engine.run()
+    except Exception as e:
+        logger.exception(f"Calendar sync job {job.pk} failed")
+        job.status, job.error = CalendarSyncJob.FAILED, str(e)
+    else:
+        job.status = CalendarSyncJob.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+    return job
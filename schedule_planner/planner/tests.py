@@ -1,3 +1,1571 @@
-# from django.test import TestCase
+import csv
+import datetime
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+import httplib2
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from googleapiclient.errors import HttpError
+
+from . import cache as planner_cache
+from .feeds import FEED_CACHE, feed_token
+from .forms import EventForm
+from .intervals import IntervalIndex
+from .permissions import PERMISSIONS_CACHE, has_perm
+from .models import (
+    Activation,
+    CalendarOutbox,
+    CalendarSyncJob,
+    CalendarWatchChannel,
+    Event,
+    OpenSlot,
+    Performer,
+    Venue,
+)
+from .outbox import process_outbox
+from .watch import (
+    notification_headers,
+    renew_watch_channels,
+    request_venue_sync,
+    run_requested_syncs,
+)
+from .schedule import SCHEDULE_CACHE, ScheduleMonth, event_span, month_bounds
+from .solver import fill_open_slots, solve_open_slots
+from .sync import (
+    SYNC_JOB_TIMEOUT,
+    CalendarSyncEngine,
+    SyncCounts,
+    queue_sync_job,
+    run_sync_job,
+)
+from .utils import fake_calendar, google_calendar
+
+
+def make_events(count, year=2025, month=12):
+    """Create ``count`` events spread over the given month."""
+    venue, _ = Venue.objects.get_or_create(name="PRIVE")
+    activation, _ = Activation.objects.get_or_create(name="SUMMER CAMPAIGN")
+    events = []
+    for i in range(count):
+        performer, _ = Performer.objects.get_or_create(name=f"DJ {i % 5}")
+        events.append(
+            Event.objects.create(
+                date=datetime.date(year, month, 1 + i % 28),
+                performance_time_start=datetime.time(18 + i % 5),
+                performance_time_end=datetime.time(23),
+                venue=venue,
+                performer=performer,
+                activation=activation if i % 2 else None,
+            )
+        )
+    return events
+
+
+# The manifest storage needs collectstatic; tests render with the plain one.
+PLAIN_STATIC = override_settings(
+    STORAGES={
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        }
+    }
+)
+
+
+class ScheduleMonthTests(TestCase):
+    def test_month_bounds_are_half_open(self):
+        self.assertEqual(
+            month_bounds(2025, 12),
+            (datetime.date(2025, 12, 1), datetime.date(2026, 1, 1)),
+        )
+        self.assertEqual(
+            month_bounds(2024, 2),
+            (datetime.date(2024, 2, 1), datetime.date(2024, 3, 1)),
+        )
+
+    def test_invalid_query_falls_back_to_today(self):
+        today = datetime.date(2025, 12, 3)
+        month = ScheduleMonth.from_query({"month": "13"}, today=today)
+        self.assertEqual((month.year, month.month), (2025, 12))
+        self.assertEqual(month.previous, datetime.date(2025, 11, 1))
+        self.assertEqual(month.next, datetime.date(2026, 1, 1))
+
+    def test_years_at_the_calendar_ends_fall_back_to_today(self):
+        today = datetime.date(2025, 12, 3)
+        for year, month in (("9999", "12"), ("1", "1"), ("9" * 30, "1")):
+            schedule = ScheduleMonth.from_query(
+                {"year": year, "month": month}, today=today
+            )
+            self.assertEqual((schedule.year, schedule.month), (2025, 12))
+        schedule = ScheduleMonth.from_query({"year": "2", "month": "1"})
+        self.assertEqual(schedule.previous, datetime.date(1, 12, 1))
+        schedule = ScheduleMonth.from_query({"year": "9998", "month": "12"})
+        self.assertEqual(schedule.next, datetime.date(9999, 1, 1))
+
+    def test_rows_grouped_by_week_in_order(self):
+        make_events(10)
+        Event.objects.create(
+            date=datetime.date(2026, 1, 1),
+            performance_time_start=datetime.time(12),
+            performance_time_end=datetime.time(15),
+            venue=Venue.objects.get(),
+            performer=Performer.objects.first(),
+        )
+        month = ScheduleMonth(2025, 12)
+        rows = month.rows
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(
+            rows,
+            sorted(rows, key=lambda r: (r.date, r.performance_time_start)),
+        )
+        for week in month.weeks:
+            self.assertEqual(
+                {row.date.isocalendar()[:2] for row in week.rows},
+                {week.start.isocalendar()[:2]},
+            )
+        self.assertEqual(rows[0].venue, "PRIVE")
+
+    def test_month_loads_with_one_query(self):
+        make_events(20)
+        with self.assertNumQueries(1):
+            ScheduleMonth(2025, 12).weeks
+
+
+@PLAIN_STATIC
+class IndexViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser("admin", "a@example.com", "pw")
+        self.client.force_login(self.user)
+        self.url = reverse("planner:index") + "?year=2025&month=12"
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_is_constant(self):
+        make_events(2)
+        few, _ = self._count_queries()
+        make_events(40)
+        many, response = self._count_queries()
+        self.assertEqual(few, many)
+        self.assertContains(response, "DJ 4")
+
+    def test_unchanged_month_answers_not_modified(self):
+        event = make_events(3)[0]
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        event.performance_time_end = datetime.time(23, 30)
+        event.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_months_at_the_calendar_ends_render(self):
+        for query in ("?year=9999&month=12", "?year=1&month=1"):
+            response = self.client.get(reverse("planner:index") + query)
+            self.assertEqual(response.status_code, 200)
+
+    def test_other_month_keeps_its_etag(self):
+        make_events(3)
+        url = reverse("planner:index") + "?year=2025&month=11"
+        etag = self.client.get(url)["ETag"]
+        make_events(1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class ScheduleCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        planner_cache.reset_stats(SCHEDULE_CACHE)
+        self.events = make_events(3)
+        self.today = datetime.date(2025, 12, 3)
+
+    def render(self, role="client"):
+        return ScheduleMonth(2025, 12).render_weeks(role, today=self.today)
+
+    def test_second_render_is_a_hit_without_queries(self):
+        first = self.render()
+        with self.assertNumQueries(0):
+            second = self.render()
+        self.assertEqual(first, second)
+        self.assertEqual(
+            planner_cache.stats(SCHEDULE_CACHE), {"hits": 1, "misses": 1}
+        )
+
+    def test_roles_are_cached_separately(self):
+        self.assertIn("Update", self.render("admin"))
+        self.assertNotIn("Update", self.render("client"))
+
+    def test_event_changes_invalidate_old_and_new_month(self):
+        self.render()
+        event = self.events[0]
+        event.performance_time_start = datetime.time(9)
+        event.save()
+        self.assertIn("09:00", self.render())
+
+        nov = ScheduleMonth(2025, 11).render_weeks("client", today=self.today)
+        event.date = datetime.date(2025, 11, 30)
+        event.save()
+        self.assertNotEqual(
+            nov, ScheduleMonth(2025, 11).render_weeks("client", today=self.today)
+        )
+        self.assertEqual(len(self.render().split("<tr class")), 3)
+
+        event.delete()
+        self.assertNotIn(
+            "Nov",
+            ScheduleMonth(2025, 11).render_weeks("client", today=self.today),
+        )
+
+    def test_concurrent_bumps_get_different_versions(self):
+        key = planner_cache.month_key(2025, 12)
+        before = planner_cache.get_version(key)
+        start = threading.Barrier(2)
+        versions = []
+
+        def bump():
+            start.wait()
+            versions.append(planner_cache.bump_version(key))
+
+        threads = [threading.Thread(target=bump) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(versions) | {before}), 3)
+        self.assertIn(planner_cache.get_version(key), versions)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bumped = planner_cache.bump_version(key)
+        self.assertNotIn(planner_cache.get_version(key), [bumped, *versions])
+
+        # An evicted version is replaced by a fresh one, not a reused one.
+        cache.delete(planner_cache.version_key(key))
+        self.assertNotIn(
+            planner_cache.get_version(key), versions + [before]
+        )
+
+    def test_related_renames_invalidate_referencing_months(self):
+        self.render()
+        venue = Venue.objects.get()
+        venue.name = "QUARTER DECK"
+        venue.save()
+        self.assertIn("QUARTER DECK", self.render())
+
+        activation = Activation.objects.get()
+        self.assertIn("SUMMER CAMPAIGN", self.render())
+        activation.delete()
+        self.assertNotIn("SUMMER CAMPAIGN", self.render())
+
+
+class EventsApiTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("floor", password="pw"))
+        self.url = reverse("planner:events_api")
+        self.events = make_events(25)
+
+    def test_pages_cover_range_without_gaps(self):
+        params = {"from": "2025-12-01", "to": "2025-12-31", "limit": 10}
+        seen = []
+        while True:
+            with self.assertNumQueries(3):  # session, user, page
+                data = self.client.get(self.url, params).json()
+            seen.extend(row["id"] for row in data["results"])
+            if not data["next"]:
+                break
+            params["cursor"] = data["next"]
+        expected = list(
+            Event.objects.order_by(
+                "date", "performance_time_start", "id"
+            ).values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_filters_and_bad_input(self):
+        performer = Performer.objects.get(name="DJ 1")
+        data = self.client.get(
+            self.url,
+            {"from": "2025-12-01", "to": "2025-12-31", "performer": performer.pk},
+        ).json()
+        self.assertEqual(
+            {row["performer"]["name"] for row in data["results"]}, {"DJ 1"}
+        )
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        response = self.client.get(
+            self.url, {"from": "2025-12-01", "to": "2025-12-31", "cursor": "x"}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            self.url, {"from": "2025-12-01", "to": "9999-12-31"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class EventIndexTests(TestCase):
+    """EXPLAIN the schedule's range queries on SQLite to check they seek an
+    index instead of scanning the table."""
+
+    def setUp(self):
+        make_events(30)
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f"USING INDEX {index_name}", plan)
+        self.assertNotIn("SCAN planner_event", plan)
+
+    def test_month_query_uses_date_index(self):
+        self.assertUsesIndex(
+            ScheduleMonth(2025, 12).queryset(), "event_date_start_idx"
+        )
+
+    def test_venue_and_performer_ranges_use_composite_indexes(self):
+        start, end = month_bounds(2025, 12)
+        in_range = Event.objects.filter(date__gte=start, date__lt=end)
+        self.assertUsesIndex(
+            in_range.filter(venue_id=Venue.objects.get().pk),
+            "event_venue_date_idx",
+        )
+        self.assertUsesIndex(
+            in_range.filter(performer_id=Performer.objects.first().pk),
+            "event_performer_date_idx",
+        )
+
+    def test_google_event_id_lookup_uses_unique_index(self):
+        plan = Event.objects.filter(google_event_id__in=["a", "b"]).explain()
+        self.assertIn("google_event_id", plan)
+        self.assertNotIn("SCAN planner_event", plan)
+
+
+@PLAIN_STATIC
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        planner_cache.reset_stats(FEED_CACHE)
+        self.events = make_events(5, year=2025, month=12)
+        self.venue = Venue.objects.get()
+        self.url = reverse("planner:venue_feed", kwargs={"pk": self.venue.pk})
+        self.params = {"token": feed_token("venue", self.venue.pk)}
+
+    def get(self, **headers):
+        return self.client.get(self.url, self.params, headers=headers)
+
+    def test_feed_requires_token(self):
+        response = self.client.get(self.url, {"token": "nope"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_streams_vevents_and_serves_repeats_from_cache(self):
+        Event.objects.filter(pk=self.events[0].pk).update(
+            date=datetime.date.today(),
+            performance_time_start=datetime.time(18),
+            performance_time_end=datetime.time(2),
+        )
+        planner_cache.bump_feeds([self.venue.pk])
+        response = self.get()
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content).decode()
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertEqual(body.count("BEGIN:VEVENT"), 1)
+        # 18h00-02h00 SAST ends at 00:00 UTC the next day.
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        self.assertIn(f"DTEND:{tomorrow:%Y%m%d}T000000Z", body)
+
+        with self.assertNumQueries(0):
+            cached = b"".join(self.get().streaming_content).decode()
+        self.assertEqual(cached, body)
+        self.assertEqual(planner_cache.stats(FEED_CACHE)["hits"], 1)
+
+    def test_conditional_get_until_an_event_changes(self):
+        etag = self.get()["ETag"]
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+        self.events[1].save()
+        self.assertEqual(self.get(if_none_match=etag).status_code, 200)
+
+    def test_window_moving_a_day_changes_the_etag(self):
+        etag = self.get()["ETag"]
+        tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        with mock.patch(
+            "planner.feeds.timezone.localdate", return_value=tomorrow
+        ):
+            response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("floor", password="pw"))
+        self.url = reverse("planner:export_schedule")
+        make_events(6)
+        make_events(2, month=11)
+
+    def test_csv_streams_only_the_range(self):
+        response = self.client.get(
+            self.url, {"from": "2025-12-01", "to": "2025-12-31"}
+        )
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content).decode()
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][0], "Date")
+        self.assertEqual(len(rows), 7)
+        self.assertTrue(all(row[0].startswith("2025-12") for row in rows[1:]))
+
+    def test_formula_like_names_are_quoted(self):
+        Performer.objects.filter(name="DJ 0").update(
+            name='=HYPERLINK("http://x")'
+        )
+        response = self.client.get(
+            self.url, {"from": "2025-12-01", "to": "2025-12-01"}
+        )
+        body = b"".join(response.streaming_content).decode()
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[1][4], '\'=HYPERLINK("http://x")')
+
+    def test_xlsx_round_trips(self):
+        import openpyxl
+
+        response = self.client.get(
+            self.url,
+            {"from": "2025-11-01", "to": "2025-12-31", "format": "xlsx"},
+        )
+        workbook = openpyxl.load_workbook(
+            io.BytesIO(b"".join(response.streaming_content))
+        )
+        self.assertEqual(workbook["Schedule"].max_row, 9)
+
+    def test_bad_range_is_rejected(self):
+        response = self.client.get(
+            self.url, {"from": "2025-12-31", "to": "2025-12-01"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_command_writes_csv(self):
+        out = io.StringIO()
+        call_command(
+            "export_schedule", "--from", "2025-11-01", "--to", "2025-11-30",
+            "--venue", "PRIVE", stdout=out,
+        )
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class PermissionCacheTests(TestCase):
+    perm = "planner.can_manage_event_engineer"
+
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name="Engineer Managers")
+        self.group.permissions.add(
+            Permission.objects.get(codename="can_manage_event_engineer")
+        )
+        self.user = User.objects.create_user("manager", password="pw")
+        self.user.groups.add(self.group)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_cached_across_requests(self):
+        self.assertTrue(has_perm(self.fresh_user(), self.perm))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(has_perm(user, self.perm))
+            self.assertFalse(has_perm(user, "planner.add_event"))
+
+    def test_one_cache_read_per_request(self):
+        has_perm(self.fresh_user(), self.perm)
+        planner_cache.reset_stats(PERMISSIONS_CACHE)
+        user = self.fresh_user()
+        with mock.patch(
+            "planner.permissions.cache", wraps=cache
+        ) as wrapped:
+            self.assertTrue(has_perm(user, self.perm))
+            self.assertTrue(has_perm(user, self.perm))
+        self.assertEqual(
+            [call[0] for call in wrapped.method_calls], ["get_many"]
+        )
+        self.assertEqual(
+            planner_cache.stats(PERMISSIONS_CACHE), {"hits": 1, "misses": 0}
+        )
+
+    def test_group_changes_invalidate(self):
+        self.assertTrue(has_perm(self.fresh_user(), self.perm))
+        self.user.groups.remove(self.group)
+        self.assertFalse(has_perm(self.fresh_user(), self.perm))
+
+        self.group.permissions.add(Permission.objects.get(codename="add_event"))
+        self.user.groups.add(self.group)
+        self.assertTrue(has_perm(self.fresh_user(), "planner.add_event"))
+
+    def test_inactive_user_has_no_perms(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(has_perm(self.fresh_user(), self.perm))
+
+
+class DoubleBookingTests(TestCase):
+    def setUp(self):
+        self.prive = Venue.objects.create(name="PRIVE")
+        self.mgf = Venue.objects.create(name="MGF")
+        self.marvin = Performer.objects.create(name="DJ MARVIN")
+        # Overnight NYE set, 18h00-02h00.
+        self.nye = Event.objects.create(
+            date=datetime.date(2025, 12, 31),
+            performance_time_start=datetime.time(18),
+            performance_time_end=datetime.time(2),
+            venue=self.prive,
+            performer=self.marvin,
+        )
+
+    def form(self, day, start, end, instance=None):
+        return EventForm(
+            {
+                "date": day,
+                "performance_time_start": start,
+                "performance_time_end": end,
+                "venue": self.mgf.pk,
+                "performer": self.marvin.pk,
+            },
+            instance=instance,
+        )
+
+    def test_overlap_same_evening_is_rejected(self):
+        form = self.form("2025-12-31", "19:30", "22:30")
+        self.assertFalse(form.is_valid())
+        self.assertIn("already booked at PRIVE", form.errors["performer"][0])
+
+    def test_overnight_set_blocks_early_next_day(self):
+        self.assertFalse(self.form("2026-01-01", "01:00", "03:00").is_valid())
+        self.assertTrue(self.form("2026-01-01", "02:00", "04:00").is_valid())
+
+    def test_overnight_candidate_checks_next_day(self):
+        Event.objects.create(
+            date=datetime.date(2025, 12, 20),
+            performance_time_start=datetime.time(0, 30),
+            performance_time_end=datetime.time(1, 30),
+            venue=self.prive,
+            performer=self.marvin,
+        )
+        self.assertFalse(self.form("2025-12-19", "23:00", "01:00").is_valid())
+
+    def test_back_to_back_and_editing_self_are_allowed(self):
+        self.assertTrue(self.form("2025-12-31", "17:00", "18:00").is_valid())
+        self.assertTrue(
+            self.form("2025-12-31", "18:00", "02:30", instance=self.nye)
+            .is_valid()
+        )
+
+    def test_index_queries(self):
+        index = IntervalIndex([(0, 10, "a"), (2, 3, "b"), (5, 7, "c")])
+        self.assertEqual(index.overlapping(3, 5), ["a"])
+        self.assertEqual(index.overlapping(6, 20), ["a", "c"])
+        self.assertEqual(index.overlapping(10, 11), [])
+
+
+class ScheduleConflictsCommandTests(TestCase):
+    def test_reports_performer_and_venue_overlaps(self):
+        prive = Venue.objects.create(name="PRIVE")
+        mgf = Venue.objects.create(name="MGF")
+        al = Performer.objects.create(name="DJ AL")
+        trio = Performer.objects.create(name="TRIO")
+        for day, start, end, venue, performer in [
+            (datetime.date(2025, 12, 31), 18, 2, prive, al),
+            (datetime.date(2026, 1, 1), 1, 3, mgf, al),
+            (datetime.date(2026, 1, 1), 3, 5, mgf, al),
+            (datetime.date(2026, 1, 1), 2, 4, mgf, trio),
+        ]:
+            Event.objects.create(
+                date=day,
+                performance_time_start=datetime.time(start),
+                performance_time_end=datetime.time(end),
+                venue=venue,
+                performer=performer,
+            )
+
+        out = io.StringIO()
+        call_command(
+            "schedule_conflicts", "--from", "2026-01-01", "--to", "2026-01-31",
+            stdout=out, stderr=io.StringIO(),
+        )
+        conflicts = [json.loads(line) for line in out.getvalue().splitlines()]
+        summary = sorted(
+            (c["type"], c["events"][0]["start"], c["events"][1]["start"])
+            for c in conflicts
+        )
+        self.assertEqual(
+            summary,
+            [
+                ("performer", "18:00", "01:00"),
+                ("venue", "01:00", "02:00"),
+                ("venue", "02:00", "03:00"),
+            ],
+        )
+
+
+@PLAIN_STATIC
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("coord", password="pw"))
+        self.prive = Venue.objects.create(name="PRIVE")
+        self.mgf = Venue.objects.create(name="MGF")
+        self.al = Performer.objects.create(name="DJ AL")
+        self.kaylan = Performer.objects.create(name="DJ KAYLAN")
+        for day, start, end, venue, performer in [
+            (datetime.date(2025, 12, 31), 18, 2, self.prive, self.al),
+            (datetime.date(2026, 1, 1), 12, 15, self.mgf, self.kaylan),
+        ]:
+            Event.objects.create(
+                date=day,
+                performance_time_start=datetime.time(start),
+                performance_time_end=datetime.time(end),
+                venue=venue,
+                performer=performer,
+            )
+
+    def test_free_performers_account_for_overnight_sets(self):
+        url = reverse("planner:performer_availability_api")
+        with self.assertNumQueries(5):  # session, user, venue, events, performers
+            data = self.client.get(
+                url,
+                {"venue": self.mgf.pk, "start": "2026-01-01T01:00",
+                 "end": "2026-01-01T03:00"},
+            ).json()
+        self.assertTrue(data["venue_free"])
+        self.assertEqual([p["name"] for p in data["performers"]], ["DJ KAYLAN"])
+
+    def test_open_slots_skip_bookings(self):
+        data = self.client.get(
+            reverse("planner:venue_slots_api"),
+            {"venue": self.prive.pk, "from": "2025-12-31", "to": "2026-01-01"},
+        ).json()
+        self.assertEqual(
+            [(slot["start"][11:16], slot["end"][11:16]) for slot in data["slots"]],
+            [("08:00", "18:00"), ("08:00", "02:00")],
+        )
+
+    def test_page_renders(self):
+        response = self.client.get(
+            reverse("planner:availability"),
+            {"venue": self.mgf.pk, "start": "2026-01-01T10:00",
+             "end": "2026-01-01T13:00"},
+        )
+        self.assertContains(response, "already has a booking")
+        self.assertContains(response, "DJ AL")
+
+    def test_page_reports_missing_bound(self):
+        response = self.client.get(
+            reverse("planner:availability"),
+            {"venue": self.mgf.pk, "from": "2026-01-01"},
+        )
+        self.assertContains(response, "Missing parameter &#x27;to&#x27;")
+
+
+class OpenSlotSolverTests(TestCase):
+    def setUp(self):
+        self.venues = [Venue.objects.create(name=f"VENUE {i}") for i in range(4)]
+        self.house = [
+            Performer.objects.create(name=f"DJ {i}", genre="House")
+            for i in range(8)
+        ]
+        self.jazz = Performer.objects.create(name="BAND", genre="Jazz")
+        for day in range(1, 32):
+            for venue in self.venues:
+                for start, end in ((18, 22), (21, 1)):
+                    OpenSlot.objects.create(
+                        date=datetime.date(2025, 12, day),
+                        performance_time_start=datetime.time(start),
+                        performance_time_end=datetime.time(end),
+                        venue=venue,
+                        genre="house",
+                    )
+        Event.objects.create(
+            date=datetime.date(2025, 12, 24),
+            performance_time_start=datetime.time(12),
+            performance_time_end=datetime.time(19),
+            venue=self.venues[0],
+            performer=self.house[0],
+        )
+
+    def test_full_month_without_double_booking(self):
+        slots = list(OpenSlot.objects.all())
+        solution = solve_open_slots(slots)
+        self.assertEqual(solution.unassigned, [])
+        self.assertEqual(len(solution.assignment), len(slots))
+        self.assertNotIn(self.jazz.pk, solution.assignment.values())
+
+        spans = {}
+        for slot in slots:
+            spans.setdefault(solution.assignment[slot.pk], []).append(
+                event_span(slot.date, slot.performance_time_start,
+                           slot.performance_time_end)
+            )
+        booked = Event.objects.get()
+        spans[self.house[0].pk].append(
+            event_span(booked.date, booked.performance_time_start,
+                       booked.performance_time_end)
+        )
+        for performer_spans in spans.values():
+            performer_spans.sort()
+            for (_, end), (start, _) in zip(performer_spans, performer_spans[1:]):
+                self.assertLessEqual(end, start)
+
+        # Every night's sets overlap, so each DJ plays exactly one a night;
+        # DJ 0 also keeps the existing 7h booking.
+        self.assertEqual(solution.hours[self.house[0].pk], 31 * 4 + 7)
+        for performer in self.house[1:]:
+            self.assertEqual(solution.hours[performer.pk], 31 * 4)
+
+    def test_fill_creates_events_in_bulk(self):
+        slots = list(OpenSlot.objects.filter(date=datetime.date(2025, 12, 1)))
+        solution = solve_open_slots(slots)
+        with self.assertNumQueries(5):  # savepoints, insert, update, outbox
+            fill_open_slots(slots, solution)
+        self.assertEqual(
+            OpenSlot.objects.filter(event__isnull=False).count(), len(slots)
+        )
+
+    def test_slot_without_candidates_is_left_open(self):
+        slot = OpenSlot.objects.create(
+            date=datetime.date(2025, 12, 1),
+            performance_time_start=datetime.time(12),
+            performance_time_end=datetime.time(14),
+            venue=self.venues[0],
+            genre="Techno",
+        )
+        self.assertEqual(solve_open_slots([slot]).unassigned, [slot.pk])
+
+
+class CalendarServiceCacheTests(TestCase):
+    def setUp(self):
+        key = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        key.close()
+        self.addCleanup(os.unlink, key.name)
+        self.key = key.name
+        for target, value in [
+            ("SERVICE_ACCOUNT_FILE", key.name),
+            ("CREDENTIALS_CHECK_INTERVAL", 0),
+        ]:
+            patcher = mock.patch.object(google_calendar, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.load = self._patch(
+            "service_account.Credentials.from_service_account_file"
+        )
+        self.build = self._patch("build", side_effect=lambda *a, **k: object())
+        google_calendar.reset_calendar_service()
+        self.addCleanup(google_calendar.reset_calendar_service)
+
+    def _patch(self, target, **kwargs):
+        patcher = mock.patch(f"planner.utils.google_calendar.{target}", **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_service_is_built_once_per_thread(self):
+        service = google_calendar.get_calendar_service()
+        self.assertIs(google_calendar.get_calendar_service(), service)
+
+        other = []
+        thread = threading.Thread(
+            target=lambda: other.append(google_calendar.get_calendar_service())
+        )
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], service)
+        self.assertEqual(self.load.call_count, 1)
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_rotated_key_and_reset_rebuild_the_service(self):
+        service = google_calendar.get_calendar_service()
+        os.utime(self.key, (0, 0))
+        rotated = google_calendar.get_calendar_service()
+        self.assertIsNot(rotated, service)
+
+        google_calendar.reset_calendar_service()
+        self.assertIsNot(google_calendar.get_calendar_service(), rotated)
+        self.assertEqual(self.load.call_count, 3)
+
+    def test_missing_key_disables_sync(self):
+        with mock.patch.object(google_calendar, "SERVICE_ACCOUNT_FILE", "/nope"):
+            self.assertIsNone(google_calendar.get_calendar_service())
+            self.assertFalse(
+                google_calendar.calendar_service_health()["configured"]
+            )
+        self.build.assert_not_called()
+
+    def test_worker_check_prints_health(self):
+        command = "planner.management.commands.run_calendar_worker"
+        out = io.StringIO()
+        with mock.patch(f"{command}.calendar_service_health") as health:
+            health.return_value = {
+                "configured": True,
+                "service_account": "planner@example.iam.gserviceaccount.com",
+                "token_valid": True,
+                "token_expiry": "2026-01-01T00:00:00",
+            }
+            call_command("run_calendar_worker", "--check", stdout=out)
+            health.assert_called_once_with(refresh=True)
+            self.assertIn("planner@example", out.getvalue())
+
+            health.return_value = {**health.return_value, "error": "revoked"}
+            with self.assertRaisesMessage(CommandError, "revoked"):
+                call_command("run_calendar_worker", "--check", stdout=out)
+
+    def test_worker_reloads_credentials_when_unavailable(self):
+        command = "planner.management.commands.run_calendar_worker"
+        with mock.patch(
+            f"{command}.process_outbox",
+            side_effect=google_calendar.CalendarUnavailable,
+        ), mock.patch(f"{command}.reset_calendar_service") as reset:
+            call_command(
+                "run_calendar_worker", "--once",
+                stdout=io.StringIO(), stderr=io.StringIO(),
+            )
+        reset.assert_called_once_with()
+
+
+class CalendarOutboxTests(TestCase):
+    def setUp(self):
+        self.event = make_events(1)[0]
+        self.push = mock.patch(
+            "planner.outbox.push_events",
+            side_effect=lambda events: {e.pk: "g-1" for e in events},
+        ).start()
+        self.remove = mock.patch(
+            "planner.outbox.remove_events",
+            side_effect=lambda items: dict.fromkeys(k for k, _, _ in items),
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_saving_only_queues_the_push(self):
+        with mock.patch(
+            "planner.utils.google_calendar.get_calendar_service"
+        ) as service:
+            self.event.save()
+        service.assert_not_called()
+        self.assertEqual(
+            list(CalendarOutbox.objects.values_list("event_id", "action")),
+            [(self.event.pk, "upsert")] * 2,
+        )
+
+    def test_worker_collapses_upserts_and_writes_back_the_id(self):
+        self.event.save()
+        self.event.save()
+        self.assertEqual(process_outbox(), {"sent": 1, "retried": 0, "failed": 0})
+        self.push.assert_called_once()
+        self.assertFalse(CalendarOutbox.objects.exists())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.google_event_id, "g-1")
+
+        self.event.delete()
+        process_outbox()
+        self.remove.assert_called_once()
+        self.assertEqual(self.remove.call_args[0][0][0][1:], ("g-1", "primary"))
+
+    def test_failed_push_is_retried_before_later_changes(self):
+        self.push.side_effect = lambda events: {
+            e.pk: RuntimeError("rateLimitExceeded") for e in events
+        }
+        self.assertEqual(process_outbox(), {"sent": 0, "retried": 1, "failed": 0})
+        first = CalendarOutbox.objects.get()
+        self.assertEqual(first.attempts, 1)
+        self.assertGreater(first.next_attempt_at, first.created_at)
+        # The delete row waits behind the failed upsert.
+        self.event.delete()
+        self.assertEqual(process_outbox(), {"sent": 0, "retried": 0, "failed": 0})
+        self.remove.assert_not_called()
+
+
+class FakeBatch:
+    """Stands in for a googleapiclient ``BatchHttpRequest``."""
+
+    ids = itertools.count()
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append(request_id)
+
+    def execute(self):
+        for request_id in self.requests:
+            self.callback(request_id, {"id": f"g-{next(self.ids)}"}, None)
+
+
+class BatchedPushTests(TestCase):
+    def test_month_is_pushed_in_batches(self):
+        make_events(60)
+        batches = []
+
+        def new_batch(callback):
+            batches.append(FakeBatch(callback))
+            return batches[-1]
+
+        service = mock.Mock()
+        service.new_batch_http_request.side_effect = new_batch
+        with mock.patch(
+            "planner.utils.google_calendar.get_calendar_service",
+            return_value=service,
+        ), mock.patch.object(
+            google_calendar, "_limiter", google_calendar.TokenBucket(1000, 100)
+        ):
+            self.assertEqual(process_outbox(batch_size=100)["sent"], 60)
+        self.assertEqual([len(b.requests) for b in batches], [50, 10])
+        self.assertFalse(CalendarOutbox.objects.exists())
+        self.assertFalse(Event.objects.filter(google_event_id=None).exists())
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b"")
+
+
+class IncrementalPullTests(TestCase):
+    def setUp(self):
+        self.event = make_events(1)[0]
+        Event.objects.filter(pk=self.event.pk).update(google_event_id="g-1")
+        self.venue = self.event.venue
+        Venue.objects.filter(pk=self.venue.pk).update(google_calendar_id="cal")
+        self.pages = []
+        service = mock.Mock()
+        service.events().list.side_effect = self._list
+        patcher = mock.patch(
+            "planner.utils.google_calendar.get_calendar_service",
+            return_value=service,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = []
+
+    def _list(self, **params):
+        self.calls.append(params)
+        page = self.pages.pop(0)
+        request = mock.Mock()
+        if isinstance(page, Exception):
+            request.execute.side_effect = page
+        else:
+            request.execute.return_value = page
+        return request
+
+    def _moved(self, start, end):
+        return {
+            "id": "g-1",
+            "start": {"dateTime": f"2025-12-02T{start}:00+02:00"},
+            "end": {"dateTime": f"2025-12-02T{end}:00+02:00"},
+        }
+
+    def test_pull_follows_pages_and_keeps_the_sync_token(self):
+        self.pages = [
+            {"items": [], "nextPageToken": "p2"},
+            {"items": [self._moved("20:00", "23:00")], "nextSyncToken": "s1"},
+        ]
+        CalendarSyncEngine().run()
+        self.assertEqual(self.calls[1]["pageToken"], "p2")
+        self.assertEqual(
+            Venue.objects.get(pk=self.venue.pk).google_sync_token, "s1"
+        )
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.date, datetime.date(2025, 12, 2))
+
+        self.pages = [{"items": [{"id": "g-9", "status": "cancelled"}],
+                       "nextSyncToken": "s2"}]
+        CalendarSyncEngine().run()
+        self.assertEqual(self.calls[2]["syncToken"], "s1")
+
+    def test_expired_token_falls_back_to_a_full_sync(self):
+        Venue.objects.filter(pk=self.venue.pk).update(google_sync_token="old")
+        self.pages = [
+            http_error(410),
+            {"items": [self._moved("21:00", "23:00")], "nextSyncToken": "s2"},
+        ]
+        CalendarSyncEngine().run()
+        self.assertNotIn("syncToken", self.calls[1])
+        self.assertEqual(
+            Venue.objects.get(pk=self.venue.pk).google_sync_token, "s2"
+        )
+
+    def test_stream_reads_pages_lazily(self):
+        self.pages = [
+            {"items": [{"id": "a"}, {"id": "b"}], "nextPageToken": "p2"},
+            {"items": [{"id": "c"}]},
+        ]
+        stream = google_calendar.EventStream(
+            "cal", page_size=2, time_min="2025-12-01T00:00:00Z"
+        )
+        events = iter(stream)
+        self.assertEqual([next(events)["id"], next(events)["id"]], ["a", "b"])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.calls[0]["maxResults"], 2)
+        self.assertEqual(self.calls[0]["timeMin"], "2025-12-01T00:00:00Z")
+        self.assertEqual([e["id"] for e in events], ["c"])
+        self.assertEqual(stream.api_calls, 2)
+        self.assertIsNone(stream.next_sync_token)
+
+
+class ReconcileTests(TestCase):
+    def setUp(self):
+        self.events = make_events(3)
+        for i, event in enumerate(self.events):
+            Event.objects.filter(pk=event.pk).update(google_event_id=f"g-{i}")
+
+    def _google(self, event, g_id, hour):
+        local = datetime.datetime.combine(event.date, datetime.time(hour))
+        return {
+            "id": g_id,
+            "start": {"dateTime": timezone.make_aware(local).isoformat()},
+            "end": {"dateTime": f"{event.date}T23:00:00"},
+        }
+
+    def test_one_lookup_and_one_bulk_update(self):
+        first, second, _ = self.events
+        google_events = [
+            self._google(first, "g-0", 12),  # moved
+            self._google(second, "g-1", second.performance_time_start.hour),
+            self._google(second, "external", 12),
+            {"id": "g-2", "status": "cancelled"},
+        ]
+        with self.assertNumQueries(4):  # select, savepoint, update, release
+            counts, changes = CalendarSyncEngine().reconcile(google_events)
+        self.assertEqual(
+            counts, SyncCounts(checked=4, updated=1, skipped=1, external=1)
+        )
+        self.assertEqual(changes[0].after[1], datetime.time(12))
+        first.refresh_from_db()
+        self.assertEqual(first.performance_time_start, datetime.time(12))
+
+
+class ConcurrentPullTests(TestCase):
+    def test_venues_are_fetched_in_parallel_and_reconciled_serially(self):
+        events = make_events(3)
+        venues = []
+        for i, event in enumerate(events):
+            venue = Venue.objects.create(name=f"V{i}", google_calendar_id=f"cal-{i}")
+            Event.objects.filter(pk=event.pk).update(
+                venue=venue, google_event_id=f"g-{i}"
+            )
+            venues.append(venue)
+
+        barrier = threading.Barrier(3, timeout=5)
+        main = threading.get_ident()
+
+        def pages(stream):
+            # Every fetch must be in flight at once to pass the barrier.
+            barrier.wait()
+            self.assertNotEqual(threading.get_ident(), main)
+            i = stream.calendar_id[-1]
+            stream.next_sync_token = f"s-{i}"
+            yield [{"id": f"g-{i}", "start": {"dateTime": "2025-12-05T12:00"},
+                    "end": {"dateTime": "2025-12-05T14:00"}}]
+
+        reconciled_in = set()
+        reconcile = CalendarSyncEngine.reconcile
+
+        def tracking_reconcile(engine, page):
+            reconciled_in.add(threading.get_ident())
+            return reconcile(engine, page)
+
+        with mock.patch.object(
+            google_calendar.EventStream, "pages", pages
+        ), mock.patch.object(
+            CalendarSyncEngine, "reconcile", tracking_reconcile
+        ):
+            report = CalendarSyncEngine(concurrency=3).run()
+
+        self.assertEqual(reconciled_in, {main})
+        self.assertEqual(report.updated, 3)
+        self.assertEqual(
+            [v.name for v in report.venues if v.counts.updated], ["V0", "V1", "V2"]
+        )
+        self.assertEqual(
+            sorted(
+                Venue.objects.filter(pk__in=[v.pk for v in venues])
+                .values_list("google_sync_token", flat=True)
+            ),
+            ["s-0", "s-1", "s-2"],
+        )
+
+
+@override_settings(GOOGLE_WEBHOOK_URL="https://planner.example.com/hook")
+class WatchChannelTests(TestCase):
+    def setUp(self):
+        self.venue = Venue.objects.create(name="PRIVE", google_calendar_id="cal")
+        self.channel = CalendarWatchChannel.objects.create(
+            venue=self.venue,
+            channel_id="chan-1",
+            resource_id="res-1",
+            token="secret",
+            expiration=timezone.now() + datetime.timedelta(hours=2),
+        )
+        self.url = reverse("planner:calendar_notification")
+
+    def _notify(self, channel, state="exists"):
+        headers = {
+            f"HTTP_{name.upper().replace('-', '_')}": value
+            for name, value in notification_headers(channel, state).items()
+        }
+        return self.client.post(self.url, **headers)
+
+    def test_notification_queues_a_venue_pull(self):
+        self.assertEqual(self._notify(self.channel, "sync").status_code, 204)
+        self.venue.refresh_from_db()
+        self.assertIsNone(self.venue.google_sync_requested_at)
+
+        self.assertEqual(self._notify(self.channel).status_code, 204)
+        self.venue.refresh_from_db()
+        self.assertIsNotNone(self.venue.google_sync_requested_at)
+
+        with mock.patch("planner.watch.CalendarSyncEngine") as engine:
+            run_requested_syncs()
+        self.assertEqual(list(engine.call_args[0][0]), [self.venue])
+        self.assertIsNone(run_requested_syncs())
+
+    def test_forged_token_is_rejected(self):
+        self.channel.token = "guess"
+        self.assertEqual(self._notify(self.channel).status_code, 403)
+
+    def test_expiring_channel_is_renewed(self):
+        service = mock.Mock()
+        service.events().watch().execute.return_value = {
+            "id": "chan-2",
+            "resourceId": "res-2",
+            "expiration": str(int(
+                (timezone.now() + datetime.timedelta(days=7)).timestamp() * 1000
+            )),
+        }
+        with mock.patch(
+            "planner.watch.get_calendar_service", return_value=service
+        ):
+            self.assertEqual(len(renew_watch_channels()), 1)
+            self.assertEqual(renew_watch_channels(), [])  # now fresh
+        self.assertEqual(
+            list(CalendarWatchChannel.objects.values_list("channel_id", flat=True)),
+            ["chan-2"],
+        )
+        service.channels().stop.assert_called_with(
+            body={"id": "chan-1", "resourceId": "res-1"}
+        )
+
+
+class SyncEngineTests(TestCase):
+    def setUp(self):
+        self.event = make_events(1)[0]
+        Event.objects.filter(pk=self.event.pk).update(google_event_id="g-1")
+        Venue.objects.filter(pk=self.event.venue_id).update(
+            google_calendar_id="cal", google_sync_token="s0"
+        )
+        self.streams = []
+
+        def pages(stream):
+            self.streams.append(stream)
+            stream.api_calls = 1
+            stream.next_sync_token = "s1"
+            yield [{
+                "id": "g-1",
+                "summary": "DJ 0 @ PRIVE",
+                "start": {"dateTime": "2025-12-01T19:00:00+02:00"},
+                "end": {"dateTime": "2025-12-01T23:00:00+02:00"},
+            }]
+
+        patcher = mock.patch.object(google_calendar.EventStream, "pages", pages)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_dry_run_reports_the_diff_without_writing(self):
+        out = io.StringIO()
+        call_command("sync_google_calendar", "--dry-run", "--venue", "PRIVE",
+                     stdout=out)
+        self.assertIn("DJ 0 @ PRIVE: 2025-12-01 18:00-23:00 -> "
+                      "2025-12-01 19:00-23:00", out.getvalue())
+        self.assertIn("1 event(s) would be updated", out.getvalue())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.performance_time_start, datetime.time(18))
+        self.assertEqual(Venue.objects.get().google_sync_token, "s0")
+
+    def test_window_lists_the_period_and_keeps_the_token(self):
+        report = CalendarSyncEngine(
+            since=datetime.date(2025, 12, 1), until=datetime.date(2025, 12, 31)
+        ).run()
+        stream = self.streams[0]
+        self.assertIsNone(stream.sync_token)
+        self.assertEqual(stream.time_min, "2025-12-01T00:00:00+02:00")
+        self.assertEqual(stream.time_max, "2026-01-01T00:00:00+02:00")
+        self.assertEqual((report.updated, report.api_calls), (1, 1))
+        self.assertEqual(Venue.objects.get().google_sync_token, "s0")
+
+        CalendarSyncEngine().run()
+        self.assertEqual(self.streams[1].sync_token, "s0")
+        self.assertEqual(Venue.objects.get().google_sync_token, "s1")
+
+
+class SyncJobTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            "staff", password="pw", is_staff=True
+        )
+        self.client.force_login(self.staff)
+
+    def test_request_queues_one_job_and_returns_at_once(self):
+        with mock.patch.object(CalendarSyncEngine, "run") as run:
+            first = self.client.post(reverse("planner:sync_calendar"))
+            second = self.client.post(reverse("planner:sync_calendar"))
+        run.assert_not_called()
+        job = CalendarSyncJob.objects.get()
+        self.assertEqual(job.status, CalendarSyncJob.QUEUED)
+        self.assertEqual(job.requested_by, self.staff)
+        url = f"{reverse('planner:sync_calendar')}?job={job.pk}"
+        self.assertRedirects(first, url, fetch_redirect_response=False)
+        self.assertRedirects(second, url, fetch_redirect_response=False)
+
+    @PLAIN_STATIC
+    def test_status_page_embeds_the_job(self):
+        job = CalendarSyncJob.objects.create()
+        response = self.client.get(reverse("planner:sync_calendar"))
+        self.assertContains(response, f'"id": {job.pk}')
+        self.assertContains(
+            response, reverse("planner:sync_job_status", args=[0])
+        )
+
+    def test_worker_runs_the_job_and_records_progress(self):
+        event = make_events(1)[0]
+        Event.objects.filter(pk=event.pk).update(google_event_id="g-1")
+        Venue.objects.update(google_calendar_id="cal")
+        job = CalendarSyncJob.objects.create()
+
+        def pages(stream):
+            stream.api_calls = 1
+            yield [{
+                "id": "g-1",
+                "start": {"dateTime": "2025-12-01T19:00:00+02:00"},
+                "end": {"dateTime": "2025-12-01T23:00:00+02:00"},
+            }]
+
+        with mock.patch.object(google_calendar.EventStream, "pages", pages):
+            self.assertEqual(run_sync_job().pk, job.pk)
+        self.assertIsNone(run_sync_job())
+
+        status = self.client.get(
+            reverse("planner:sync_job_status", args=[job.pk])
+        ).json()
+        self.assertEqual(
+            (status["status"], status["finished"], status["updated"]),
+            ("done", True, 1),
+        )
+        self.assertEqual(status["venue_count"], 1)
+        self.assertEqual(status["venues"], [{
+            "name": "PRIVE", "checked": 1, "updated": 1, "external": 0,
+            "error": None,
+        }])
+        self.assertGreaterEqual(status["seconds"], 0)
+
+    def test_stale_running_job_no_longer_blocks_requests(self):
+        stale = CalendarSyncJob.objects.create(
+            status=CalendarSyncJob.RUNNING,
+            started_at=timezone.now() - SYNC_JOB_TIMEOUT * 2,
+        )
+        self.client.post(reverse("planner:sync_calendar"))
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, CalendarSyncJob.FAILED)
+        self.assertTrue(
+            CalendarSyncJob.objects.filter(
+                status=CalendarSyncJob.QUEUED
+            ).exists()
+        )
+
+    def test_unclaimed_queued_job_expires(self):
+        stale = CalendarSyncJob.objects.create()
+        CalendarSyncJob.objects.filter(pk=stale.pk).update(
+            created_at=timezone.now() - SYNC_JOB_TIMEOUT * 2
+        )
+        status = self.client.get(
+            reverse("planner:sync_job_status", args=[stale.pk])
+        ).json()
+        self.assertTrue(status["finished"])
+        self.assertIn("run_calendar_worker", status["error"])
+
+        self.client.post(reverse("planner:sync_calendar"))
+        self.assertEqual(
+            CalendarSyncJob.objects.filter(
+                status=CalendarSyncJob.QUEUED
+            ).count(),
+            1,
+        )
+
+    def test_queue_survives_a_conflicting_job_finishing(self):
+        # Each insert conflicts with a job another request queued, which
+        # the worker has finished by the time we look again.
+        done = CalendarSyncJob.objects.create(status=CalendarSyncJob.DONE)
+        with mock.patch.object(
+            CalendarSyncJob.objects, "create", side_effect=IntegrityError
+        ):
+            self.assertEqual(queue_sync_job(), done)
+
+        create = CalendarSyncJob.objects.create
+        conflicts = [IntegrityError]
+
+        def create_once_free(**kwargs):
+            if conflicts:
+                raise conflicts.pop()
+            return create(**kwargs)
+
+        with mock.patch.object(
+            CalendarSyncJob.objects, "create", side_effect=create_once_free
+        ):
+            job = queue_sync_job()
+        self.assertEqual(job.status, CalendarSyncJob.QUEUED)
+
+    def test_worker_runs_jobs_when_pushes_are_unavailable(self):
+        job = CalendarSyncJob.objects.create()
+        with mock.patch(
+            "planner.management.commands.run_calendar_worker.process_outbox",
+            side_effect=google_calendar.CalendarUnavailable,
+        ):
+            call_command(
+                "run_calendar_worker", "--once",
+                stdout=io.StringIO(), stderr=io.StringIO(),
+            )
+        job.refresh_from_db()
+        self.assertEqual(job.status, CalendarSyncJob.DONE)
+
+    def test_status_is_staff_only(self):
+        job = CalendarSyncJob.objects.create()
+        user = User.objects.create_user("user", password="pw")
+        self.client.force_login(user)
+        response = self.client.get(
+            reverse("planner:sync_job_status", args=[job.pk])
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        google_calendar.reset_call_stats()
+        self.sleeps = []
+        patcher = mock.patch.object(
+            google_calendar.time, "sleep", self.sleeps.append
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_bucket_paces_bursts(self):
+        now = [0.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        bucket = google_calendar.TokenBucket(
+            10, 2, clock=lambda: now[0], sleep=sleep
+        )
+        waited = [bucket.acquire() for _ in range(5)]
+        self.assertEqual(waited[:2], [0.0, 0.0])
+        self.assertAlmostEqual(now[0], 0.3)
+        bucket.acquire(50)  # a batch larger than the bucket goes into debt
+        self.assertLess(bucket.tokens, 0)
+
+    def test_rate_limited_calls_are_retried_with_backoff(self):
+        request = mock.Mock()
+        request.execute.side_effect = [
+            http_error(429),
+            HttpError(
+                httplib2.Response({"status": 403}),
+                json.dumps({"error": {"errors": [
+                    {"reason": "rateLimitExceeded"}
+                ]}}).encode(),
+            ),
+            http_error(503),
+            {"id": "g-1"},
+        ]
+        self.assertEqual(google_calendar.execute(request), {"id": "g-1"})
+        self.assertEqual(len(self.sleeps), 3)
+        self.assertLess(self.sleeps[0], self.sleeps[2])
+        self.assertEqual(google_calendar.call_stats(), {
+            "retried": 3, "rate_limited": 2, "server_error": 1, "succeeded": 1,
+        })
+
+    def test_other_errors_are_not_retried(self):
+        request = mock.Mock()
+        request.execute.side_effect = http_error(403)
+        with self.assertRaises(HttpError):
+            google_calendar.execute(request)
+        self.assertEqual(self.sleeps, [])
+        self.assertEqual(google_calendar.call_stats(), {"failed": 1})
+
+
+@override_settings(GOOGLE_CALENDAR_FAKE="memory")
+class FakeCalendarTests(TestCase):
+    """The real client code against the local Calendar API fake."""
+
+    def setUp(self):
+        self.fake = fake_calendar.install()
+        self.addCleanup(fake_calendar.install)
+        for patcher in (
+            mock.patch.object(
+                google_calendar, "_limiter",
+                google_calendar.TokenBucket(1000, 100),
+            ),
+            mock.patch.object(google_calendar.time, "sleep"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def add_events(self, count, calendar_id="cal"):
+        return [
+            self.fake.add_event(calendar_id, {
+                "summary": f"Set {i}",
+                "start": {"dateTime": f"2025-12-{1 + i:02d}T18:00:00Z"},
+                "end": {"dateTime": f"2025-12-{1 + i:02d}T19:00:00Z"},
+            })
+            for i in range(count)
+        ]
+
+    def test_listing_pages_and_hands_out_sync_tokens(self):
+        g_events = self.add_events(7)
+        stream = google_calendar.EventStream("cal", page_size=3)
+        self.assertEqual(
+            [g_event["summary"] for g_event in stream],
+            [f"Set {i}" for i in range(7)],
+        )
+        self.assertEqual(stream.api_calls, 3)
+
+        self.fake.update_event("cal", g_events[2]["id"], summary="Moved")
+        self.fake.delete_event("cal", g_events[5]["id"])
+        changes = google_calendar.EventStream("cal", stream.next_sync_token)
+        self.assertEqual(
+            [(g_event["id"], g_event["status"]) for g_event in changes],
+            [(g_events[2]["id"], "confirmed"),
+             (g_events[5]["id"], "cancelled")],
+        )
+
+        self.fake.expire_sync_tokens()
+        stream = google_calendar.EventStream("cal", changes.next_sync_token)
+        self.assertEqual(len(list(stream)), 6)
+        self.assertEqual(stream.api_calls, 2)  # 410, then the full listing
+
+    def test_outbox_pushes_in_one_batch_round_trip(self):
+        events = make_events(3)
+        Venue.objects.update(google_calendar_id="cal")
+        self.assertEqual(process_outbox()["sent"], 3)
+        self.assertEqual(self.fake.round_trips, 1)
+        self.assertEqual(self.fake.calls, {"events.insert": 3})
+        ids = {event["id"] for event in self.fake.events("cal")}
+        self.assertEqual(
+            ids,
+            set(Event.objects.values_list("google_event_id", flat=True)),
+        )
+
+        events[0].refresh_from_db()
+        events[0].delete()
+        process_outbox()
+        self.assertEqual(len(self.fake.events("cal")), 2)
+
+    def test_injected_failures_are_retried(self):
+        make_events(2)
+        Venue.objects.update(google_calendar_id="cal")
+        self.fake.fail_next(503, 429)
+        self.assertEqual(process_outbox()["sent"], 2)
+        self.assertEqual(self.fake.calls, {"events.insert": 4})
+        self.assertEqual(self.fake.round_trips, 2)
+
+    def test_pull_applies_google_side_edits(self):
+        event = make_events(1)[0]
+        Venue.objects.update(google_calendar_id="cal")
+        process_outbox()
+        CalendarSyncEngine().run()
+
+        event.refresh_from_db()
+        self.fake.update_event(
+            "cal", event.google_event_id,
+            start={"dateTime": "2025-12-01T20:00:00+02:00"},
+            end={"dateTime": "2025-12-01T23:30:00+02:00"},
+        )
+        report = CalendarSyncEngine().run()
+        self.assertEqual((report.checked, report.updated), (1, 1))
+        event.refresh_from_db()
+        self.assertEqual(
+            (event.performance_time_start, event.performance_time_end),
+            (datetime.time(20), datetime.time(23, 30)),
+        )
+
+    def test_failed_requested_sync_is_retried(self):
+        event = make_events(1)[0]
+        venue = Venue.objects.get()
+        Venue.objects.update(google_calendar_id="cal")
+        process_outbox()
+        CalendarSyncEngine().run()
+        event.refresh_from_db()
+        self.fake.update_event(
+            "cal", event.google_event_id,
+            start={"dateTime": "2025-12-01T20:00:00+02:00"},
+            end={"dateTime": "2025-12-01T23:30:00+02:00"},
+        )
+        request_venue_sync(venue.pk)
+
+        self.fake.fail_next(*[503] * (google_calendar.MAX_RETRIES + 1))
+        report = run_requested_syncs()
+        self.assertTrue(report.venues[0].error)
+        venue.refresh_from_db()
+        self.assertIsNotNone(venue.google_sync_requested_at)
+
+        report = run_requested_syncs()
+        self.assertEqual((report.updated, report.venues[0].error), (1, None))
+        venue.refresh_from_db()
+        self.assertIsNone(venue.google_sync_requested_at)
+        self.assertIsNone(run_requested_syncs())
+
+    def test_saves_that_change_nothing_are_not_pushed(self):
+        event = make_events(1)[0]
+        Venue.objects.update(google_calendar_id="cal")
+        process_outbox()
+        self.fake.reset_counters()
+
+        event.refresh_from_db()
+        event.save()
+        self.assertEqual(process_outbox()["sent"], 1)
+        self.assertEqual(self.fake.round_trips, 0)
+        self.assertFalse(CalendarOutbox.objects.exists())
+
+        event.performance_time_end = datetime.time(23, 30)
+        event.save()
+        process_outbox()
+        self.assertEqual(self.fake.calls, {"events.update": 1})
+
+    def test_renames_repush_only_the_events_they_change(self):
+        make_events(4)
+        Venue.objects.update(google_calendar_id="cal")
+        process_outbox()
+        self.fake.reset_counters()
+
+        venue = Venue.objects.get()
+        venue.save()
+        self.assertFalse(CalendarOutbox.objects.exists())
+
+        performer = Performer.objects.get(name="DJ 1")
+        performer.name = "DJ One"
+        performer.save()
+        event = Event.objects.get(performer=performer)
+        self.assertEqual(
+            list(CalendarOutbox.objects.values_list("event_id", flat=True)),
+            [event.pk],
+        )
+        process_outbox()
+        self.assertEqual(self.fake.calls, {"events.update": 1})
+        self.assertEqual(
+            self.fake.calendars["cal"][event.google_event_id]["summary"],
+            "DJ One @ PRIVE",
+        )
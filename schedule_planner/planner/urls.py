@@ -7,6 +7,35 @@ app_name = "planner"
 urlpatterns = [
     # READ
     path("", views.index, name="index"),
+    # JSON schedule for mobile/signage clients
+    path("api/events/", views.events_api, name="events_api"),
+    # Availability search
+    path("availability/", views.availability_view, name="availability"),
+    path(
+        "api/availability/performers/",
+        views.performer_availability_api,
+        name="performer_availability_api",
+    ),
+    path(
+        "api/availability/slots/",
+        views.venue_slots_api,
+        name="venue_slots_api",
+    ),
+    # CSV/XLSX download
+    path("export/", views.export_schedule, name="export_schedule"),
+    # iCalendar subscriptions
+    path(
+        "feeds/venue/<int:pk>.ics",
+        views.calendar_feed,
+        {"kind": "venue"},
+        name="venue_feed",
+    ),
+    path(
+        "feeds/performer/<int:pk>.ics",
+        views.calendar_feed,
+        {"kind": "performer"},
+        name="performer_feed",
+    ),
     # CREATE
     path("add/", views.add_event, name="add_event"),
     # EDIT
@@ -20,6 +49,16 @@ urlpatterns = [
     # Messages
     path("message/<int:pk>", views.display_message, name="display_message"),
     path('sync-calendar/', views.sync_calendar_view, name='sync_calendar'),
+    path(
+        "sync-calendar/jobs/<int:pk>/",
+        views.sync_job_status,
+        name="sync_job_status",
+    ),
+    path(
+        "calendar/notifications/",
+        views.calendar_notification,
+        name="calendar_notification",
+    ),
     # Manage Event Engineers
     # path('event/<int:event_pk>/edit-engineer/',
     #      views.manage_event_engineer, name='manage_event_engineer')
@@ -0,0 +1,540 @@
+"""Local stand-in for the Google Calendar v3 events API.
+
+``FakeCalendar`` keeps calendars in memory and answers the HTTP requests
+googleapiclient sends: events insert/get/update/patch/delete/list/watch,
+channels stop and multipart batch requests. Listings page with
+``pageToken`` and hand out sync tokens (changes since the token, deleted
+events included as "cancelled"); ``expire_sync_tokens`` makes old tokens
+fail with 410 like Google's do.
+
+It has the ``request(uri, method, body, headers)`` signature of
+``httplib2.Http``, so a discovery service built with ``http=FakeCalendar()``
+talks to it in-process. ``serve`` exposes the same object over HTTP for
+other processes, which reach it through ``RedirectHttp``. Set
+``GOOGLE_CALENDAR_FAKE`` to "memory" or to the server's URL to point the
+planner at it (see ``google_calendar.get_calendar_service``).
+
+``latency`` (seconds per HTTP round trip), ``error_rate`` and
+``fail_next`` inject slowness and failures; ``round_trips`` and ``calls``
+count what the client sent (``calls`` by API method, e.g.
+"events.list").
+"""
+
+import collections
+import datetime
+import email.parser
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from zoneinfo import ZoneInfo
+
+import httplib2
+
+GOOGLE_ROOT = "https://www.googleapis.com/"
+# Google rejects batches larger than this for Calendar.
+MAX_BATCH = 50
+MAX_PAGE_SIZE = 2500
+DEFAULT_PAGE_SIZE = 250
+CHANNEL_TTL = datetime.timedelta(days=7)
+
+REASONS = {
+    400: "badRequest",
+    403: "rateLimitExceeded",
+    404: "notFound",
+    409: "duplicate",
+    410: "deleted",
+    429: "rateLimitExceeded",
+    500: "backendError",
+    503: "backendError",
+}
+# Statuses picked from by ``error_rate``.
+TRANSIENT_STATUSES = (429, 503)
+
+ROUTES = [
+    ("events", re.compile(r"^/calendar/v3/calendars/([^/]+)/events$")),
+    ("watch", re.compile(r"^/calendar/v3/calendars/([^/]+)/events/watch$")),
+    ("event", re.compile(r"^/calendar/v3/calendars/([^/]+)/events/([^/]+)$")),
+    ("stop", re.compile(r"^/calendar/v3/channels/stop$")),
+]
+API_METHODS = {
+    ("events", "GET"): "events.list",
+    ("events", "POST"): "events.insert",
+    ("watch", "POST"): "events.watch",
+    ("event", "GET"): "events.get",
+    ("event", "PUT"): "events.update",
+    ("event", "PATCH"): "events.patch",
+    ("event", "DELETE"): "events.delete",
+    ("stop", "POST"): "channels.stop",
+}
+BATCH_PATH = "/batch/calendar/v3"
+
+
+class FakeCalendarError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.status = status
+        self.message = message or REASONS.get(status, "error")
+
+
+class FakeCalendar:
+    """In-memory Calendar v3 events API."""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        """
+        Args:
+            latency (float): Seconds each HTTP round trip takes
+            error_rate (float): Share of API calls failing with 429 or 503
+            seed (int): Seed for the injected errors
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calendars = collections.defaultdict(dict)
+        self.channels = {}
+        self.round_trips = 0
+        self.calls = collections.Counter()
+        self._random = random.Random(seed)
+        self._failures = collections.deque()
+        self._lock = threading.RLock()
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._oldest_sync = 0
+
+    # State helpers (no HTTP, no latency, not counted).
+
+    def add_event(self, calendar_id, body):
+        """Stores ``body`` as a new event and returns it."""
+        with self._lock:
+            return self._insert(calendar_id, dict(body))
+
+    def events(self, calendar_id, deleted=False):
+        """The events of a calendar, by start."""
+        with self._lock:
+            found = [
+                dict(event)
+                for event in self.calendars[calendar_id].values()
+                if deleted or event["status"] != "cancelled"
+            ]
+        return sorted(found, key=_sort_key)
+
+    def update_event(self, calendar_id, event_id, **fields):
+        """Changes an event as if someone edited it on Google's side."""
+        with self._lock:
+            event = self._get(calendar_id, event_id)
+            return self._store(calendar_id, {**event, **fields})
+
+    def delete_event(self, calendar_id, event_id):
+        with self._lock:
+            self._delete(calendar_id, event_id)
+
+    def fail_next(self, *statuses):
+        """The next API calls fail with ``statuses``, in order."""
+        with self._lock:
+            self._failures.extend(statuses)
+
+    def expire_sync_tokens(self):
+        """Every sync token handed out so far gets 410 Gone."""
+        with self._lock:
+            self._oldest_sync = self._last_seq + 1
+
+    def reset_counters(self):
+        with self._lock:
+            self.round_trips = 0
+            self.calls.clear()
+
+    # httplib2.Http interface.
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        """Answers one HTTP request.
+        Returns:
+            tuple: ``(httplib2.Response, bytes)``
+        """
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        parts = urlsplit(uri)
+        if parts.path == BATCH_PATH:
+            status, content, content_type = self._batch(body, headers or {})
+        else:
+            status, payload = self._call(method, parts.path, parts.query, body)
+            content = b"" if payload is None else json.dumps(payload).encode()
+            content_type = "application/json; charset=UTF-8"
+        response = httplib2.Response(
+            {"status": status, "content-type": content_type}
+        )
+        response.reason = _reason_phrase(status)
+        return response, content
+
+    def close(self):
+        pass
+
+    # API calls.
+
+    def _call(self, method, path, query, body):
+        """One API call.
+        Returns:
+            tuple: ``(status, payload)``; payload is None for no content
+        """
+        try:
+            return self._dispatch(method, path, query, body)
+        except FakeCalendarError as e:
+            return e.status, _error_body(e.status, e.message)
+
+    def _dispatch(self, method, path, query, body):
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        data = json.loads(body) if body else {}
+        for name, pattern in ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            raise FakeCalendarError(404, f"No route for {path}")
+        args = [unquote(group) for group in match.groups()]
+
+        call = API_METHODS.get((name, method))
+        if call is None:
+            raise FakeCalendarError(405, f"{method} not allowed on {path}")
+
+        with self._lock:
+            self.calls[call] += 1
+            self._maybe_fail()
+            if call == "events.list":
+                return 200, self._list(args[0], params)
+            if call == "events.insert":
+                return 200, self._insert(args[0], data)
+            if call == "events.watch":
+                return 200, self._watch(args[0], data)
+            if call == "channels.stop":
+                self.channels.pop(data.get("id"), None)
+                return 204, None
+            calendar_id, event_id = args
+            if call == "events.get":
+                return 200, _public(self._get(calendar_id, event_id))
+            if call == "events.update":
+                self._get(calendar_id, event_id)
+                return 200, self._store(calendar_id, {**data, "id": event_id})
+            if call == "events.patch":
+                event = self._get(calendar_id, event_id)
+                return 200, self._store(calendar_id, {**event, **data})
+            self._delete(calendar_id, event_id)
+            return 204, None
+
+    def _maybe_fail(self):
+        if self._failures:
+            status = self._failures.popleft()
+        elif self.error_rate and self._random.random() < self.error_rate:
+            status = self._random.choice(TRANSIENT_STATUSES)
+        else:
+            return
+        raise FakeCalendarError(status, "Injected failure")
+
+    def _get(self, calendar_id, event_id):
+        event = self.calendars[calendar_id].get(event_id)
+        if event is None or event["status"] == "cancelled":
+            raise FakeCalendarError(404, "Not Found")
+        return event
+
+    def _insert(self, calendar_id, data):
+        event_id = data.get("id") or uuid.uuid4().hex
+        if event_id in self.calendars[calendar_id]:
+            raise FakeCalendarError(409, "The requested identifier "
+                                         "already exists.")
+        return self._store(calendar_id, {**data, "id": event_id})
+
+    def _delete(self, calendar_id, event_id):
+        event = self.calendars[calendar_id].get(event_id)
+        if event is None:
+            raise FakeCalendarError(404, "Not Found")
+        if event["status"] == "cancelled":
+            raise FakeCalendarError(410, "Resource has been deleted")
+        self._store(calendar_id, {
+            "id": event_id, "status": "cancelled",
+            "start": event.get("start"), "end": event.get("end"),
+        })
+
+    def _store(self, calendar_id, data):
+        seq = next(self._seq)
+        self._last_seq = seq
+        event = {
+            key: value for key, value in data.items()
+            if not key.startswith("_")
+        }
+        event.setdefault("status", "confirmed")
+        for key in ("start", "end"):
+            if event.get(key):
+                event[key] = _normalize_time(event[key])
+        event.update(
+            kind="calendar#event",
+            etag=f'"{seq}"',
+            updated=_now().isoformat().replace("+00:00", "Z"),
+            _seq=seq,
+        )
+        self.calendars[calendar_id][event["id"]] = event
+        return _public(event)
+
+    def _list(self, calendar_id, params):
+        sync_token = params.get("syncToken")
+        if sync_token and (params.get("timeMin") or params.get("timeMax")):
+            raise FakeCalendarError(400, "Sync token and time range")
+        try:
+            size = min(int(params.get("maxResults", DEFAULT_PAGE_SIZE)),
+                       MAX_PAGE_SIZE)
+        except ValueError:
+            raise FakeCalendarError(400, "Invalid maxResults")
+
+        # Page tokens carry the offset and the sequence the listing
+        # started at; the sync token handed out on the last page is that
+        # sequence, so changes made while paging show up next time.
+        if params.get("pageToken"):
+            try:
+                offset, snapshot = map(int, params["pageToken"].split(":"))
+            except ValueError:
+                raise FakeCalendarError(400, "Invalid pageToken")
+        else:
+            offset, snapshot = 0, self._last_seq
+
+        events = self.calendars[calendar_id].values()
+        if sync_token:
+            try:
+                since = int(sync_token)
+            except ValueError:
+                raise FakeCalendarError(400, "Invalid syncToken")
+            if since < self._oldest_sync:
+                raise FakeCalendarError(410, "fullSyncRequired")
+            found = sorted(
+                (event for event in events if event["_seq"] > since),
+                key=lambda event: event["_seq"],
+            )
+        else:
+            show_deleted = params.get("showDeleted") == "true"
+            time_min = _parse_time(params.get("timeMin"))
+            time_max = _parse_time(params.get("timeMax"))
+            found = sorted(
+                (
+                    event for event in events
+                    if (show_deleted or event["status"] != "cancelled")
+                    and (time_min is None
+                         or _event_time(event, "end") > time_min)
+                    and (time_max is None
+                         or _event_time(event, "start") < time_max)
+                ),
+                key=_sort_key,
+            )
+
+        page = found[offset:offset + size]
+        result = {
+            "kind": "calendar#events",
+            "summary": calendar_id,
+            "items": [_public(event) for event in page],
+        }
+        if offset + size < len(found):
+            result["nextPageToken"] = f"{offset + size}:{snapshot}"
+        else:
+            result["nextSyncToken"] = str(snapshot)
+        return result
+
+    def _watch(self, calendar_id, data):
+        expiration = _now() + CHANNEL_TTL
+        channel = {
+            "kind": "api#channel",
+            "id": data.get("id"),
+            "resourceId": f"resource-{calendar_id}",
+            "resourceUri": f"{GOOGLE_ROOT}calendar/v3/calendars/"
+                           f"{calendar_id}/events",
+            "token": data.get("token"),
+            "expiration": str(int(expiration.timestamp() * 1000)),
+            "calendar_id": calendar_id,
+            "address": data.get("address"),
+        }
+        self.channels[channel["id"]] = channel
+        return {k: v for k, v in channel.items()
+                if k not in ("calendar_id", "address")}
+
+    # Batch requests.
+
+    def _batch(self, body, headers):
+        content_type = _header(headers, "content-type")
+        message = email.parser.Parser().parsestr(
+            f"Content-Type: {content_type}\r\n\r\n{body or ''}"
+        )
+        if not message.is_multipart():
+            return 400, b"Batch requests must be multipart/mixed", "text/plain"
+        parts = message.get_payload()
+        if len(parts) > MAX_BATCH:
+            return (400, json.dumps(_error_body(
+                400, f"More than {MAX_BATCH} calls in one batch"
+            )).encode(), "application/json; charset=UTF-8")
+
+        boundary = f"batch_{uuid.uuid4().hex}"
+        out = []
+        for part in parts:
+            content_id = part["Content-ID"] or ""
+            method, path, query, part_body = _parse_http(part.get_payload())
+            status, payload = self._call(method, path, query, part_body)
+            content = "" if payload is None else json.dumps(payload)
+            out.append(
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id.strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} {_reason_phrase(status)}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(content)}\r\n\r\n"
+                f"{content}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return (200, "".join(out).encode(),
+                f"multipart/mixed; boundary={boundary}")
+
+
+class RedirectHttp(httplib2.Http):
+    """``httplib2.Http`` sending Google API requests to a fake server."""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip("/") + "/"
+
+    def request(self, uri, *args, **kwargs):
+        if uri.startswith(GOOGLE_ROOT):
+            uri = self.base_url + uri[len(GOOGLE_ROOT):]
+        return super().request(uri, *args, **kwargs)
+
+
+def serve(calendar, host="127.0.0.1", port=8765):
+    """An HTTP server answering with ``calendar``; call
+    ``serve_forever()`` on it (or run it in a thread)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _handle(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else None
+            response, content = calendar.request(
+                GOOGLE_ROOT.rstrip("/") + self.path, self.command, body,
+                dict(self.headers),
+            )
+            self.send_response(response.status)
+            self.send_header("Content-Type", response["content-type"])
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_calendar():
+    """The process-wide fake used when ``GOOGLE_CALENDAR_FAKE`` is
+    "memory"."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = FakeCalendar()
+        return _shared
+
+
+def install(calendar=None):
+    """Makes ``calendar`` (a fresh one by default) the shared fake.
+    Returns:
+        FakeCalendar: The installed fake
+    """
+    global _shared
+    with _shared_lock:
+        _shared = calendar or FakeCalendar()
+        return _shared
+
+
+def _parse_http(text):
+    """Method, path, query and body of a request inside a batch part."""
+    head, _, body = text.replace("\r\n", "\n").partition("\n\n")
+    method, target = head.split("\n", 1)[0].split(" ")[:2]
+    parts = urlsplit(target)
+    return method, parts.path, parts.query, body.strip() or None
+
+
+def _header(headers, name):
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return ""
+
+
+def _public(event):
+    return {k: v for k, v in event.items() if not k.startswith("_")}
+
+
+def _error_body(status, message):
+    return {"error": {
+        "code": status,
+        "message": message,
+        "errors": [{
+            "domain": "global",
+            "reason": REASONS.get(status, "error"),
+            "message": message,
+        }],
+    }}
+
+
+def _reason_phrase(status):
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return "Unknown"
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise FakeCalendarError(400, f"Invalid time {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def _normalize_time(value):
+    """Gives naive ``dateTime`` values the offset of their ``timeZone``,
+    as Google does in its responses."""
+    value = dict(value)
+    if value.get("dateTime"):
+        parsed = datetime.datetime.fromisoformat(value["dateTime"])
+        if parsed.tzinfo is None:
+            zone = ZoneInfo(value.get("timeZone") or "UTC")
+            value["dateTime"] = parsed.replace(tzinfo=zone).isoformat()
+    return value
+
+
+def _event_time(event, key):
+    value = event.get(key) or {}
+    if value.get("dateTime"):
+        return _parse_time(value["dateTime"])
+    if value.get("date"):
+        return _parse_time(value["date"] + "T00:00:00")
+    return datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+
+def _sort_key(event):
+    return _event_time(event, "start"), event["id"]
@@ -1,12 +1,20 @@
 import os
+import collections
+import hashlib
+import json
 import logging
-import datetime
-from planner.models import Event, Venue
-from django.utils.dateparse import parse_datetime
+import random
+import threading
+import time
+import httplib2
 from google.oauth2 import service_account
+from google_auth_httplib2 import Request
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from django.conf import settings
 
+from . import fake_calendar
+
 logger = logging.getLogger(__name__)
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
@@ -19,136 +27,542 @@ SERVICE_ACCOUNT_FILE = settings.GOOGLE_SERVICE_ACCOUNT_FILE
 # CALENDAR_ID = 'primary'
 
 
-def list_upcoming_events(calendar_id="primary", max_results=50):
+# Events per list() call; Google allows up to 2500.
+PAGE_SIZE = 250
+
+
+class EventStream:
     """
-    Fetches upcoming events from Google Calendar.
+    Lazily pages through a calendar's events, following ``nextPageToken``.
+
+    Only one page is held at a time, so calendars with thousands of events
+    are read in bounded memory. With a ``sync_token`` only the events
+    changed since it was issued are listed (deleted ones included, with
+    ``status`` "cancelled"); an expired token (410 Gone) restarts as a full
+    listing. Once exhausted, ``next_sync_token`` holds the token for the
+    next incremental pull; windowed listings do not produce one.
     """
-    service = get_calendar_service()
-    if not service:
-        return []
 
-    try:
-        # 'Z" indicates UTC Time
-        now = datetime.datetime.utcnow().isoformat() + 'Z'
+    def __init__(self, calendar_id, sync_token=None, page_size=PAGE_SIZE,
+                 time_min=None, time_max=None):
+        """
+        Args:
+            calendar_id (str): Google calendar to read
+            sync_token (str): Token of the previous pull, if any
+            page_size (int): Events per API call
+            time_min (str): RFC 3339 lower bound on event ends
+            time_max (str): RFC 3339 upper bound on event starts
+        """
+        if sync_token and (time_min or time_max):
+            raise ValueError("Google rejects a time window with a sync token")
+        self.calendar_id = calendar_id
+        self.sync_token = sync_token
+        self.page_size = page_size
+        self.time_min = time_min
+        self.time_max = time_max
+        self.next_sync_token = None
+        self.api_calls = 0
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
+
+    def pages(self):
+        """Yields the events one page (list) at a time."""
+        service = get_calendar_service()
+        if not service:
+            self.next_sync_token = self.sync_token
+            return
+
+        page_token = None
+        while True:
+            params = {
+                'calendarId': self.calendar_id,
+                'singleEvents': True,
+                'maxResults': self.page_size,
+            }
+            if self.sync_token:
+                params['syncToken'] = self.sync_token
+            if self.time_min:
+                params['timeMin'] = self.time_min
+            if self.time_max:
+                params['timeMax'] = self.time_max
+            if page_token:
+                params['pageToken'] = page_token
+            self.api_calls += 1
+            try:
+                result = execute(service.events().list(**params))
+            except HttpError as e:
+                if e.resp.status != 410 or page_token or not self.sync_token:
+                    raise
+                logger.info(
+                    f"Sync token expired for {self.calendar_id}, full sync")
+                self.sync_token = None
+                continue
+            yield result.get('items', [])
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                self.next_sync_token = result.get('nextSyncToken')
+                return
+
+
+def get_calendar_service():
+    """
+    Returns the Google Calendar service for the current thread.
+
+    Credentials are loaded once per process and shared (google-auth
+    refreshes the access token on them when it expires). The discovery
+    built service wraps an ``httplib2.Http`` that is not thread-safe, so
+    each thread keeps its own, rebuilt only when the credentials change.
+    With ``GOOGLE_CALENDAR_FAKE`` set, the service talks to the local fake
+    instead (see ``fake_calendar``).
+    """
+    if getattr(settings, 'GOOGLE_CALENDAR_FAKE', None):
+        return _fake_calendar_service(settings.GOOGLE_CALENDAR_FAKE)
 
-        events_result = service.events().list(
-            calendarId=calendar_id,
-            timeMin=now,
-            maxResults=max_results,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+    credentials = _load_credentials()
+    if credentials is None:
+        return None
 
-        events = events_result.get('items', [])
-        return events
+    generation = _client_state["generation"]
+    service = getattr(_local, "service", None)
+    if service is None or _local.generation != generation:
+        try:
+            service = build(
+                "calendar", "v3", credentials=credentials,
+                cache_discovery=False,
+            )
+        except Exception as e:
+            logger.error(f"Failed to create Google Calendar service: {e}")
+            return None
+        _local.service, _local.generation = service, generation
+    return service
+
+
+def _fake_calendar_service(target):
+    """
+    A service bound to the in-process fake ("memory") or to a fake server
+    at the ``target`` URL, cached per thread like the real one.
+    """
+    if target == 'memory':
+        http = fake_calendar.shared_calendar()
+    else:
+        http = None
+    key = (target, http, _client_state["generation"])
+    if getattr(_local, 'fake_key', None) != key:
+        _local.fake_service = build(
+            "calendar", "v3",
+            http=http or fake_calendar.RedirectHttp(target),
+            cache_discovery=False, static_discovery=True,
+        )
+        _local.fake_key = key
+    return _local.fake_service
 
-    except Exception as e:
-        logger.error(f"Error fetching Google Calendar Events: {e}")
-        return []
 
+# Seconds between checks of the service account file for a rotated key.
+CREDENTIALS_CHECK_INTERVAL = 60
 
-def get_calendar_service():
+_UNSET = object()
+_client_lock = threading.Lock()
+_client_state = {
+    "credentials": None,
+    "mtime": _UNSET,
+    "checked": None,
+    "generation": 0,
+}
+_local = threading.local()
+
+
+def _load_credentials():
     """
-    Authenticates and returns the Google Calendar service.
+    Returns the shared service account credentials, or None.
+
+    The key file is looked at no more than once per
+    ``CREDENTIALS_CHECK_INTERVAL``; a new modification time (a rotated key)
+    reloads the credentials and makes every thread rebuild its service.
     """
-    if not os.path.exists(SERVICE_ACCOUNT_FILE):
-        logger.warning(
-            f"Service account file not found at {SERVICE_ACCOUNT_FILE}."
-            f" Google Calendar sync will be skipped.")
-        return None
+    state = _client_state
+    checked = state["checked"]
+    if checked is not None and (
+        time.monotonic() - checked < CREDENTIALS_CHECK_INTERVAL
+    ):
+        return state["credentials"]
+
+    with _client_lock:
+        try:
+            mtime = os.path.getmtime(SERVICE_ACCOUNT_FILE)
+        except OSError:
+            mtime = None
+        if mtime != state["mtime"]:
+            state["mtime"] = mtime
+            state["credentials"] = None
+            state["generation"] += 1
+            if mtime is None:
+                logger.warning(
+                    f"Service account file not found at "
+                    f"{SERVICE_ACCOUNT_FILE}. Google Calendar sync will be "
+                    f"skipped.")
+            else:
+                try:
+                    state["credentials"] = (
+                        service_account.Credentials
+                        .from_service_account_file(
+                            SERVICE_ACCOUNT_FILE, scopes=SCOPES
+                        )
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"Failed to load Google service account: {e}")
+        state["checked"] = time.monotonic()
+        return state["credentials"]
 
-    try:
-        creds = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES
+
+def reset_calendar_service():
+    """
+    Drops the cached credentials and services, e.g. after rotating the
+    service account key. The next call reloads them from disk.
+    """
+    with _client_lock:
+        _client_state.update(
+            credentials=None, mtime=_UNSET, checked=None,
+            generation=_client_state["generation"] + 1,
         )
-        service = build('calendar', 'v3', credentials=creds)
-        return service
-    except Exception as e:
-        logger.error(f"Failed to create Google Calendar service: {e}")
-        return None
 
 
-def create_google_event(event_instance):
+def calendar_service_health(refresh=False):
     """
-    Creates an event in Google Calendar from a Django Event instance.
-    Returns the Google Event ID.
+    Reports the state of the cached Google Calendar client.
+    Args:
+        refresh (bool): Also fetch a fresh access token, which proves the
+            key is still accepted by Google
+    Returns:
+        dict: ``configured``, ``service_account``, ``token_valid``,
+        ``token_expiry`` and, when refreshing failed, ``error``
     """
-    service = get_calendar_service()
-    if not service:
-        return None
+    credentials = _load_credentials()
+    health = {
+        "configured": credentials is not None,
+        "service_account": getattr(
+            credentials, "service_account_email", None),
+        "token_valid": False,
+        "token_expiry": None,
+    }
+    if credentials is None:
+        return health
+    if refresh:
+        try:
+            with _client_lock:
+                credentials.refresh(Request(httplib2.Http()))
+        except Exception as e:
+            health["error"] = str(e)
+    health["token_valid"] = credentials.valid
+    if credentials.expiry:
+        health["token_expiry"] = credentials.expiry.isoformat()
+    return health
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: ``rate`` tokens a second, bursts of up to
+    ``capacity``. A call costing more than ``capacity`` (a full batch
+    request) waits for a full bucket and leaves it in debt.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost=1):
+        """
+        Blocks until ``cost`` tokens are available and takes them.
+        Returns:
+            float: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self._updated) * self.rate,
+                )
+                self._updated = now
+                needed = min(cost, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= cost
+                    return waited
+                wait = (needed - self.tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+
+# Retries of rate-limited, server and network errors, with jittered
+# exponential backoff (seconds).
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+_limiter = None
+_stats = collections.Counter()
+_stats_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    The process-wide limiter shared by every thread calling Google.
+    """
+    global _limiter
+    if _limiter is None:
+        with _client_lock:
+            if _limiter is None:
+                _limiter = TokenBucket(
+                    settings.GOOGLE_CALENDAR_QPS,
+                    settings.GOOGLE_CALENDAR_BURST,
+                )
+    return _limiter
 
-    event_body = _build_event_body(event_instance)
 
-    try:
-        # Determine which calendar ID to use
-        # 1. Try the venue's specific calendar ID
-        # 2. Fallback to 'primary' (the service account's own calendar) or
-        # a global default
-        calendar_id = 'primary'
-        if event_instance.venue and event_instance.venue.google_calendar_id:
-            calendar_id = event_instance.venue.google_calendar_id
-
-        event = service.events().insert(calendarId=calendar_id,
-                                        body=event_body).execute()
-        logger.info(f"Created Google Calendar event: {event.get('id')} on calendar {calendar_id}")
-        return event.get('id')
-    except Exception as e:
-        logger.error(f"Error creating Google Calendar event: {e}")
-        return None
+def _record(outcome, count=1):
+    with _stats_lock:
+        _stats[outcome] += count
 
 
-def update_google_event(event_instance):
+def call_stats():
     """
-    Updates an existing event in Google Calendar.
+    Google API calls made by this process, by outcome: ``succeeded``,
+    ``failed`` (not retryable, or out of retries), ``retried`` and, for
+    the retries, ``rate_limited``, ``server_error`` or ``network_error``.
     """
-    if not event_instance.google_event_id:
-        return create_google_event(event_instance)
+    with _stats_lock:
+        return dict(_stats)
 
-    service = get_calendar_service()
-    if not service:
-        return None
 
-    event_body = _build_event_body(event_instance)
+def reset_call_stats():
+    with _stats_lock:
+        _stats.clear()
 
+
+def _error_reasons(error):
     try:
-        # Determine which calendar ID to use
-        calendar_id = 'primary'
-        if event_instance.venue and event_instance.venue.google_calendar_id:
-            calendar_id = event_instance.venue.google_calendar_id
-
-        updated_event = service.events().update(
-            calendarId=calendar_id,
-            eventId=event_instance.google_event_id,
-            body=event_body
-        ).execute()
-        logger.info(f"Updated Google Calendar event: {updated_event.get('id')} on calendar {calendar_id}")
-        return updated_event.get('id')
-    except Exception as e:
-        logger.error(f"Error updating Google Calendar event: {e}")
+        details = json.loads(error.content)['error']
+        return {item.get('reason') for item in details.get('errors', [])}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return set()
+
+
+def _retry_kind(error):
+    """
+    What kind of transient failure ``error`` is, or None when retrying
+    would not help.
+    """
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 429 or (
+            status == 403 and _error_reasons(error) & RATE_LIMIT_REASONS
+        ):
+            return 'rate_limited'
+        if status >= 500:
+            return 'server_error'
         return None
+    if isinstance(error, (OSError, httplib2.HttpLib2Error)):
+        return 'network_error'
+    return None
+
 
+def _backoff(attempt, error=None):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    delay = random.uniform(delay / 2, delay)
+    retry_after = getattr(getattr(error, 'resp', None), 'get', None)
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after('retry-after', 0)))
+        except ValueError:
+            pass
+    return delay
 
-def delete_google_event(google_event_id, venue=None):
+
+def execute(request, cost=1, count=True):
+    """
+    Runs a googleapiclient request under the shared rate limiter,
+    retrying transient failures.
+    Args:
+        request: ``HttpRequest`` or ``BatchHttpRequest``
+        cost (int): Quota units the request uses (calls in a batch)
+        count (bool): Record the outcome in ``call_stats``; batches count
+            their calls themselves
+    Returns:
+        The response body
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        get_rate_limiter().acquire(cost)
+        try:
+            result = request.execute()
+        except Exception as e:
+            kind = _retry_kind(e)
+            if kind and attempt < MAX_RETRIES:
+                if count:
+                    _record('retried')
+                    _record(kind)
+                time.sleep(_backoff(attempt, e))
+                continue
+            if count:
+                _record('failed')
+            raise
+        if count:
+            _record('succeeded')
+        return result
+
+
+class CalendarUnavailable(Exception):
+    """Google Calendar is not configured (no service account)."""
+
+
+def calendar_id_for(venue):
+    """
+    The venue's own calendar, falling back to the service account's.
+    """
+    if venue and venue.google_calendar_id:
+        return venue.google_calendar_id
+    return 'primary'
+
+
+def _is_gone(error):
+    return isinstance(error, HttpError) and error.resp.status in (404, 410)
+
+
+# Google Calendar accepts at most 50 calls in one batch request.
+BATCH_SIZE = 50
+
+
+def _execute_batches(service, requests):
+    """
+    Sends ``(key, HttpRequest)`` pairs as batch requests of ``BATCH_SIZE``.
+    Calls that fail transiently inside a batch are sent again, in a
+    smaller batch, after a backoff.
+    Returns:
+        dict: key -> response body, or the HttpError of that call
     """
-    Deletes an event from Google Calendar.
+    results = {}
+    for offset in range(0, len(requests), BATCH_SIZE):
+        pending = requests[offset:offset + BATCH_SIZE]
+        for attempt in range(MAX_RETRIES + 1):
+            answers = {}
+
+            def callback(request_id, response, exception, answers=answers):
+                answers[int(request_id)] = exception or response
+
+            batch = service.new_batch_http_request(callback=callback)
+            for i, (_, request) in enumerate(pending):
+                batch.add(request, request_id=str(i))
+            execute(batch, cost=len(pending), count=False)
+
+            retry, last_error = [], None
+            for i, (key, request) in enumerate(pending):
+                answer = answers[i]
+                kind = (_retry_kind(answer)
+                        if isinstance(answer, Exception) else None)
+                if kind and attempt < MAX_RETRIES:
+                    retry.append((key, request))
+                    last_error = answer
+                    _record('retried')
+                    _record(kind)
+                    continue
+                results[key] = answer
+                _record('failed' if isinstance(answer, Exception)
+                        else 'succeeded')
+            if not retry:
+                break
+            time.sleep(_backoff(attempt, last_error))
+            pending = retry
+    return results
+
+
+def push_events(events):
     """
-    if not google_event_id:
-        return
+    Creates or updates ``events`` in Google Calendar with batch requests.
 
+    Events need their venue, performer and activation loaded. Errors are
+    returned per event (and a failed batch raises) so the outbox worker
+    can retry; events deleted on Google's side are created again.
+    Returns:
+        dict: event pk -> Google event ID, or the error for that event
+    """
     service = get_calendar_service()
     if not service:
-        return
+        raise CalendarUnavailable
+    # events() builds the whole resource (every method, with docs) on each
+    # call, which costs more than sending the request; build it once.
+    resource = service.events()
+
+    def insert(event):
+        return resource.insert(
+            calendarId=calendar_id_for(event.venue),
+            body=_build_event_body(event),
+        )
+
+    requests = []
+    for event in events:
+        if event.google_event_id:
+            request = resource.update(
+                calendarId=calendar_id_for(event.venue),
+                eventId=event.google_event_id,
+                body=_build_event_body(event),
+            )
+        else:
+            request = insert(event)
+        requests.append((event.pk, request))
+    results = _execute_batches(service, requests)
+
+    gone = [event for event in events if _is_gone(results[event.pk])]
+    if gone:
+        results.update(
+            _execute_batches(service, [(e.pk, insert(e)) for e in gone])
+        )
+    return {
+        pk: result if isinstance(result, Exception) else result.get('id')
+        for pk, result in results.items()
+    }
 
-    try:
-        # Determine which calendar ID to use
-        calendar_id = 'primary'
-        if venue and venue.google_calendar_id:
-            calendar_id = venue.google_calendar_id
 
-        service.events().delete(calendarId=calendar_id, eventId=google_event_id).execute()
-        logger.info(f"Deleted Google Calendar event: {google_event_id} from calendar {calendar_id}")
-    except Exception as e:
-        logger.error(f"Error deleting Google Calendar event: {e}")
+def remove_events(items):
+    """
+    Deletes events from Google Calendar with batch requests. Events that
+    are already gone count as deleted.
+    Args:
+        items (list): ``(key, google_event_id, calendar_id)`` tuples
+    Returns:
+        dict: key -> None, or the error for that event
+    """
+    service = get_calendar_service()
+    if not service:
+        raise CalendarUnavailable
+    resource = service.events()
+    results = _execute_batches(service, [
+        (key, resource.delete(
+            calendarId=calendar_id, eventId=google_event_id))
+        for key, google_event_id, calendar_id in items
+    ])
+    return {
+        key: result if isinstance(result, Exception)
+        and not _is_gone(result) else None
+        for key, result in results.items()
+    }
+
+
+def event_body_hash(event):
+    """
+    Fingerprint of the body pushed to Google for ``event`` (which needs
+    its venue, performer and activation loaded).
+    """
+    body = json.dumps(_build_event_body(event), sort_keys=True)
+    return hashlib.sha256(body.encode()).hexdigest()
 
 
 def _build_event_body(event):
@@ -179,47 +593,3 @@ def _build_event_body(event):
             'timeZone': settings.TIME_ZONE,
         },
     }
-
-
-def sync_events_from_google():
-    """
-    Syncs events from Google Calendar to Django.
-    Returns a list of status messages.
-    """
-    messages = []
-    venues = Venue.objects.exclude(google_calendar_id__isnull=True).exclude(google_calendar_id__exact='')
-    for venue in venues:
-        messages.append(f"Checking venues: {venue.name}")
-        google_events = list_upcoming_events(calendar_id=venue.google_calendar_id)
-
-        for g_event in google_events:
-            g_id = g_event.get('id')
-            summary = g_event.get('summary')
-            start_data = g_event.get('start', {})
-            end_data = g_event.get('end', {})
-
-            start_iso = start_data.get('dateTime', start_data.get('date'))
-            end_iso = end_data.get('dateTime', end_data.get('date'))
-
-            start_dt = parse_datetime(start_iso)
-            end_dt = parse_datetime(end_iso)
-
-            if not start_dt or not end_dt:
-                continue
-            try:
-                event = Event.objects.get(google_event_id=g_id)
-
-                if event.date != start_dt.date() or \
-                    event.performance_time_start != start_dt.time() or \
-                        event.performance_time_end != end_dt.time():
-
-                    Event.objects.filter(pk=event.pk).update(
-                        date=start_dt.date(),
-                        performance_time_start=start_dt.time(),
-                        performance_time_end=end_dt.time()
-                    )
-                    messages.append(f"Updated: {summary}")
-            except Event.DoesNotExist:
-                pass  # Skipping external event silently.
-
-    return messages
@@ -1,18 +1,45 @@
 import logging
-import calendar
-from datetime import date, timedelta
+import tempfile
+from datetime import date, datetime, time, timedelta
 
 from django.conf import settings
-from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from .utils.google_calendar import sync_events_from_google
 from django.contrib import messages
 from django.core.mail import EmailMessage, send_mail
-from django.http import HttpRequest
+from django.db import transaction
+from django.http import (
+    FileResponse,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
-
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from .availability import free_performers, venue_open_slots
+from .export import EXPORT_FORMATS, csv_lines, export_rows, write_xlsx
+from .feeds import (
+    FEED_MODELS,
+    cached_feed,
+    check_feed_token,
+    feed_etag,
+    stream_feed,
+)
 from .forms import ContactForm, EventForm
-from .models import ContactMessage, Event
+from .models import CalendarSyncJob, ContactMessage, Event, Venue
+from .permissions import cached_permission_required, has_perm
+from .schedule import ScheduleMonth, event_page, serialize_row
+from .sync import fail_stale_jobs, queue_sync_job
+from .watch import check_notification, request_venue_sync
 
 logger = logging.getLogger(__name__)
 # from django.contrib import messages
@@ -20,65 +47,319 @@ logger = logging.getLogger(__name__)
 # Create your views here.
 
 
+def _schedule_role(user) -> str:
+    """Which schedule a user sees: superusers get the Update/Delete columns,
+    managers the full page and everyone else the read-only client page.
+    """
+    if user.is_superuser:
+        return "admin"
+    if has_perm(user, "planner.can_manage_event_engineer"):
+        return "manager"
+    return "client"
+
+
+def _schedule_for(request: HttpRequest) -> ScheduleMonth | None:
+    """Month requested by ``index``, shared by the conditional GET helpers.
+
+    Returns None when flash messages are waiting so the page is always
+    rendered (a 304 would leave them undisplayed).
+    """
+    if not hasattr(request, "_schedule"):
+        request._schedule = None
+        if not len(messages.get_messages(request)):
+            request._schedule = ScheduleMonth.from_query(request.GET)
+    return request._schedule
+
+
+def _schedule_etag(request: HttpRequest) -> str | None:
+    schedule = _schedule_for(request)
+    if schedule is None:
+        return None
+    return schedule.etag(_schedule_role(request.user), timezone.localdate())
+
+
+def _schedule_last_modified(request: HttpRequest):
+    schedule = _schedule_for(request)
+    if schedule is None:
+        return None
+    return schedule.last_modified(timezone.localdate())
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_schedule_etag, last_modified_func=_schedule_last_modified)
 def index(request: HttpRequest) -> HttpRequest:
     """GET request that displays the main schedule for logged in users ordered
-    by date and time.
+    by date and time. Answers 304 Not Modified when the month's fingerprint
+    still matches the client's ETag/Last-Modified.
     Args:
         request (HttpRequest): GET request
 
     Returns:
         HttpRequest: html page with the schedules
     """
-    # Get year and month from query params, default to today
-    today = date.today()
-    try:
-        year = int(request.GET.get("year", today.year))
-        month = int(request.GET.get("month", today.month))
-    except ValueError:
-        year = today.year
-        month = today.month
-
-    # Calculate previous and next month for navigation
-    first_day = date(year, month, 1)
-
-    # Previous month
-    prev_month_date = first_day - timedelta(days=1)
-    prev_year = prev_month_date.year
-    prev_month = prev_month_date.month
-
-    # Next month
-    # Get last day of current month, add 1 day
-    _, last_day_num = calendar.monthrange(year, month)
-    next_month_date = date(year, month, last_day_num) + timedelta(days=1)
-    next_year = next_month_date.year
-    next_month = next_month_date.month
-
-    # Display full entertainment schedule for the selected month
-    events = Event.objects.filter(
-        date__year=year, date__month=month
-    ).order_by("date", "performance_time_start")
-
-    context = {
-        "events": events,
-        "current_year": year,
-        "current_month": month,
-        "current_month_name": calendar.month_name[month],
-        "prev_year": prev_year,
-        "prev_month": prev_month,
-        "next_year": next_year,
-        "next_month": next_month,
-    }
-    if request.user.is_superuser or request.user.has_perm(
-        "planner.can_manage_event_engineer"
-    ):
-        return render(request, "pages/planner.html", context)
-    else:
+    # Get year and month from query params, default to today. The month is
+    # loaded in one joined query and grouped by week before rendering.
+    schedule = _schedule_for(request) or ScheduleMonth.from_query(request.GET)
+    context = schedule.context()
+    # The week tables come from the fragment cache, keyed per role since
+    # superusers get the Update/Delete columns.
+    role = _schedule_role(request.user)
+    context["schedule_html"] = schedule.render_weeks(role)
+    if role == "client":
         return render(request, "pages/planner_client.html", context)
+    return render(request, "pages/planner.html", context)
 
     # return render(request, 'pages/planner.html', {'events': events})
 
 
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 500
+
+
+def _parse_ids(values) -> list[int]:
+    """Ids from repeated and/or comma separated query parameters."""
+    return [int(v) for value in values for v in value.split(",") if v]
+
+
+def _date_range(params) -> tuple[date, date]:
+    """Half-open range from the inclusive ``from``/``to`` ISO dates.
+    Raises:
+        KeyError: If a bound is missing
+        ValueError: If a bound is not an ISO date or the range is reversed
+    """
+    start = date.fromisoformat(params["from"])
+    try:
+        end = date.fromisoformat(params["to"]) + timedelta(days=1)
+    except OverflowError:
+        raise ValueError("'to' is out of range")
+    if end <= start:
+        raise ValueError("'to' must not be before 'from'")
+    return start, end
+
+
+@login_required
+@require_GET
+def events_api(request: HttpRequest) -> JsonResponse:
+    """GET request returning the schedule between ``from`` and ``to``
+    (inclusive ISO dates) as JSON, optionally filtered by ``venue`` and
+    ``performer`` ids. Pages are linked with the opaque ``next`` cursor.
+    Args:
+        request (HttpRequest): GET request
+
+    Returns:
+        JsonResponse: {"results": [...], "next": cursor or null}
+    """
+    try:
+        start, end = _date_range(request.GET)
+        limit = int(request.GET.get("limit", API_PAGE_SIZE))
+        venue_ids = _parse_ids(request.GET.getlist("venue"))
+        performer_ids = _parse_ids(request.GET.getlist("performer"))
+        rows, next_cursor = event_page(
+            start,
+            end,
+            venue_ids=venue_ids,
+            performer_ids=performer_ids,
+            cursor=request.GET.get("cursor"),
+            limit=max(1, min(limit, API_MAX_PAGE_SIZE)),
+        )
+    except KeyError as e:
+        return JsonResponse({"error": f"Missing parameter {e}"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(
+        {"results": [serialize_row(row) for row in rows], "next": next_cursor}
+    )
+
+
+def _aware(value: str) -> datetime:
+    """Parse an ISO datetime, reading naive values in the local time zone."""
+    parsed = parse_datetime(value or "")
+    if parsed is None:
+        raise ValueError(f"Invalid datetime: {value!r}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _performer_availability(params) -> dict:
+    """Free performers for ``venue`` between ``start`` and ``end``."""
+    venue = get_object_or_404(Venue, pk=int(params["venue"]))
+    start, end = _aware(params["start"]), _aware(params["end"])
+    if end <= start:
+        raise ValueError("'end' must be after 'start'")
+    return {"venue": venue, "start": start, "end": end,
+            **free_performers(venue, start, end)}
+
+
+def _venue_slots(params) -> dict:
+    """Open slots of ``venue`` from ``from`` to ``to`` (inclusive dates),
+    defaulting to the current week."""
+    venue = get_object_or_404(Venue, pk=int(params["venue"]))
+    if params.get("from"):
+        start, end = _date_range(params)
+    else:
+        start = timezone.localdate()
+        start -= timedelta(days=start.weekday())
+        end = start + timedelta(days=7)
+    if end - start > timedelta(days=93):
+        raise ValueError("Slot searches are limited to three months")
+    open_time = time.fromisoformat(params.get("open") or "08:00")
+    close_time = time.fromisoformat(params.get("close") or "02:00")
+    slots = venue_open_slots(
+        venue, start, end - timedelta(days=1), open_time, close_time
+    )
+    return {"venue": venue, "from": start, "to": end - timedelta(days=1),
+            "slots": slots}
+
+
+@login_required
+@require_GET
+def performer_availability_api(request: HttpRequest) -> JsonResponse:
+    """GET request answering which performers are free for a slot at a
+    venue (``venue`` id, ``start``/``end`` ISO datetimes).
+    Args:
+        request (HttpRequest): GET request
+    Returns:
+        JsonResponse: {"venue_free": bool, "performers": [...]}
+    """
+    try:
+        result = _performer_availability(request.GET)
+    except KeyError as e:
+        return JsonResponse({"error": f"Missing parameter {e}"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(
+        {"venue_free": result["venue_free"],
+         "performers": result["performers"]}
+    )
+
+
+@login_required
+@require_GET
+def venue_slots_api(request: HttpRequest) -> JsonResponse:
+    """GET request listing the open slots of a venue (``venue`` id, optional
+    ``from``/``to`` dates and ``open``/``close`` times).
+    Args:
+        request (HttpRequest): GET request
+    Returns:
+        JsonResponse: {"slots": [{"start": ..., "end": ...}]}
+    """
+    try:
+        result = _venue_slots(request.GET)
+    except KeyError as e:
+        return JsonResponse({"error": f"Missing parameter {e}"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(
+        {"slots": [{"start": start.isoformat(), "end": end.isoformat()}
+                   for start, end in result["slots"]]}
+    )
+
+
+@login_required
+@require_GET
+def availability_view(request: HttpRequest) -> HttpResponse:
+    """GET request for the availability page: free performers for a slot
+    and the open slots of the venue that week.
+    Args:
+        request (HttpRequest): GET request, optionally with search params
+    Returns:
+        HttpResponse: availability html page
+    """
+    context = {"venues": Venue.objects.all(), "params": request.GET}
+    if request.GET.get("venue"):
+        try:
+            context["slots"] = _venue_slots(request.GET)
+            if request.GET.get("start") and request.GET.get("end"):
+                context["performers"] = _performer_availability(request.GET)
+        except KeyError as e:
+            messages.error(request, f"Missing parameter {e}")
+        except ValueError as e:
+            messages.error(request, str(e))
+    return render(request, "pages/availability.html", context)
+
+
+@login_required
+@require_GET
+def export_schedule(request: HttpRequest) -> HttpResponse:
+    """GET request that downloads the schedule between ``from`` and ``to``
+    (inclusive ISO dates) for the optional ``venue`` ids as CSV or XLSX.
+    Args:
+        request (HttpRequest): GET request, ``format`` is csv (default) or
+        xlsx
+    Returns:
+        HttpResponse: Streamed attachment
+    """
+    export_format = request.GET.get("format", "csv")
+    try:
+        start, end = _date_range(request.GET)
+        venue_ids = _parse_ids(request.GET.getlist("venue"))
+    except KeyError as e:
+        return HttpResponseBadRequest(f"Missing parameter {e}")
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown format {export_format!r}")
+
+    rows = export_rows(start, end, venue_ids=venue_ids)
+    last_day = end - timedelta(days=1)
+    filename = f"schedule_{start:%Y%m%d}_{last_day:%Y%m%d}.{export_format}"
+    if export_format == "xlsx":
+        # The workbook is a zip file, so it has to be finished before it is
+        # sent; spool it to disk once it outgrows memory.
+        spool = tempfile.SpooledTemporaryFile(max_size=5 * 1024 * 1024)
+        try:
+            write_xlsx(rows, spool)
+        except RuntimeError as e:
+            spool.close()
+            return HttpResponseBadRequest(str(e))
+        spool.seek(0)
+        return FileResponse(spool, as_attachment=True, filename=filename)
+
+    response = StreamingHttpResponse(
+        csv_lines(rows), content_type="text/csv; charset=utf-8"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _feed_etag(request: HttpRequest, kind: str, pk: int) -> str | None:
+    if not check_feed_token(kind, pk, request.GET.get("token")):
+        return None
+    return feed_etag(kind, pk)
+
+
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_feed_etag)
+def calendar_feed(request: HttpRequest, kind: str, pk: int) -> HttpResponse:
+    """GET request from a calendar client subscribed to a venue or performer.
+    Calendar apps cannot log in, so the feed URL carries a signed token
+    instead. Unchanged feeds are answered with 304 from the cached version.
+    Args:
+        request (HttpRequest): GET request with a ``token`` parameter
+        kind (str): "venue" or "performer"
+        pk (int): Venue or Performer primary key
+    Returns:
+        HttpResponse: Streamed text/calendar body
+    """
+    if not check_feed_token(kind, pk, request.GET.get("token")):
+        return HttpResponseForbidden("Invalid feed token")
+    chunks = cached_feed(kind, pk)
+    if chunks is None:
+        obj = get_object_or_404(FEED_MODELS[kind], pk=pk)
+        chunks = stream_feed(kind, obj)
+    else:
+        chunks = [chunks]
+    response = StreamingHttpResponse(
+        chunks, content_type="text/calendar; charset=utf-8"
+    )
+    response["Content-Disposition"] = f'inline; filename="{kind}-{pk}.ics"'
+    return response
+
+
 def send_event_notification(event, action_type):
     """Sends email notification to all users about an event change."""
     subject = f"Schedule Update: {action_type} - {event.venue}"
@@ -127,7 +408,7 @@ for full details.</p>
 
 
 @login_required
-@permission_required("planner.add_event", raise_exception=True)
+@cached_permission_required("planner.add_event", raise_exception=True)
 def add_event(request: HttpRequest) -> HttpRequest:
     """GET/POST request from form that either displays a blank, new form for
     registation on a GET request, or saves the details to the db for a POST
@@ -147,8 +428,9 @@ def add_event(request: HttpRequest) -> HttpRequest:
         form = EventForm(request.POST)
         # Check form validity
         if form.is_valid():
-            # Save to DB
-            event = form.save()
+            # Save to DB, together with its queued calendar push
+            with transaction.atomic():
+                event = form.save()
 
             # Check if user requested notification
             if request.POST.get("action") == "notify":
@@ -164,7 +446,7 @@ def add_event(request: HttpRequest) -> HttpRequest:
 
 
 @login_required
-@permission_required("planner.edit_event", raise_exception=True)
+@cached_permission_required("planner.edit_event", raise_exception=True)
 def edit_event(request: HttpRequest, pk: int) -> HttpRequest:
     """GET/POST Request object that retrieves the instance of the form and
     allows for editing and re-saving based on the pk, thereby updating the
@@ -182,7 +464,8 @@ def edit_event(request: HttpRequest, pk: int) -> HttpRequest:
         # to the class EventForm
         form = EventForm(request.POST, instance=event)
         if form.is_valid():
-            event = form.save()
+            with transaction.atomic():
+                event = form.save()
 
             # Check if user requested notification
             if request.POST.get("action") == "notify":
@@ -195,7 +478,7 @@ def edit_event(request: HttpRequest, pk: int) -> HttpRequest:
 
 
 @login_required
-@permission_required("planner.delete_view", raise_exception=True)
+@cached_permission_required("planner.delete_view", raise_exception=True)
 def delete_view(request: HttpRequest, pk: int) -> HttpRequest:
     """GET/POST request object that fetches the instance of the record
     based on the pk an removes it from the database, for logged in users.
@@ -212,7 +495,8 @@ def delete_view(request: HttpRequest, pk: int) -> HttpRequest:
     # Conditional, if POST, delete
     if request.method == "POST":
         # Update table with delete.
-        event.delete()
+        with transaction.atomic():
+            event.delete()
         # Redirect to desired path.
         return redirect("planner:index")
         # No need for catching the inner Else as the dedault form actin
@@ -301,30 +585,85 @@ def conditions_view(request: HttpRequest) -> HttpRequest:
 
 # Sync Google Calendar events view
 @login_required
-def sync_calendar_view(request: HttpRequest) -> HttpRequest:
+def sync_calendar_view(request: HttpRequest) -> HttpResponse:
     """
-    View to trigger Google Calendar sync and display results manually.
-    Args: request (HttpRequest): GET Request
+    Staff page for pulling Google Calendar changes. A POST queues a sync
+    job for the calendar worker (or joins the one already waiting) and
+    returns at once; the page then polls ``sync_job_status``.
+    Args: request (HttpRequest): GET shows the latest job, POST queues one
     """
     if not request.user.is_staff:
         messages.error(request, "You do not have permission to sync "
                                 "calendars.")
         return redirect("planner:index")
 
-    # run the sync
-    sync_messages = sync_events_from_google()
+    if request.method == "POST":
+        job = queue_sync_job(request.user)
+        return redirect(f"{reverse('planner:sync_calendar')}?job={job.pk}")
+
+    jobs = CalendarSyncJob.objects.all()
+    job_id = request.GET.get("job")
+    job = (
+        jobs.filter(pk=job_id).first() if job_id and job_id.isdigit()
+        else jobs.first()
+    )
+    return render(request, "pages/sync_calendar.html", {
+        "job": job,
+        "job_json": _sync_job_json(job) if job else None,
+    })
 
-    # Show feedback to user
-    updated_count = 0
-    if sync_messages:
-        updated_count = sum(1 for msg in sync_messages if 'Updated:' in msg)
 
-    if updated_count > 0:
-        messages.success(request, f"Sync Complete: {updated_count} event(s) updated from Google Calendar.")
-    else:
-        messages.info(request, "Sync Complete. No changes found.")
+@login_required
+@require_GET
+def sync_job_status(request: HttpRequest, pk: int) -> JsonResponse:
+    """
+    JSON status of a staff sync job, polled by the sync page.
+    Returns:
+        JsonResponse: See ``_sync_job_json``
+    """
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff only"}, status=403)
+    job = get_object_or_404(CalendarSyncJob, pk=pk)
+    if job.status in CalendarSyncJob.ACTIVE:
+        fail_stale_jobs()
+        job.refresh_from_db()
+    return JsonResponse(_sync_job_json(job))
+
+
+def _sync_job_json(job: CalendarSyncJob) -> dict:
+    def stamp(value):
+        return value.isoformat() if value else None
+
+    return {
+        "id": job.pk,
+        "status": job.status,
+        "finished": job.status not in CalendarSyncJob.ACTIVE,
+        "created_at": stamp(job.created_at),
+        "started_at": stamp(job.started_at),
+        "finished_at": stamp(job.finished_at),
+        "seconds": job.seconds,
+        "venue_count": job.venue_count,
+        "venues": job.venues,
+        "checked": job.checked,
+        "updated": job.updated,
+        "error": job.error,
+    }
+
 
-    return redirect('planner:index')
+@csrf_exempt
+@require_POST
+def calendar_notification(request: HttpRequest) -> HttpResponse:
+    """
+    Google Calendar push-notification webhook. Queues an incremental pull
+    of the watched venue for the calendar worker and answers at once.
+    """
+    channel = check_notification(request.headers)
+    if channel is None:
+        return HttpResponseForbidden()
+    # "sync" only confirms a new channel; nothing changed yet.
+    if request.headers.get("X-Goog-Resource-State") != "sync":
+        request_venue_sync(channel.venue_id)
+    return HttpResponse(status=204)
 
 
 def custom_csrf_failure(request, reason="", template_name="403_csrf.html"):
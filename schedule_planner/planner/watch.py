@@ -0,0 +1,185 @@
+"""Google Calendar push notifications instead of polling.
+
+Each venue calendar is watched through a channel that Google calls back on
+``GOOGLE_WEBHOOK_URL`` whenever the calendar changes. The webhook only
+checks the channel token and marks the venue; ``run_calendar_worker`` then
+pulls just that venue incrementally (its sync token makes this cheap) and
+renews channels before they expire.
+"""
+
+import logging
+import secrets
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from .models import CalendarWatchChannel, Venue
+from .sync import CalendarSyncEngine
+from .utils.google_calendar import (
+    CalendarUnavailable,
+    execute,
+    get_calendar_service,
+)
+
+logger = logging.getLogger(__name__)
+
+# Lifetime asked for a channel; Google may grant less.
+CHANNEL_TTL = timedelta(days=7)
+# Channels expiring sooner than this are replaced.
+RENEW_BEFORE = timedelta(days=1)
+
+
+def watch_venue(venue) -> CalendarWatchChannel:
+    """Open a channel on ``venue``'s calendar, replacing the current ones.
+    Raises:
+        CalendarUnavailable: Google Calendar is not configured
+    """
+    service = get_calendar_service()
+    if not service:
+        raise CalendarUnavailable
+    token = secrets.token_urlsafe(32)
+    response = execute(
+        service.events().watch(
+            calendarId=venue.google_calendar_id,
+            body={
+                "id": str(uuid.uuid4()),
+                "type": "web_hook",
+                "address": settings.GOOGLE_WEBHOOK_URL,
+                "token": token,
+                "params": {"ttl": str(int(CHANNEL_TTL.total_seconds()))},
+            },
+        )
+    )
+    expiration = datetime.fromtimestamp(
+        int(response["expiration"]) / 1000, tz=dt_timezone.utc
+    )
+    old = list(venue.watch_channels.all())
+    channel = CalendarWatchChannel.objects.create(
+        venue=venue,
+        channel_id=response["id"],
+        resource_id=response["resourceId"],
+        token=token,
+        expiration=expiration,
+    )
+    for previous in old:
+        stop_channel(previous)
+    return channel
+
+
+def stop_channel(channel) -> None:
+    """Ask Google to stop ``channel`` and forget it."""
+    service = get_calendar_service()
+    if service:
+        try:
+            execute(
+                service.channels().stop(
+                    body={"id": channel.channel_id,
+                          "resourceId": channel.resource_id}
+                )
+            )
+        except Exception as e:
+            # It expires on its own; its notifications still validate
+            # until the row is gone, so drop it anyway.
+            logger.warning(f"Could not stop {channel}: {e}")
+    channel.delete()
+
+
+def renew_watch_channels(venues=None, force=False) -> list:
+    """Watch every calendar venue whose channel is missing or about to
+    expire.
+    Args:
+        venues (QuerySet): Venues to consider, defaults to all
+        force (bool): Replace channels even when they are still fresh
+    Returns:
+        list: The new channels
+    """
+    if venues is None:
+        venues = Venue.objects.all()
+    venues = venues.exclude(google_calendar_id__isnull=True).exclude(
+        google_calendar_id__exact=""
+    )
+    if not force:
+        venues = venues.exclude(
+            watch_channels__expiration__gt=timezone.now() + RENEW_BEFORE
+        )
+    return [watch_venue(venue) for venue in venues]
+
+
+def check_notification(headers) -> CalendarWatchChannel | None:
+    """The channel a notification claims to come from, if its token
+    matches."""
+    channel = (
+        CalendarWatchChannel.objects.filter(
+            channel_id=headers.get("X-Goog-Channel-ID", "")
+        )
+        .only("venue_id", "token")
+        .first()
+    )
+    if channel is None or not constant_time_compare(
+        channel.token, headers.get("X-Goog-Channel-Token", "")
+    ):
+        return None
+    return channel
+
+
+def request_venue_sync(venue_id: int) -> None:
+    """Queue an incremental pull of one venue for the calendar worker."""
+    Venue.objects.filter(pk=venue_id).update(
+        google_sync_requested_at=timezone.now()
+    )
+
+
+def run_requested_syncs():
+    """Pull the venues marked by the webhook; venues whose pull fails stay
+    marked.
+    Returns:
+        SyncReport: Or None when no venue was waiting
+    """
+    now = timezone.now()
+    requested = Venue.objects.filter(google_sync_requested_at__lte=now)
+    pks = list(requested.values_list("pk", flat=True))
+    if not pks:
+        return None
+    # Notifications arriving from here on keep their mark for next time.
+    requested.filter(pk__in=pks).update(google_sync_requested_at=None)
+    report = CalendarSyncEngine(Venue.objects.filter(pk__in=pks)).run()
+    failed = [venue.venue_id for venue in report.venues if venue.error]
+    if failed:
+        # Mark the venues that failed again so the next loop retries them.
+        Venue.objects.filter(
+            pk__in=failed, google_sync_requested_at__isnull=True
+        ).update(google_sync_requested_at=now)
+    return report
+
+
+def notification_headers(channel, state="exists", number=1) -> dict:
+    """The headers Google sends with a notification on ``channel``."""
+    return {
+        "X-Goog-Channel-ID": channel.channel_id,
+        "X-Goog-Channel-Token": channel.token,
+        "X-Goog-Resource-ID": channel.resource_id,
+        "X-Goog-Resource-State": state,
+        "X-Goog-Message-Number": str(number),
+    }
+
+
+def send_notification(channel, url, state="exists") -> int:
+    """Local stand-in for Google: POST a notification for ``channel`` to
+    ``url``.
+    Returns:
+        int: The HTTP status of the webhook's answer
+    """
+    request = urllib.request.Request(
+        url, data=b"", method="POST",
+        headers=notification_headers(channel, state),
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
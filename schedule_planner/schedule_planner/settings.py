@@ -80,6 +80,19 @@ GOOGLE_SERVICE_ACCOUNT_FILE = os.environ.get(
     "GOOGLE_SERVICE_ACCOUNT_FILE",
     "/etc/secrets/service_accounts.json"
 )
+# Venue calendars fetched at the same time by a Google Calendar pull
+GOOGLE_SYNC_CONCURRENCY = int(os.environ.get("GOOGLE_SYNC_CONCURRENCY", 4))
+# Client-side limit on Google Calendar API calls per second (per process),
+# and the burst allowed above it
+GOOGLE_CALENDAR_QPS = float(os.environ.get("GOOGLE_CALENDAR_QPS", 8))
+GOOGLE_CALENDAR_BURST = int(os.environ.get("GOOGLE_CALENDAR_BURST", 20))
+# Public HTTPS URL of the calendar notification webhook; push notifications
+# (and channel renewal by the calendar worker) are off when unset.
+GOOGLE_WEBHOOK_URL = os.environ.get("GOOGLE_WEBHOOK_URL")
+# Send Google Calendar calls to the local fake instead: "memory" for the
+# in-process one, or the URL of a run_fake_calendar server. For benchmarks
+# and tests only.
+GOOGLE_CALENDAR_FAKE = os.environ.get("GOOGLE_CALENDAR_FAKE")
 # Application definition
 
 INSTALLED_APPS = [
@@ -148,6 +161,24 @@ if "DATABASE_URL" in os.environ:
         conn_max_age=600, ssl_require=True
     )
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Holds the rendered schedule fragments and their version counters. The
+# counters must be shared by every gunicorn worker, so production uses the
+# database cache (table created by `createcachetable` in the release step).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+if "DATABASE_URL" in os.environ:
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "planner_cache",
+    }
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {